@@ -1,128 +1,93 @@
 import sys
-import math
 import pygame
-import time
+import sim_core
+import vfh_engine
+from sim_core import (
+    WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, SPEED_SCALE, TURNING_SCALE, FINE_TURN_SCALE,
+    DETECTION_RANGE, FOV_RAD,
+)
+import dirty_renderer
+import sprite_cache
+import headless
+import scene_file
+import obstacle_store
+import occupancy_grid
+import live_scene
+import world_tiles
+import frame_profiler
+import overlay
+from fixed_timestep import FixedTimestep, PHYSICS_HZ, RENDER_HZ
 
 
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 
-# Wheelchair parameters
-WHEELCHAIR_WIDTH = 40
-WHEELCHAIR_HEIGHT = 60
-START_POS = (100, 100)
-START_ANGLE = 0  # in radians
-
-# Movement scales
-SPEED_SCALE = 200       # pixels per second for forward/backward motion
-TURNING_SCALE = 2.0     # radians per second for main turning input
-FINE_TURN_SCALE = 0.5   # additional radians per second from fine-tune keys (z and x)
+# Wheelchair, movement, VFH and collision avoidance parameters live in sim_core.py
 
 # Colors
 COLOR_BG = (30, 30, 30)
 COLOR_WHEELCHAIR = (0, 200, 0)
 
-# Vector Field Histogram
-N_BINS = 36
-BIN_SIZE = 360 / N_BINS
-DETECTION_RANGE = 200
+# Obstacle layout; --scene <file> loads another one (see scene_file.py)
+SCENE_PATH = scene_file.path_from_args(sys.argv)
+
+# Scene and user-added obstacles in one structure-of-arrays store, with the spatial index,
+# distance field, occupancy grid and scene version built from it once. Placing or
+# removing an obstacle updates all of them in place (see live_scene.py)
+layout = scene_file.load(SCENE_PATH)
+live = live_scene.LiveScene(obstacle_store.from_scene(layout), sim_core.VFH_REACH,
+                            occupancy_grid.from_scene(layout, margin=DETECTION_RANGE))
 
-# Additional parameters for line of sight & collision avoidance
-FOV_DEG = 270  # total field-of-view in degrees for "line of sight"
-FOV_RAD = math.radians(FOV_DEG)
-SOFT_COLLISION_DIST = 80  # distance threshold below which we apply a "push away"
+# --world <folder> drives through a tiled world streamed from disk instead (see
+# world_tiles.py); its obstacles cannot be edited
+WORLD_PATH = sys.argv[sys.argv.index("--world") + 1] if "--world" in sys.argv[:-1] else None
+world = world_tiles.World(WORLD_PATH, sim_core.VFH_REACH) if WORLD_PATH else None
 
-custom_obstacles = []
+def scene_sources():
+    """(obstacle index, distance field, occupancy grid, scene version, world extent) to drive in."""
+    if world is not None:
+        return world, world, world, world.scene, (world.width, world.height)
+    return live.index, live.field, live.occupancy, live.scene, (layout.width, layout.height)
 
-def compute_vfh(pos_x, pos_y, obstacles, n_bins=N_BINS, detection_range=DETECTION_RANGE):
+def stream_world(state, view, block=False):
     """
-    Vector Field Histogram using closest point on each obstacle.
-    For obstacles within detection_range, weight = (detection_range - distance) / detection_range.
+    Requests the world tiles around the chair and the view (see world_tiles.World.update).
+
+    :param block: Wait for the tiles around the chair, for replays that must not depend on disk speed.
     """
-    histogram = [0] * n_bins
-    for obs in obstacles:
-        r = obs["rect"]
-        # Closest point
-        closest_x = max(r.x, min(pos_x, r.x + r.width))
-        closest_y = max(r.y, min(pos_y, r.y + r.height))
-        
-        dx = closest_x - pos_x
-        dy = closest_y - pos_y
-        distance = math.sqrt(dx*dx + dy*dy)
-        if distance == 0 or distance > detection_range:
-            continue
-        
-        angle = (math.degrees(math.atan2(dy, dx)) + 360) % 360
-        weight = (detection_range - distance) / detection_range
-        bin_index = int(angle // BIN_SIZE) % n_bins
-        histogram[bin_index] += weight
-    return histogram
+    if world is not None:
+        world.update(state.pos_x, state.pos_y, state.angle, block=block, view=view.view(dirty_renderer.LAYER_PAD))
 
 def draw_obstacle_vectors(
     surface,
     robot_center,     # (x, y) of the robot
     robot_angle,      # heading in radians
     obstacles,
-    color=(255, 255, 0)   # yellow
+    color=(255, 255, 0),  # yellow
+    origin=(0, 0)         # world position of the window's top-left corner
 ):
     """
     Draw lines from the robot to obstacles *only if* they are in line of sight (within FOV)
     and within detection range.
     """
-    rx, ry = robot_center
-    
-    for obs in obstacles:
-        rect = obs["rect"]
-        
-        # Closest point
-        closest_x = max(rect.x, min(rx, rect.x + rect.width))
-        closest_y = max(rect.y, min(ry, rect.y + rect.height))
-        
-        dx = closest_x - rx
-        dy = closest_y - ry
-        distance = math.sqrt(dx*dx + dy*dy)
-        if distance < 1 or distance > DETECTION_RANGE:
-            continue
-        
-        # Angle difference from heading
-        global_angle = math.atan2(dy, dx)
-        angle_diff = (global_angle - robot_angle + math.pi) % (2*math.pi) - math.pi
-        
-        # If outside the FOV, skip
-        if abs(angle_diff) > FOV_RAD / 2.0:
-            continue
-        
-        # Draw line: length = distance
-        end_x = rx + distance * math.cos(global_angle)
-        end_y = ry + distance * math.sin(global_angle)
-        
-        pygame.draw.line(surface, color, (rx, ry), (end_x, end_y), 2)
-        pygame.draw.circle(surface, color, (int(end_x), int(end_y)), 3)
+    rects = vfh_engine.rects_to_array(obstacles)
+    ends = overlay.line_of_sight_ends(robot_center, robot_angle, rects, DETECTION_RANGE, FOV_RAD)
+    screen_center = (robot_center[0] - origin[0], robot_center[1] - origin[1])
+    return overlay.draw_rays(surface, color, screen_center, ends - origin)
 
 def draw_histogram(surface, pos, histogram, max_height=50):
+    drawn = []
     bin_width = 10
     for i, value in enumerate(histogram):
         height = int(value * max_height)
         rect = pygame.Rect(pos[0] + i * bin_width, pos[1] + max_height - height, bin_width - 1, height)
-        pygame.draw.rect(surface, (255, 0, 0), rect)
+        drawn.append(pygame.draw.rect(surface, (255, 0, 0), rect))
+    return drawn
 
 def get_obstacles():
-    obstacles = []
-    # Example default obstacles
-    obstacles.append({"rect": pygame.Rect(660, 0, 30, 150), "color": (128, 128, 128)})
-    obstacles.append({"rect": pygame.Rect(750, 0, 30, 150), "color": (128, 128, 128)})
-    obstacles.append({"rect": pygame.Rect(440, 150, 250, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(440, 260, 400, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(750, 150, 100, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(30, 350, 150, 80),  "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(250, 350, 80, 50),  "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(30, 500, 40, 40),   "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(150, 500, 60, 40),  "color": (200, 0, 0)})
-    
-    # Custom obstacles (user-added)
-    obstacles.extend(custom_obstacles)
-    return obstacles
+    # Scene obstacles first, then the user-added ones in the order they were placed
+    return live.obstacles()
 
 def add_obstacle_mode(screen, clock, font):
     adding = True
@@ -133,9 +98,7 @@ def add_obstacle_mode(screen, clock, font):
                 sys.exit()
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 click_pos = event.pos
-                new_rect = pygame.Rect(click_pos[0], click_pos[1], 50, 50)
-                new_obstacle = {"rect": new_rect, "color": (255, 255, 0)}
-                custom_obstacles.append(new_obstacle)
+                live.add(click_pos[0], click_pos[1], 50, 50, (255, 255, 0), flags=obstacle_store.FLAG_USER_ADDED)
                 adding = False
         screen.fill((50, 50, 50))
         instructions = font.render("Click anywhere to place a new square obstacle.", True, (255, 255, 255))
@@ -197,60 +160,106 @@ def main_menu():
         clock.tick(60)
     return mode
 
-def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_input, obstacles):
+def read_inputs(mode, joystick):
     """
-    Apply soft collision avoidance only if an obstacle directly in the path
-    (based on the effective heading) is too close.
+    Polls the keyboard or joystick for the selected control mode.
+    Returns (forward_speed, turning_input) for sim_core.step.
     """
-    if forward_speed >= 0:
-        effective_heading = angle
-    else:
-        effective_heading = (angle + math.pi) % (2 * math.pi)
+    forward_speed = 0
+    turning_input = 0
     
-    min_dist = None
-    best_angle_diff = 0
-    for obs in obstacles:
-        rect = obs["rect"]
-        # Find the closest point on the rectangle
-        closest_x = max(rect.x, min(pos_x, rect.x + rect.width))
-        closest_y = max(rect.y, min(pos_y, rect.y + rect.height))
-        
-        dx = closest_x - pos_x
-        dy = closest_y - pos_y
-        distance = math.sqrt(dx*dx + dy*dy)
-        if distance < 1 or distance > DETECTION_RANGE:
-            continue
-        
-        global_angle = math.atan2(dy, dx)
-        angle_diff = (global_angle - effective_heading + math.pi) % (2*math.pi) - math.pi
-        
-        # Only consider obstacles in the forward direction within the FOV
-        if abs(angle_diff) > FOV_RAD / 2.0:
-            continue
-        
-        # Ensure it's "in front" relative to effective heading
-        eff_vec = (math.cos(effective_heading), math.sin(effective_heading))
-        dot = dx * eff_vec[0] + dy * eff_vec[1]
-        if dot < 0:
-            continue
-        
-        if min_dist is None or distance < min_dist:
-            min_dist = distance
-            best_angle_diff = angle_diff
+    if mode == "head":
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_UP]:
+            forward_speed = SPEED_SCALE
+        elif keys[pygame.K_DOWN]:
+            forward_speed = -SPEED_SCALE
+        if keys[pygame.K_LEFT]:
+            turning_input = -TURNING_SCALE
+        elif keys[pygame.K_RIGHT]:
+            turning_input = TURNING_SCALE
+        if keys[pygame.K_z]:
+            turning_input -= FINE_TURN_SCALE
+        if keys[pygame.K_x]:
+            turning_input += FINE_TURN_SCALE
+    
+    elif mode == "head_sip":
+        keys = pygame.key.get_pressed()
+        if keys[pygame.K_i]:
+            forward_speed = SPEED_SCALE
+        elif keys[pygame.K_l]:
+            forward_speed = -SPEED_SCALE
+        if keys[pygame.K_p]:
+            turning_input = -TURNING_SCALE
+        elif keys[pygame.K_k]:
+            turning_input = TURNING_SCALE
+        if keys[pygame.K_z]:
+            turning_input -= FINE_TURN_SCALE
+        if keys[pygame.K_x]:
+            turning_input += FINE_TURN_SCALE
+    
+    elif mode == "xbox":
+        # Use the right stick for forward/back and left/right turning
+        # Axis 2 (horizontal) = turning, axis 3 (vertical) = forward/back
+        # Just skip if we have no joystick
+        if joystick is not None:
+            try:
+                axis_turn = joystick.get_axis(2)   # right stick horizontal
+                axis_forward = joystick.get_axis(3)   # right stick vertical
+
+                DEADZONE = 0.15
+                if abs(axis_turn) < DEADZONE:
+                    axis_turn = 0
+                if abs(axis_forward) < DEADZONE:
+                    axis_forward = 0
+
+                # Up on the stick is typically negative => invert if you want up=forward
+                forward_speed = -axis_forward * SPEED_SCALE
+                # If axis_turn is +1 at far right => turning_input is +2 => turn right
+                turning_input = axis_turn * TURNING_SCALE
+
+            except Exception as e:
+                print("Joystick error:", e)
+                forward_speed = 0
+                turning_input = 0
     
-    if min_dist is not None and min_dist < SOFT_COLLISION_DIST:
-        scale = min_dist / SOFT_COLLISION_DIST
-        forward_speed *= scale
-        turning_input -= TURNING_SCALE * best_angle_diff
     return forward_speed, turning_input
 
 
-def simulation(mode):
+def draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view, font=None):
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+    # Scroll with the chair; the renderer repaints everything only when the view moved
+    view.follow(pos_x, pos_y)
+    renderer.begin_frame()
+    
+    # Draw lines only for obstacles in line of sight
+    renderer.mark(draw_obstacle_vectors(
+        surface=screen,
+        robot_center=(pos_x, pos_y),
+        robot_angle=angle,
+        obstacles=obstacle_grid.query_radius(pos_x, pos_y, DETECTION_RANGE),
+        color=(255, 255, 0),
+        origin=(view.x, view.y)
+    ))
+    
+    # Draw the wheelchair
+    renderer.mark(chair_sprites.blit(screen, angle, view.to_screen(pos_x, pos_y)))
+    
+    # Stage timings (toggled with F3)
+    renderer.mark(profiler.draw_overlay(screen, font))
+    profiler.lap("draw")
+    
+    renderer.end_frame()
+    profiler.lap("flip")
+
+def simulation(mode, record_path=None, profiler=None):
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Wheelchair Simulation")
     clock = pygame.time.Clock()
-    last_print_time = 0.0
+    font = pygame.font.SysFont("monospace", 14)
+    if profiler is None:
+        profiler = frame_profiler.FrameProfiler()
     
     # Attempt to initialize joystick if using "xbox" mode
     joystick = None
@@ -263,155 +272,140 @@ def simulation(mode):
         else:
             print("No joystick detected. Falling back to no movement.")
     
-    pos_x, pos_y = START_POS
-    angle = START_ANGLE
+    # Optionally record the inputs so the run can be replayed headless with sim_core.py
+    recorder = sim_core.InputRecorder(record_path) if record_path else None
+    
+    state = sim_core.WheelchairState()
     wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
     wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    # Rotations are made once per degree of heading and reused
+    chair_sprites = sprite_cache.RotatedSpriteCache(wheelchair_surf)
+    
+    # The obstacle index and distance field are kept up to date by live (or streamed in
+    # by world), not rebuilt per run
+    obstacle_grid, field, occupancy, scene, world_size = scene_sources()
+    # Obstacles are drawn once, culled to the area around the view through the index;
+    # each frame only repaints what the chair and overlays touch
+    view, renderer = dirty_renderer.scene_view(screen, COLOR_BG, obstacle_grid, world_size, scene)
+    stream_world(state, view)
+    if world is None:
+        live.attach_renderer(renderer)
+    # Standing still or creeping reuses the previous histograms
+    cache = sim_core.make_vfh_cache(obstacle_grid, scene, field)
+    
+    # Physics runs at PHYSICS_HZ independent of how long drawing takes
+    timestep = FixedTimestep(PHYSICS_HZ, RENDER_HZ)
+    dt = timestep.dt
     
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0
-        obstacles = get_obstacles()  # get latest obstacles (including user-added)
+        frame_time = clock.tick(PHYSICS_HZ) / 1000.0
+        profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and world is None:
+                # Left click places a square obstacle while driving, right click removes one
+                x, y = view.to_world(*event.pos)
+                live.add(x, y, 50, 50, (255, 255, 0), flags=obstacle_store.FLAG_USER_ADDED)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3 and world is None:
+                obstacle_id = live.obstacle_at(*view.to_world(*event.pos))
+                if obstacle_id is not None:
+                    live.remove(obstacle_id)
         
-        forward_speed = 0
-        user_turning_input = 0
-        
-        if mode == "head":
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_UP]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_DOWN]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_LEFT]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_RIGHT]:
-                user_turning_input = TURNING_SCALE
-            if keys[pygame.K_z]:
-                user_turning_input -= FINE_TURN_SCALE
-            if keys[pygame.K_x]:
-                user_turning_input += FINE_TURN_SCALE
-        
-        elif mode == "head_sip":
-            keys = pygame.key.get_pressed()
-            if keys[pygame.K_i]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_l]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_p]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_k]:
-                user_turning_input = TURNING_SCALE
-            if keys[pygame.K_z]:
-                user_turning_input -= FINE_TURN_SCALE
-            if keys[pygame.K_x]:
-                user_turning_input += FINE_TURN_SCALE
-        
-        elif mode == "xbox":
-    # Use the right stick for forward/back and left/right turning
-    # Axis 2 (horizontal) = turning, axis 3 (vertical) = forward/back
-    # NOTE: Make sure you've done "pygame.joystick.init()" and joystick detection outside if needed.
-
-            # Just skip if we have no joystick
-            if joystick is not None:
-                try:
-                    now = time.time()
-                    # Print axes for debugging every 0.5s
-                    #if now - last_print_time >= 0.5:
-                        #axis_vals = [joystick.get_axis(i) for i in range(joystick.get_numaxes())]
-                        #print("Axis values:", axis_vals)
-                        #last_print_time = now
-
-                    axis_turn = joystick.get_axis(2)   # right stick horizontal
-                    axis_forward = joystick.get_axis(3)   # right stick vertical
-
-                    DEADZONE = 0.15
-                    if abs(axis_turn) < DEADZONE:
-                        axis_turn = 0
-                    if abs(axis_forward) < DEADZONE:
-                        axis_forward = 0
-
-                    # Up on the stick is typically negative => invert if you want up=forward
-                    forward_speed = -axis_forward * SPEED_SCALE
-                    # If axis_turn is +1 at far right => turning_input is +2 => turn right
-                    turning_input = axis_turn * TURNING_SCALE
-
-                except Exception as e:
-                    print("Joystick error:", e)
-                    forward_speed = 0
-                    turning_input = 0
-
-        # 2) VFH lane-keep
-        obstacles = get_obstacles()
-        vfh = compute_vfh(pos_x, pos_y, obstacles)
-        current_heading_deg = (math.degrees(angle) + 360) % 360
-        current_bin = int(current_heading_deg // BIN_SIZE)
-        density_ahead = vfh[current_bin]
-
-        THRESHOLD = 0.5
-        vfh_turn_adjustment = 0
-        if density_ahead > THRESHOLD:
-            best_bin = min(range(N_BINS), key=lambda i: vfh[i])
-            desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE/2)
-            angle_diff = (desired_heading - angle + math.pi) % (2*math.pi) - math.pi
-            vfh_turn_adjustment = TURNING_SCALE * angle_diff
-
-        forward_threshold = 0.5
-        forward_scaling = 1.0
-        if density_ahead > forward_threshold:
-            forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
-        forward_speed *= forward_scaling
-
-        turning_input += vfh_turn_adjustment
-
-        # 3) Soft collision avoidance
-        forward_speed, turning_input = apply_soft_collision_avoidance(
-            pos_x, pos_y, angle, forward_speed, turning_input, obstacles
-        )
-
-        # 4) Update the angle and position
-        angle += turning_input * dt
-        pos_x += forward_speed * math.cos(angle) * dt
-        pos_y += forward_speed * math.sin(angle) * dt
-
-        # 5) Simple collision detection
-        wheelchair_rect = pygame.Rect(0, 0, WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT)
-        wheelchair_rect.center = (pos_x, pos_y)
-        if any(wheelchair_rect.colliderect(obs["rect"]) for obs in obstacles):
-            print("Collision detected! Resetting position.")
-            pos_x, pos_y = START_POS
-            angle = START_ANGLE
-        
-        # ----- Drawing -----
-        screen.fill(COLOR_BG)
-        for obs in obstacles:
-            pygame.draw.rect(screen, obs["color"], obs["rect"])
+        # 1) Input devices
+        inputs = read_inputs(mode, joystick)
+        if world is not None and not world.ready(state.pos_x, state.pos_y):
+            # Tiles around the chair are still loading: hold still instead of driving into
+            # obstacles that are not there yet; the frame loop keeps running meanwhile
+            inputs = (0, 0)
+        profiler.lap("input")
         
-        # Draw lines only for obstacles in line of sight
-        draw_obstacle_vectors(
-            surface=screen,
-            robot_center=(pos_x, pos_y),
-            robot_angle=angle,
-            obstacles=obstacles,
-            color=(255, 255, 0)
-        )
+        # 2) VFH lane-keep, soft collision avoidance, motion and collision reset
+        for _ in range(timestep.advance(frame_time)):
+            if recorder is not None:
+                recorder.record(dt, *inputs)
+            vfh, collided = sim_core.step(state, inputs, dt, obstacle_grid, field=field, cache=cache,
+                                          profiler=profiler, occupancy=occupancy)
+            if collided:
+                print("Collision detected! Resetting position.")
+        stream_world(state, view)
+        profiler.lap("stream")
         
-        # Draw the wheelchair
-        rotated_surf = pygame.transform.rotate(wheelchair_surf, -math.degrees(angle))
-        rotated_rect = rotated_surf.get_rect(center=(pos_x, pos_y))
-        screen.blit(rotated_surf, rotated_rect.topleft)
-        
-        pygame.display.flip()
+        if not timestep.should_render():
+            profiler.end_frame()
+            continue
+        draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view, font)
+        profiler.end_frame()
     
+    if recorder is not None:
+        recorder.close()
+    print("VFH cache:", cache.stats())
+    if world is not None:
+        print("World tiles:", world.stats())
+        world.close()
+    profiler.dump()
     pygame.quit()
     sys.exit()
 
+def headless_simulation(input_log, frames_dir=None, hash_path=None):
+    """
+    Replays a recorded input log without a window and unthrottled, rendering a frame
+    every 1/RENDER_HZ of simulated time. Frame hashes and, optionally, PNG frames are
+    written out so renders can be compared between commits.
+    """
+    headless.use_dummy_drivers()
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
+    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    chair_sprites = sprite_cache.RotatedSpriteCache(wheelchair_surf)
+    obstacle_grid, field, occupancy, scene, world_size = scene_sources()
+    view, renderer = dirty_renderer.scene_view(screen, COLOR_BG, obstacle_grid, world_size, scene)
+    if world is None:
+        live.attach_renderer(renderer)
+    cache = sim_core.make_vfh_cache(obstacle_grid, scene, field)
+    
+    sink = headless.FrameSink(frames_dir)
+    profiler = frame_profiler.FrameProfiler()
+    next_render = 0.0
+    def observer(state, inputs, vfh, collided):
+        nonlocal next_render
+        stream_world(state, view, block=True)
+        if state.time >= next_render:
+            next_render += 1.0 / RENDER_HZ
+            draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view)
+            sink.add_surface(screen)
+    
+    state = sim_core.WheelchairState()
+    stream_world(state, view, block=True)
+    state = sim_core.run(sim_core.load_input_log(input_log), obstacle_grid, state, field=field, cache=cache,
+                         observer=observer, occupancy=occupancy)
+    if hash_path:
+        sink.write_hashes(hash_path)
+    print(f"{input_log}: {state.steps} steps, {state.collisions} collisions, frames: {sink.summary()}")
+    pygame.quit()
+
 def main():
+    # --headless <input_log.csv> [--frames <dir>] [--hashes <file>] replays a log without a window
+    options = headless.parse_args(sys.argv[1:])
+    if options is not None:
+        headless_simulation(*options)
+        return
+    # --profile <file.json|file.csv> records per-stage frame timings (F3 shows them)
+    profiler = frame_profiler.from_args(sys.argv[1:])
+    # Optional argument: CSV file to record the driving inputs to
+    args = sys.argv[1:]
+    for flag in ("--profile", "--scene", "--world"):
+        if flag in args:
+            del args[args.index(flag):args.index(flag) + 2]
+    record_path = args[0] if args else None
     mode = main_menu()
-    simulation(mode)
+    simulation(mode, record_path, profiler)
 
 if __name__ == "__main__":
     main()
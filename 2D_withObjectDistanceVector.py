@@ -1,6 +1,18 @@
 import sys
 import math
 import pygame
+import numpy as np
+import vfh_engine
+import swept_collision
+import vfh_cache
+import dirty_renderer
+import sprite_cache
+import overlay
+import scene_file
+import frame_profiler
+import headless
+import sim_core
+from fixed_timestep import FixedTimestep, PHYSICS_HZ, RENDER_HZ
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
@@ -20,121 +32,71 @@ FINE_TURN_SCALE = 0.5   # additional radians per second from fine-tune keys (z a
 COLOR_BG = (30, 30, 30)
 COLOR_WHEELCHAIR = (0, 200, 0)
 
+# Obstacle layout; --scene <file> loads another one (see scene_file.py)
+SCENE_PATH = scene_file.path_from_args(sys.argv)
+
 # Vector Field Histogram
 N_BINS = 36
 BIN_SIZE = 360 / N_BINS
 DETECTION_RANGE = 200
 
+# VFH+ steering
+THRESHOLD = 0.5       # steering density above which a sector is blocked
+THRESHOLD_LOW = 0.3   # steering density below which a blocked sector is free again
+VFH_CLEARANCE = WHEELCHAIR_HEIGHT / 2 + 5  # half the chair's extent across its heading plus a safety margin
+WIDE_VALLEY_BINS = int(80 // BIN_SIZE)     # free valleys wider than 80 degrees count as wide
+VFH_REACH = vfh_engine.enlarged_reach(DETECTION_RANGE, VFH_CLEARANCE)  # range of the histogram queries
+
 # Additional parameters for line of sight & collision avoidance
 FOV_DEG = 270  # total field-of-view in degrees for "line of sight"
 FOV_RAD = math.radians(FOV_DEG)
 SOFT_COLLISION_DIST = 80  # distance threshold below which we apply a "push away"
 
 custom_obstacles = []
+# Bumped on every obstacle edit so cached VFH histograms are patched or rebuilt
+scene = vfh_cache.SceneVersion()
 
 def compute_vfh(pos_x, pos_y, obstacles, n_bins=N_BINS, detection_range=DETECTION_RANGE):
     """
     Vector Field Histogram using closest point on each obstacle.
     For obstacles within detection_range, weight = (detection_range - distance) / detection_range.
+    obstacles may be the list of obstacle dicts or an array from vfh_engine.rects_to_array.
     """
-    histogram = [0] * n_bins
-    for obs in obstacles:
-        r = obs["rect"]
-        # Closest point
-        closest_x = max(r.x, min(pos_x, r.x + r.width))
-        closest_y = max(r.y, min(pos_y, r.y + r.height))
-        
-        dx = closest_x - pos_x
-        dy = closest_y - pos_y
-        distance = math.sqrt(dx*dx + dy*dy)
-        if distance == 0 or distance > detection_range:
-            continue
-        
-        angle = (math.degrees(math.atan2(dy, dx)) + 360) % 360
-        weight = (detection_range - distance) / detection_range
-        bin_index = int(angle // BIN_SIZE) % n_bins
-        histogram[bin_index] += weight
-    return histogram
+    return vfh_engine.compute_vfh_closest(pos_x, pos_y, obstacles, n_bins, detection_range)
 
 def draw_obstacle_vectors(
     surface,
     robot_center,     # (x, y) of the robot
     robot_angle,      # heading in radians
     obstacles,
-    color=(255, 255, 0)   # yellow
+    color=(255, 255, 0),  # yellow
+    origin=(0, 0)         # world position of the window's top-left corner
 ):
     """
     Draw lines from the robot to obstacles *only if* they are in line of sight (within FOV)
     and within detection range.
     """
-    rx, ry = robot_center
-    
-    for obs in obstacles:
-        rect = obs["rect"]
-        
-        # Closest point
-        closest_x = max(rect.x, min(rx, rect.x + rect.width))
-        closest_y = max(rect.y, min(ry, rect.y + rect.height))
-        
-        dx = closest_x - rx
-        dy = closest_y - ry
-        distance = math.sqrt(dx*dx + dy*dy)
-        if distance < 1 or distance > DETECTION_RANGE:
-            continue
-        
-        # Angle difference from heading
-        global_angle = math.atan2(dy, dx)
-        angle_diff = (global_angle - robot_angle + math.pi) % (2*math.pi) - math.pi
-        
-        # If outside the FOV, skip
-        if abs(angle_diff) > FOV_RAD / 2.0:
-            continue
-        
-        # Draw line: length = distance
-        end_x = rx + distance * math.cos(global_angle)
-        end_y = ry + distance * math.sin(global_angle)
-        
-        pygame.draw.line(surface, color, (rx, ry), (end_x, end_y), 2)
-        pygame.draw.circle(surface, color, (int(end_x), int(end_y)), 3)
+    rects = vfh_engine.rects_to_array(obstacles)
+    ends = overlay.line_of_sight_ends(robot_center, robot_angle, rects, DETECTION_RANGE, FOV_RAD)
+    screen_center = (robot_center[0] - origin[0], robot_center[1] - origin[1])
+    return overlay.draw_rays(surface, color, screen_center, ends - origin)
 
 def draw_vfh_arrows(surface, robot_center, robot_angle, histogram, scale=100):
     """
     Draw the VFH histogram as arrows. (Optional)
     """
-    for i, weight in enumerate(histogram):
-        bin_center_deg = i * BIN_SIZE + BIN_SIZE / 2.0
-        local_angle = math.radians(bin_center_deg) - robot_angle
-        
-        arrow_length = weight * scale
-        end_x = robot_center[0] + arrow_length * math.cos(local_angle)
-        end_y = robot_center[1] + arrow_length * math.sin(local_angle)
-        
-        pygame.draw.line(surface, (255, 255, 0), robot_center, (end_x, end_y), 2)
-        pygame.draw.circle(surface, (255, 255, 0), (int(end_x), int(end_y)), 3)
+    angles = np.radians(np.arange(len(histogram)) * BIN_SIZE + BIN_SIZE / 2.0) - robot_angle
+    ends = overlay.ray_ends(robot_center, angles, np.asarray(histogram) * scale)
+    return overlay.draw_rays(surface, (255, 255, 0), robot_center, ends)
 
 def draw_histogram(surface, pos, histogram, max_height=50):
+    drawn = []
     bin_width = 10
     for i, value in enumerate(histogram):
         height = int(value * max_height)
         rect = pygame.Rect(pos[0] + i * bin_width, pos[1] + max_height - height, bin_width - 1, height)
-        pygame.draw.rect(surface, (255, 0, 0), rect)
-
-def get_obstacles():
-    obstacles = []
-    # Example default obstacles
-    obstacles.append({"rect": pygame.Rect(660, 0, 30, 150), "color": (128, 128, 128)})
-    obstacles.append({"rect": pygame.Rect(750, 0, 30, 150), "color": (128, 128, 128)})
-    obstacles.append({"rect": pygame.Rect(440, 150, 250, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(440, 260, 400, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(750, 150, 100, 20), "color": (0, 128, 0)})
-    obstacles.append({"rect": pygame.Rect(30, 350, 150, 80),  "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(250, 350, 80, 50),  "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(30, 500, 40, 40),   "color": (200, 0, 0)})
-    obstacles.append({"rect": pygame.Rect(150, 500, 60, 40),  "color": (200, 0, 0)})
-    
-    # Custom obstacles (user-added)
-    obstacles.extend(custom_obstacles)
-    return obstacles
+        drawn.append(pygame.draw.rect(surface, (255, 0, 0), rect))
+    return drawn
 
 def add_obstacle_mode(screen, clock, font):
     adding = True
@@ -148,6 +110,7 @@ def add_obstacle_mode(screen, clock, font):
                 new_rect = pygame.Rect(click_pos[0], click_pos[1], 50, 50)
                 new_obstacle = {"rect": new_rect, "color": (255, 255, 0)}
                 custom_obstacles.append(new_obstacle)
+                scene.added([new_obstacle])
                 adding = False
         screen.fill((50, 50, 50))
         instructions = font.render("Click anywhere to place a new square obstacle.", True, (255, 255, 255))
@@ -202,7 +165,7 @@ def main_menu():
         clock.tick(60)
     return mode
 
-def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_input, obstacles):
+def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_input, obstacles, field=None):
     """
     Apply soft collision avoidance only if an obstacle directly in the path
     (based on the effective heading) is too close.
@@ -215,7 +178,12 @@ def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_i
     (e.g., within FOV/2 of the effective heading), we determine the closest one.
     If that obstacle is closer than SOFT_COLLISION_DIST, we reduce the forward speed and
     adjust the turning to steer away.
+    
+    With a distance field we can skip the scan whenever nothing is within SOFT_COLLISION_DIST.
     """
+    if field is not None and field.is_clear(pos_x, pos_y, SOFT_COLLISION_DIST):
+        return forward_speed, turning_input
+    
     # Determine the effective heading:
     if forward_speed >= 0:
         effective_heading = angle
@@ -269,130 +237,252 @@ def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_i
     return forward_speed, turning_input
 
 
-def simulation(mode):
+def read_inputs(mode):
+    """(forward_speed, turning_input) from the keys of the chosen control mode."""
+    keys = pygame.key.get_pressed()
+    user_forward_speed = 0
+    user_turning_input = 0
+    
+    if mode == "head":
+        if keys[pygame.K_UP]:
+            user_forward_speed = SPEED_SCALE
+        elif keys[pygame.K_DOWN]:
+            user_forward_speed = -SPEED_SCALE
+        if keys[pygame.K_LEFT]:
+            user_turning_input = -TURNING_SCALE
+        elif keys[pygame.K_RIGHT]:
+            user_turning_input = TURNING_SCALE
+    elif mode == "head_sip":
+        if keys[pygame.K_i]:
+            user_forward_speed = SPEED_SCALE
+        elif keys[pygame.K_l]:
+            user_forward_speed = -SPEED_SCALE
+        if keys[pygame.K_p]:
+            user_turning_input = -TURNING_SCALE
+        elif keys[pygame.K_k]:
+            user_turning_input = TURNING_SCALE
+    
+    if keys[pygame.K_z]:
+        user_turning_input -= FINE_TURN_SCALE
+    if keys[pygame.K_x]:
+        user_turning_input += FINE_TURN_SCALE
+    return user_forward_speed, user_turning_input
+
+def new_state():
+    """Chair at the start pose with this simulator's VFH+ steering."""
+    return sim_core.WheelchairState(START_POS[0], START_POS[1], START_ANGLE,
+                                    vfh_engine.VFHPlus(N_BINS, THRESHOLD_LOW, THRESHOLD, WIDE_VALLEY_BINS))
+
+def step(state, inputs, dt, obstacle_grid, cache, field, profiler=None):
+    """
+    Advances the chair by one timestep: VFH+ steering, slowing down ahead of obstacles,
+    soft collision avoidance, motion and the collision reset. Shared by the window and the headless replay.
+
+    :param state: sim_core.WheelchairState from new_state, updated in place.
+    :param inputs: (forward_speed, turning_input) from read_inputs or an input log.
+    :return: (vfh, collided)
+    """
+    forward_speed, user_turning_input = inputs
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+    
+    # VFH for overall environment (only obstacles within detection range can contribute)
+    vfh, enlarged = cache.get(pos_x, pos_y)
+
+    # Basic "lane keep" from VFH
+    current_heading_deg = (math.degrees(angle) + 360) % 360
+    current_bin = int(current_heading_deg // BIN_SIZE)
+    density_ahead = vfh[current_bin]
+
+    # VFH+ picks a free valley once the sector ahead is blocked
+    steering_vfh = vfh_engine.smooth_histogram(enlarged)
+    vfh_turn_adjustment = 0
+    best_bin = state.steering.steer(steering_vfh, current_bin)
+    if best_bin is not None:
+        desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE/2)
+        angle_diff = (desired_heading - angle + math.pi) % (2*math.pi) - math.pi
+        vfh_turn_adjustment = TURNING_SCALE * angle_diff
+
+    # If density is high, reduce forward speed
+    forward_threshold = 0.5
+    forward_scaling = 1.0
+    if density_ahead > forward_threshold:
+        forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
+
+    forward_speed *= forward_scaling
+
+    # Combine turning from user + VFH
+    turning_input = user_turning_input + vfh_turn_adjustment
+    if profiler is not None:
+        profiler.lap("vfh")
+
+    # ----- Soft Collision Avoidance based on line of sight to nearest obstacle -----
+    # Only obstacles within SOFT_COLLISION_DIST can trigger it
+    if field.is_clear(pos_x, pos_y, SOFT_COLLISION_DIST):
+        nearby = []
+    else:
+        nearby = obstacle_grid.query_radius(pos_x, pos_y, SOFT_COLLISION_DIST)
+    forward_speed, turning_input = apply_soft_collision_avoidance(
+        pos_x, pos_y, angle, forward_speed, turning_input, nearby, field
+    )
+    if profiler is not None:
+        profiler.lap("avoidance")
+
+    # Update state
+    start_pose = (pos_x, pos_y, angle)
+    angle += turning_input * dt
+    pos_x += forward_speed * math.cos(angle) * dt
+    pos_y += forward_speed * math.sin(angle) * dt
+    state.pos_x, state.pos_y, state.angle = pos_x, pos_y, angle
+    state.time += dt
+    state.steps += 1
+
+    # Collision detection of the rotated wheelchair swept over the step
+    collided = swept_collision.first_impact(start_pose, (pos_x, pos_y, angle),
+                                            WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, obstacle_grid) is not None
+    if collided:
+        state.collisions += 1
+        state.reset()
+    if profiler is not None:
+        profiler.lap("collision")
+    return vfh, collided
+
+def draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view, font=None):
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+    view.follow(pos_x, pos_y)
+    renderer.begin_frame()
+    
+    # Optionally draw the histogram or VFH arrows:
+    # renderer.mark(draw_histogram(screen, (10, 10), vfh))
+    # renderer.mark(draw_vfh_arrows(screen, view.to_screen(pos_x, pos_y), angle, vfh, scale=100))
+    
+    # Draw lines only for obstacles in line of sight
+    renderer.mark(draw_obstacle_vectors(
+        surface=screen,
+        robot_center=(pos_x, pos_y),
+        robot_angle=angle,
+        obstacles=obstacle_grid.query_radius(pos_x, pos_y, DETECTION_RANGE),
+        color=(255, 255, 0),
+        origin=(view.x, view.y)
+    ))
+    
+    renderer.mark(chair_sprites.blit(screen, angle, view.to_screen(pos_x, pos_y)))
+    
+    renderer.mark(profiler.draw_overlay(screen, font))
+    profiler.lap("draw")
+    
+    renderer.end_frame()
+    profiler.lap("flip")
+
+def chair_sprite_cache():
+    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
+    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    # Rotations are made once per degree of heading and reused
+    return sprite_cache.RotatedSpriteCache(wheelchair_surf)
+
+def simulation(mode, record_path=None):
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Wheelchair Simulation")
     clock = pygame.time.Clock()
+    # Per-stage frame timings: F3 shows them, --profile <file> records them from the start
+    profiler = frame_profiler.from_args(sys.argv)
+    profiler_font = pygame.font.SysFont("monospace", 14)
     
-    pos_x, pos_y = START_POS
-    angle = START_ANGLE
-    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
-    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    # Obstacles (including user-added) cannot change while driving, so index them once
+    obstacle_grid, field, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, DETECTION_RANGE,
+                                                                      VFH_REACH, custom_obstacles, scene)
+    # Standing still or creeping reuses the previous histograms
+    cache = vfh_cache.perception_cache(scene, obstacle_grid, compute_vfh, N_BINS, DETECTION_RANGE,
+                                       VFH_CLEARANCE, field)
+    # Optionally record the inputs so the run can be replayed with --headless
+    recorder = sim_core.InputRecorder(record_path) if record_path else None
+    
+    state = new_state()
+    chair_sprites = chair_sprite_cache()
+    
+    # Physics runs at PHYSICS_HZ independent of how long drawing takes
+    timestep = FixedTimestep(PHYSICS_HZ, RENDER_HZ)
+    dt = timestep.dt
     
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0
-        obstacles = get_obstacles()  # get latest obstacles (including user-added)
+        frame_time = clock.tick(PHYSICS_HZ) / 1000.0
+        
+        profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
         
         # User input
-        keys = pygame.key.get_pressed()
-        forward_speed = 0
-        user_turning_input = 0
-        
-        if mode == "head":
-            if keys[pygame.K_UP]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_DOWN]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_LEFT]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_RIGHT]:
-                user_turning_input = TURNING_SCALE
-        elif mode == "head_sip":
-            if keys[pygame.K_i]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_l]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_p]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_k]:
-                user_turning_input = TURNING_SCALE
-        
-        if keys[pygame.K_z]:
-            user_turning_input -= FINE_TURN_SCALE
-        if keys[pygame.K_x]:
-            user_turning_input += FINE_TURN_SCALE
-        
-        # VFH for overall environment
-        vfh = compute_vfh(pos_x, pos_y, obstacles)
-        
-        # Basic "lane keep" from VFH
-        current_heading_deg = (math.degrees(angle) + 360) % 360
-        current_bin = int(current_heading_deg // BIN_SIZE)
-        density_ahead = vfh[current_bin]
-        
-        # If density is high, attempt to turn away
-        THRESHOLD = 0.5
-        vfh_turn_adjustment = 0
-        if density_ahead > THRESHOLD:
-            best_bin = min(range(N_BINS), key=lambda i: vfh[i])
-            desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE/2)
-            angle_diff = (desired_heading - angle + math.pi) % (2*math.pi) - math.pi
-            vfh_turn_adjustment = TURNING_SCALE * angle_diff
-        
-        # If density is high, reduce forward speed
-        forward_threshold = 0.5
-        forward_scaling = 1.0
-        if density_ahead > forward_threshold:
-            forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
-        forward_speed *= forward_scaling
-        
-        # Combine turning from user + VFH
-        turning_input = user_turning_input + vfh_turn_adjustment
-        
-        # ----- Soft Collision Avoidance based on line of sight to nearest obstacle -----
-        forward_speed, turning_input = apply_soft_collision_avoidance(
-        pos_x, pos_y, angle, forward_speed, turning_input, obstacles
-    )
-        
-        # Update state
-        angle += turning_input * dt
-        pos_x += forward_speed * math.cos(angle) * dt
-        pos_y += forward_speed * math.sin(angle) * dt
-        
-        # Simple collision detection
-        wheelchair_rect = pygame.Rect(0, 0, WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT)
-        wheelchair_rect.center = (pos_x, pos_y)
-        if any(wheelchair_rect.colliderect(obs["rect"]) for obs in obstacles):
-            print("Collision detected! Resetting position.")
-            pos_x, pos_y = START_POS
-            angle = START_ANGLE
-        
-        # ----- Drawing -----
-        screen.fill(COLOR_BG)
-        for obs in obstacles:
-            pygame.draw.rect(screen, obs["color"], obs["rect"])
-        
-        # Optionally draw the histogram or VFH arrows:
-        # draw_histogram(screen, (10, 10), vfh)
-        # draw_vfh_arrows(screen, (pos_x, pos_y), angle, vfh, scale=100)
-        
-        # Draw lines only for obstacles in line of sight
-        draw_obstacle_vectors(
-            surface=screen,
-            robot_center=(pos_x, pos_y),
-            robot_angle=angle,
-            obstacles=obstacles,
-            color=(255, 255, 0)
-        )
-        
-        rotated_surf = pygame.transform.rotate(wheelchair_surf, -math.degrees(angle))
-        rotated_rect = rotated_surf.get_rect(center=(pos_x, pos_y))
-        screen.blit(rotated_surf, rotated_rect.topleft)
-        
-        pygame.display.flip()
+        inputs = read_inputs(mode)
+        profiler.lap("input")
+        
+        for _ in range(timestep.advance(frame_time)):
+            if recorder is not None:
+                recorder.record(dt, *inputs)
+            _, collided = step(state, inputs, dt, obstacle_grid, cache, field, profiler)
+            if collided:
+                print("Collision detected! Resetting position.")
+        
+        if not timestep.should_render():
+            profiler.end_frame()
+            continue
+        draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view, profiler_font)
+        profiler.end_frame()
     
+    if recorder is not None:
+        recorder.close()
+    print("VFH cache:", cache.stats())
+    profiler.dump()
     pygame.quit()
     sys.exit()
 
+def headless_simulation(input_log, frames_dir=None, hash_path=None):
+    """
+    Replays a recorded input log without a window and unthrottled (see headless.replay),
+    writing frame hashes and optionally PNG frames for comparing renders between commits.
+    """
+    headless.use_dummy_drivers()
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    obstacle_grid, field, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, DETECTION_RANGE,
+                                                                      VFH_REACH, custom_obstacles, scene)
+    cache = vfh_cache.perception_cache(scene, obstacle_grid, compute_vfh, N_BINS, DETECTION_RANGE,
+                                       VFH_CLEARANCE, field)
+    state = new_state()
+    chair_sprites = chair_sprite_cache()
+    profiler = frame_profiler.FrameProfiler()
+    sink = headless.FrameSink(frames_dir)
+    
+    def advance(dt, inputs):
+        step(state, inputs, dt, obstacle_grid, cache, field)
+    def draw():
+        draw_frame(screen, renderer, chair_sprites, state, obstacle_grid, profiler, view)
+    
+    headless.replay(sim_core.load_input_log(input_log), advance, draw, screen, sink, RENDER_HZ)
+    if hash_path:
+        sink.write_hashes(hash_path)
+    print(f"{input_log}: {state.steps} steps, {state.collisions} collisions, frames: {sink.summary()}")
+    pygame.quit()
+
 def main():
+    # --headless <input_log.csv> [--frames <dir>] [--hashes <file>] replays a log without a window
+    options = headless.parse_args(sys.argv[1:])
+    if options is not None:
+        headless_simulation(*options)
+        return
+    # Optional argument: CSV file to record the driving inputs to
+    args = sys.argv[1:]
+    for flag in ("--profile", "--scene"):
+        if flag in args:
+            del args[args.index(flag):args.index(flag) + 2]
+    record_path = args[0] if args else None
     mode = main_menu()
-    simulation(mode)
+    simulation(mode, record_path)
 
 if __name__ == "__main__":
     main()
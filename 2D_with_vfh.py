@@ -1,6 +1,18 @@
 import sys
 import math
 import pygame
+import numpy as np
+import vfh_engine
+import swept_collision
+import vfh_cache
+import dirty_renderer
+import sprite_cache
+import overlay
+import scene_file
+import frame_profiler
+import headless
+import sim_core
+from fixed_timestep import FixedTimestep, PHYSICS_HZ, RENDER_HZ
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
@@ -20,6 +32,9 @@ FINE_TURN_SCALE = 0.5   # additional radians per second from fine-tune keys (z a
 COLOR_BG = (30, 30, 30)
 COLOR_WHEELCHAIR = (0, 200, 0)
 
+# Obstacle layout; --scene <file> loads another one (see scene_file.py)
+SCENE_PATH = scene_file.path_from_args(sys.argv)
+
 #N_BINS = 36           # Number of bins (each bin covers 10 degrees)
 #BIN_SIZE = 360 / N_BINS
 BIN_SIZE = 3
@@ -27,6 +42,13 @@ N_BINS = 360//BIN_SIZE
 # Set a detection range for obstacles (in pixels)
 DETECTION_RANGE = 300
 
+# VFH+ steering
+THRESHOLD = 0.5       # steering density above which a sector is blocked
+THRESHOLD_LOW = 0.3   # steering density below which a blocked sector is free again
+VFH_CLEARANCE = WHEELCHAIR_HEIGHT / 2 + 5  # half the chair's extent across its heading plus a safety margin
+WIDE_VALLEY_BINS = int(80 // BIN_SIZE)     # free valleys wider than 80 degrees count as wide
+VFH_REACH = vfh_engine.enlarged_reach(DETECTION_RANGE, VFH_CLEARANCE)  # range of the histogram queries
+
 def get_wheelchair_corners(pos_x, pos_y, angle):
     """Returns the four corners of the wheelchair for better VFH detection."""
     half_w = WHEELCHAIR_WIDTH / 2
@@ -51,47 +73,15 @@ def get_wheelchair_corners(pos_x, pos_y, angle):
 
 def compute_vfh(pos_x, pos_y, obstacles, n_bins=N_BINS, detection_range=DETECTION_RANGE):
     """
-    Compute a simple vector field histogram.
-    For obstacles within the detection_range, the weight is computed as:
-       weight = (detection_range - distance) / detection_range
-    so that obstacles very close have weight ~1 and obstacles at the edge have weight ~0.
+    Compute a simple vector field histogram from the four corners of each obstacle.
+    For corners within the detection_range, the weight is computed as:
+       weight = 0.4 * (detection_range - distance) / detection_range
+    so that corners very close have weight ~0.4 and corners at the edge have weight ~0.
+    The histogram is then smoothed with a 3-bin moving average.
+    obstacles may be the list of obstacle dicts or an array from vfh_engine.rects_to_array.
     """
-    def get_obstacle_corners(rect):
-            return [
-            (rect.x, rect.y),  # Top-left
-            (rect.x + rect.width, rect.y),  # Top-right
-            (rect.x, rect.y + rect.height),  # Bottom-left
-            (rect.x + rect.width, rect.y + rect.height)  # Bottom-right
-        ]
-    histogram = [0] * n_bins
-    
-    for obs in obstacles:
-        r = obs["rect"]
-        # Compute obstacle center
-        #obs_cx = r.x + r.width / 2.0
-        #obs_cy = r.y + r.height / 2.0
- 
-        #dx = obs_cx - pos_x
-        #dy = obs_cy - pos_y
-        #distance = math.sqrt(dx*dx + dy*dy)
-        #angle = (math.degrees(math.atan2(dy, dx)) + 450) % 360
-        for corner_x, corner_y in get_obstacle_corners(r):
-            dx = corner_x - pos_x
-            dy = corner_y - pos_y
-            distance = math.sqrt(dx * dx + dy * dy)
-            if distance == 0 or distance > detection_range:
-                continue
-        
-        # Compute angle from the robot to the obstacle in degrees (0 to 360)
-            angle = (math.degrees(math.atan2(dy, dx)) + 360) % 360
-        # Weight increases as distance decreases (closer obstacles have higher weight)
-            weight = 0.4*(detection_range - distance) / detection_range
-            bin_index = int(angle // BIN_SIZE) % n_bins
-            histogram[bin_index] += weight
-    import numpy as np
-    histogram = np.convolve(histogram, np.ones(3)/3, mode='same')  # Moving average
-
-    return histogram
+    return vfh_engine.compute_vfh_corners(pos_x, pos_y, obstacles, n_bins, detection_range)
+
 def get_robot_corners(robot_center, robot_angle, width, height):
     """
     Returns the four corners of a rectangular robot given its center,
@@ -125,6 +115,7 @@ def draw_vfh_arrows(surface, robot_center, robot_angle, histogram, scale=100):
     Each arrow's direction corresponds to the bin's center angle, and
     its length is proportional to the histogram weight in that bin.
     """
+    drawn = []
     half_width = WHEELCHAIR_WIDTH / 2
     half_height = WHEELCHAIR_HEIGHT / 2
 
@@ -147,30 +138,18 @@ def draw_vfh_arrows(surface, robot_center, robot_angle, histogram, scale=100):
             #print(f"Corner {idx}: {corner}")
 
 
-    # Draw VFH arrows from each corner
-    for i, weight in enumerate(histogram):
-        if weight <= 0.2: #ignores objects smaller than this threshold
-            continue
+    # Draw VFH arrows from each corner, all bins of a corner in one batch
+    histogram = np.asarray(histogram)
+    bins = np.flatnonzero(histogram > 0.2) #ignores objects smaller than this threshold
+    # Compute the global angle for the center of each bin, adjusted to the wheelchair's orientation
+    rotated_angle = np.radians(bins * BIN_SIZE + BIN_SIZE / 2.0) + robot_angle
+    # Compute arrow length scaled by weight
+    MAX_DETECTION_RANGE = 75 #pixels
+    arrow_length = np.minimum(histogram[bins] * scale, MAX_DETECTION_RANGE)
 
-        # Compute the global angle for the center of this bin (in degrees)
-        bin_center_deg = i * BIN_SIZE + BIN_SIZE / 2.0
-        global_angle = math.radians(bin_center_deg)
-        rotated_angle = global_angle + robot_angle  # Adjust to the wheelchair's orientation
-        #print(f"Bin {i}: Global Angle {math.degrees(global_angle)}, Rotated Angle {math.degrees(rotated_angle)}")
-        # Compute arrow length scaled by weight
-        MAX_DETECTION_RANGE = 75 #pixels
-        arrow_length = min(weight * scale, MAX_DETECTION_RANGE)
-
-        for corner in robot_corners:
-            # Compute arrow endpoint relative to each corner
-            end_x = corner[0] + arrow_length * math.cos(rotated_angle)
-            end_y = corner[1] + arrow_length * math.sin(rotated_angle) #replaced - with +
-
-            # Draw the arrow as a line (yellow color)
-            pygame.draw.line(surface, (255, 255, 0), corner, (end_x, end_y), 2)
-
-            # Optionally, draw a small circle at the tip for clarity
-            pygame.draw.circle(surface, (255, 255, 0), (int(end_x), int(end_y)), 3)
+    for corner in robot_corners:
+        ends = overlay.ray_ends(corner, rotated_angle, arrow_length)
+        drawn.extend(overlay.draw_rays(surface, (255, 255, 0), corner, ends))
     # for i, weight in enumerate(histogram):
     #     if weight <=0:
     #         continue
@@ -193,62 +172,22 @@ def draw_vfh_arrows(surface, robot_center, robot_angle, histogram, scale=100):
     #     # Optionally, draw a small circle at the tip for clarity
     #     pygame.draw.circle(surface, (255, 255, 0), (int(end_x), int(end_y)), 3)
     #     #print(f"Bin {i}: Angle {bin_center_deg}, Local Angle {math.degrees(local_angle)}, Weight {weight}")
+    return drawn
+
 def draw_histogram(surface, pos, histogram, max_height=50):
     """
     Draws a simple vertical histogram on the given surface.
     'pos' is the top-left position where the histogram is drawn.
     Each bin is drawn as a vertical red bar.
     """
+    drawn = []
     bin_width = 10
     for i, value in enumerate(histogram):
         # Scale the value to a height (if value=1, height=max_height)
         height = int(value * max_height)
         rect = pygame.Rect(pos[0] + i * bin_width, pos[1] + max_height - height, bin_width - 1, height)
-        pygame.draw.rect(surface, (255, 0, 0), rect)  # red bars
-
-def get_obstacles():
-    obstacles = []
-    # Left obstacle: Grass (green)
-    obstacles.append({
-        "rect": pygame.Rect(660, 0, 30, 150),
-        "color": (128, 128, 128)  # grey
-    })
-    # Right obstacle: Road (grey)
-    obstacles.append({
-        "rect": pygame.Rect(750, 0, 30, 150),
-        "color": (128, 128, 128)  # grey
-    })
-    # Ramp obstacles
-    obstacles.append({
-        "rect": pygame.Rect(440, 150, 250, 20),
-        "color": (0, 128, 0)  # 1sidewalk
-    })
-    obstacles.append({
-        "rect": pygame.Rect(440, 260, 400, 20),
-        "color": (0, 128, 0)  # 2sidewalk
-    })
-    obstacles.append({
-        "rect": pygame.Rect(750, 150, 100, 20),
-        "color": (0, 128, 0)  # 3sidewalk 
-    })
-    # Bedroom layout obstacles
-    obstacles.append({
-        "rect": pygame.Rect(30, 350, 150, 80),
-        "color": (200, 0, 0)  # bed (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(250, 350, 80, 50),
-        "color": (200, 0, 0)  # dresser (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(30, 500, 40, 40),
-        "color": (200, 0, 0)  # nightstand (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(150, 500, 60, 40),
-        "color": (200, 0, 0)  # table (red)
-    })
-    return obstacles
+        drawn.append(pygame.draw.rect(surface, (255, 0, 0), rect))  # red bars
+    return drawn
 
 def main_menu():
     pygame.init()
@@ -287,116 +226,229 @@ def main_menu():
         clock.tick(60)
     
     return mode
-def simulation(mode):
+def read_inputs(mode):
+    """(forward_speed, turning_input) from the keys of the chosen control mode."""
+    keys = pygame.key.get_pressed()
+    user_forward_speed = 0
+    user_turning_input = 0
+
+    if mode == "head":
+        if keys[pygame.K_UP]:
+            user_forward_speed = SPEED_SCALE
+        elif keys[pygame.K_DOWN]:
+            user_forward_speed = -SPEED_SCALE
+        if keys[pygame.K_LEFT]:
+            user_turning_input = -TURNING_SCALE
+        elif keys[pygame.K_RIGHT]:
+            user_turning_input = TURNING_SCALE
+    elif mode == "head_sip":
+        if keys[pygame.K_i]:
+            user_forward_speed = SPEED_SCALE
+        elif keys[pygame.K_l]:
+            user_forward_speed = -SPEED_SCALE
+        if keys[pygame.K_p]:
+            user_turning_input = -TURNING_SCALE
+        elif keys[pygame.K_k]:
+            user_turning_input = TURNING_SCALE
+    
+    if keys[pygame.K_z]:
+        user_turning_input -= FINE_TURN_SCALE
+    if keys[pygame.K_x]:
+        user_turning_input += FINE_TURN_SCALE
+    return user_forward_speed, user_turning_input
+
+def new_state():
+    """Chair at the start pose with this simulator's VFH+ steering."""
+    return sim_core.WheelchairState(START_POS[0], START_POS[1], START_ANGLE,
+                                    vfh_engine.VFHPlus(N_BINS, THRESHOLD_LOW, THRESHOLD, WIDE_VALLEY_BINS))
+
+def step(state, inputs, dt, obstacle_grid, cache, profiler=None):
+    """
+    Advances the chair by one timestep: VFH+ steering, slowing down ahead of obstacles,
+    motion and the collision reset. Shared by the window and the headless replay.
+
+    :param state: sim_core.WheelchairState from new_state, updated in place.
+    :param inputs: (forward_speed, turning_input) from read_inputs or an input log.
+    :return: (vfh, collided)
+    """
+    forward_speed, user_turning_input = inputs
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+    
+    # Adjust forward speed based on VFH
+    vfh, enlarged = cache.get(pos_x, pos_y)
+    current_heading_deg = (math.degrees(angle) + 360) % 360
+    current_bin = int(current_heading_deg // BIN_SIZE)
+    density_ahead = vfh[current_bin]
+
+    # VFH+ picks a free valley once the sector ahead is blocked
+    steering_vfh = vfh_engine.smooth_histogram(enlarged)
+    vfh_turn_adjustment = 0
+    best_bin = state.steering.steer(steering_vfh, current_bin)
+    if best_bin is not None:
+        desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE / 2)
+        angle_diff = (desired_heading - angle + math.pi) % (2 * math.pi) - math.pi
+        vfh_turn_adjustment = TURNING_SCALE * angle_diff
+
+    # Adjust forward speed based on obstacle density
+    forward_threshold = 0.5  # threshold to reduce speed if obstacles are close
+    forward_scaling = 1.0
+    if density_ahead > forward_threshold:
+        forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
+
+    forward_speed *= forward_scaling
+
+    # Combine turning adjustments (user input + VFH)
+    turning_input = user_turning_input + vfh_turn_adjustment
+    if profiler is not None:
+        profiler.lap("vfh")
+
+    # Update position and angle
+    start_pose = (pos_x, pos_y, angle)
+    angle += turning_input * dt
+    pos_x += forward_speed * math.cos(angle) * dt
+    pos_y += forward_speed * math.sin(angle) * dt
+    state.pos_x, state.pos_y, state.angle = pos_x, pos_y, angle
+    state.time += dt
+    state.steps += 1
+
+    # Collision detection of the rotated wheelchair swept over the step
+    collided = swept_collision.first_impact(start_pose, (pos_x, pos_y, angle),
+                                            WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, obstacle_grid) is not None
+    if collided:
+        state.collisions += 1
+        state.reset()
+    if profiler is not None:
+        profiler.lap("collision")
+    return vfh, collided
+
+def draw_frame(screen, renderer, chair_sprites, state, vfh, profiler, view, font=None):
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+    view.follow(pos_x, pos_y)
+    renderer.begin_frame()
+    
+    # Draw the VFH histogram and arrows
+    renderer.mark(draw_histogram(screen, (10, 10), vfh))
+    renderer.mark(draw_vfh_arrows(screen, view.to_screen(int(pos_x), int(pos_y)), angle, vfh, scale=100))
+    
+    renderer.mark(chair_sprites.blit(screen, angle, view.to_screen(pos_x, pos_y)))
+    
+    renderer.mark(profiler.draw_overlay(screen, font))
+    profiler.lap("draw")
+    
+    renderer.end_frame()
+    profiler.lap("flip")
+
+def chair_sprite_cache():
+    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
+    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    # Rotations are made once per degree of heading and reused
+    return sprite_cache.RotatedSpriteCache(wheelchair_surf)
+
+def simulation(mode, record_path=None):
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Wheelchair Simulation")
     clock = pygame.time.Clock()
+    # Per-stage frame timings: F3 shows them, --profile <file> records them from the start
+    profiler = frame_profiler.from_args(sys.argv)
+    profiler_font = pygame.font.SysFont("monospace", 14)
     
-    obstacles = get_obstacles()
+    obstacle_grid, field, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, DETECTION_RANGE,
+                                                                      VFH_REACH)
+    # Standing still or creeping reuses the previous histograms
+    cache = vfh_cache.perception_cache(vfh_cache.SceneVersion(), obstacle_grid, compute_vfh, N_BINS, DETECTION_RANGE,
+                                       VFH_CLEARANCE, field)
+    # Optionally record the inputs so the run can be replayed with --headless
+    recorder = sim_core.InputRecorder(record_path) if record_path else None
     
-    pos_x, pos_y = START_POS
-    angle = START_ANGLE
-    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
-    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    state = new_state()
+    chair_sprites = chair_sprite_cache()
+    
+    # Physics runs at PHYSICS_HZ independent of how long drawing takes
+    timestep = FixedTimestep(PHYSICS_HZ, RENDER_HZ)
+    dt = timestep.dt
     
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0
+        frame_time = clock.tick(PHYSICS_HZ) / 1000.0
+        
+        profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
         
         # Get user inputs
-        keys = pygame.key.get_pressed()
-        forward_speed = 0
-        user_turning_input = 0
-
-        if mode == "head":
-            if keys[pygame.K_UP]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_DOWN]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_LEFT]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_RIGHT]:
-                user_turning_input = TURNING_SCALE
-        elif mode == "head_sip":
-            if keys[pygame.K_i]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_l]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_p]:
-                user_turning_input = -TURNING_SCALE
-            elif keys[pygame.K_k]:
-                user_turning_input = TURNING_SCALE
-        
-        if keys[pygame.K_z]:
-            user_turning_input -= FINE_TURN_SCALE
-        if keys[pygame.K_x]:
-            user_turning_input += FINE_TURN_SCALE
-        
-        # Adjust forward speed based on VFH
-        vfh = compute_vfh(pos_x, pos_y, obstacles)
-        current_heading_deg = (math.degrees(angle) + 360) % 360
-        current_bin = int(current_heading_deg // BIN_SIZE)
-        density_ahead = vfh[current_bin]
-        
-        # Adjust turning based on VFH as before:
-        THRESHOLD = 0.2 # tuning parameter for turning adjustment
-        vfh_turn_adjustment = 0
-        if density_ahead > THRESHOLD:
-            best_bin = min(range(N_BINS), key=lambda i: vfh[i])  # Find the least dense direction
-            desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE / 2)
-            angle_diff = (desired_heading - angle + math.pi) % (2 * math.pi) - math.pi
-            vfh_turn_adjustment = TURNING_SCALE * angle_diff
-        
-        # Adjust forward speed based on obstacle density
-        forward_threshold = 0.5  # threshold to reduce speed if obstacles are close
-        forward_scaling = 1.0
-        if density_ahead > forward_threshold:
-            forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
-        
-        forward_speed *= forward_scaling
-        
-        # Combine turning adjustments (user input + VFH)
-        turning_input = user_turning_input + vfh_turn_adjustment
-        
-        # Update position and angle
-        angle += turning_input * dt
-        pos_x += forward_speed * math.cos(angle) * dt
-        pos_y += forward_speed * math.sin(angle) * dt
-        
-        # Collision detection
-        wheelchair_rect = pygame.Rect(0, 0, WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT)
-        wheelchair_rect.center = (pos_x, pos_y)
-        if any(wheelchair_rect.colliderect(obs["rect"]) for obs in obstacles):
-            print("Collision detected! Resetting position.")
-            pos_x, pos_y = START_POS
-            angle = START_ANGLE
+        inputs = read_inputs(mode)
+        profiler.lap("input")
         
-        # Drawing
-        screen.fill(COLOR_BG)
-        for obs in obstacles:
-            pygame.draw.rect(screen, obs["color"], obs["rect"])
+        for _ in range(timestep.advance(frame_time)):
+            if recorder is not None:
+                recorder.record(dt, *inputs)
+            vfh, collided = step(state, inputs, dt, obstacle_grid, cache, profiler)
+            if collided:
+                print("Collision detected! Resetting position.")
         
-        # Draw the VFH histogram and arrows
-        draw_histogram(screen, (10, 10), vfh)
-        draw_vfh_arrows(screen, (int(pos_x), int(pos_y)), angle, vfh, scale=100)
-        
-        rotated_surf = pygame.transform.rotate(wheelchair_surf, -math.degrees(angle))
-        rotated_rect = rotated_surf.get_rect(center=(pos_x, pos_y))
-        screen.blit(rotated_surf, rotated_rect.topleft)
-        
-        pygame.display.flip()
+        if not timestep.should_render():
+            profiler.end_frame()
+            continue
+        draw_frame(screen, renderer, chair_sprites, state, vfh, profiler, view, profiler_font)
+        profiler.end_frame()
     
+    if recorder is not None:
+        recorder.close()
+    print("VFH cache:", cache.stats())
+    profiler.dump()
     pygame.quit()
     sys.exit()
 
+def headless_simulation(input_log, frames_dir=None, hash_path=None):
+    """
+    Replays a recorded input log without a window and unthrottled (see headless.replay),
+    writing frame hashes and optionally PNG frames for comparing renders between commits.
+    """
+    headless.use_dummy_drivers()
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    obstacle_grid, field, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, DETECTION_RANGE,
+                                                                      VFH_REACH)
+    cache = vfh_cache.perception_cache(vfh_cache.SceneVersion(), obstacle_grid, compute_vfh, N_BINS, DETECTION_RANGE,
+                                       VFH_CLEARANCE, field)
+    state = new_state()
+    chair_sprites = chair_sprite_cache()
+    profiler = frame_profiler.FrameProfiler()
+    sink = headless.FrameSink(frames_dir)
+    
+    vfh = None
+    def advance(dt, inputs):
+        nonlocal vfh
+        vfh, _ = step(state, inputs, dt, obstacle_grid, cache)
+    def draw():
+        draw_frame(screen, renderer, chair_sprites, state, vfh, profiler, view)
+    
+    headless.replay(sim_core.load_input_log(input_log), advance, draw, screen, sink, RENDER_HZ)
+    if hash_path:
+        sink.write_hashes(hash_path)
+    print(f"{input_log}: {state.steps} steps, {state.collisions} collisions, frames: {sink.summary()}")
+    pygame.quit()
+
 def main():
+    # --headless <input_log.csv> [--frames <dir>] [--hashes <file>] replays a log without a window
+    options = headless.parse_args(sys.argv[1:])
+    if options is not None:
+        headless_simulation(*options)
+        return
+    # Optional argument: CSV file to record the driving inputs to
+    args = sys.argv[1:]
+    for flag in ("--profile", "--scene"):
+        if flag in args:
+            del args[args.index(flag):args.index(flag) + 2]
+    record_path = args[0] if args else None
     mode = main_menu()
-    simulation(mode)
+    simulation(mode, record_path)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,8 +3,24 @@ import sys
 import math
 import pygame
 from pygame.locals import *
+import headless
+# Without a window, GL has to render through OSMesa, chosen before OpenGL is imported
+if "--headless" in sys.argv:
+    try:
+        headless.use_osmesa()
+    except RuntimeError as error:
+        sys.exit(error)
 from OpenGL.GL import *
 from OpenGL.GLU import *
+import spatial_grid
+import swept_collision
+import distance_field
+import gl_scene
+import frustum
+import sim_core
+import scene_file
+import frame_profiler
+from fixed_timestep import FixedTimestep, PHYSICS_HZ, RENDER_HZ
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
@@ -26,6 +42,14 @@ COLOR_BG = (30, 30, 30)
 COLOR_WHEELCHAIR = (0, 0, 255)
 
 OBSTACLE_HEIGHT = WHEELCHAIR_HEIGHT / 2
+GROUND_EXTENT = 1000      # the ground spans -GROUND_EXTENT..GROUND_EXTENT in X and Z
+# Obstacle layout; --scene <file> loads another one (see scene_file.py)
+SCENE_PATH = scene_file.path_from_args(sys.argv)
+
+# Camera projection (also used for frustum culling)
+CAMERA_FOV_Y = 60         # vertical field of view in degrees
+CAMERA_NEAR = 0.1
+CAMERA_FAR = 1000.0
 
 # Parameters for collision avoidance & vector drawing (in 2D X-Z plane)
 DETECTION_RANGE = 500
@@ -40,19 +64,10 @@ def aabb_collision(ax, az, aw, ad, bx, bz, bw, bd):
     return (abs(ax - bx) * 2 < (aw + bw)) and (abs(az - bz) * 2 < (ad + bd))
 
 # -------------------------
-# Ground Drawing (3D)
+# Box Drawing (3D)
 # -------------------------
-def draw_ground():
-    glColor3f(COLOR_BG[0]/255.0, COLOR_BG[1]/255.0, COLOR_BG[2]/255.0)
-    glBegin(GL_QUADS)
-    glVertex3f(-1000, 0, -1000)
-    glVertex3f( 1000, 0, -1000)
-    glVertex3f( 1000, 0,  1000)
-    glVertex3f(-1000, 0,  1000)
-    glEnd()
-
-
-
+# Immediate mode; only used for the moving wheelchair. The ground and static
+# obstacles live in vertex buffers (see gl_scene.py).
 def draw_box(center, size, color, rotation=0, draw_edges=False):
   
     cx, cy, cz = center
@@ -111,35 +126,8 @@ def draw_box(center, size, color, rotation=0, draw_edges=False):
 # Obstacle Definitions
 # -------------------------
 def get_obstacles():
-    obstacles = []
-    def rect_to_obstacle(rect, color):
-        # Here, rect.x and rect.y represent X and Z in the simulation.
-        cx = rect.x + rect.width / 2.0
-        cz = rect.y + rect.height / 2.0
-        cy = OBSTACLE_HEIGHT / 2.0  # so the box sits on the ground
-        size = (rect.width, OBSTACLE_HEIGHT, rect.height)
-        return {'center': (cx, cy, cz), 'size': size, 'color': color}
-    
-    # Top right: "sidewalk"/ramp area
-    obs_list = [
-        (pygame.Rect(660, 0, 30, 150), (128, 128, 128)),
-        (pygame.Rect(750, 0, 30, 150), (128, 128, 128)),
-        (pygame.Rect(440, 150, 250, 20), (0, 128, 0)),
-        (pygame.Rect(440, 260, 400, 20), (0, 128, 0)),
-        (pygame.Rect(750, 150, 100, 20), (0, 128, 0))
-    ]
-    for rect, color in obs_list:
-        obstacles.append(rect_to_obstacle(rect, color))
-    
-    # Bottom left: Bedroom layout
-    obs_list = [
-        (pygame.Rect(30, 350, 150, 80), (200, 0, 0)),
-        (pygame.Rect(250, 350, 80, 50), (200, 0, 0)),
-        (pygame.Rect(30, 500, 40, 40), (200, 0, 0)),
-        (pygame.Rect(150, 500, 60, 40), (200, 0, 0))
-    ]
-    for rect, color in obs_list:
-        obstacles.append(rect_to_obstacle(rect, color))
+    # Floor plan x, y of the scene become X, Z here
+    obstacles = scene_file.load(SCENE_PATH).obstacles_3d(OBSTACLE_HEIGHT)
     
     # Walls around environment
     env_left = 0
@@ -174,41 +162,49 @@ def get_obstacles():
 # -------------------------
 # Soft Collision Avoidance (2D version applied in X-Z plane)
 # -------------------------
-def apply_soft_collision_avoidance_3d(pos_x, pos_z, angle, forward_speed, turning_input, obstacles):
+def apply_soft_collision_avoidance_3d(pos_x, pos_z, angle, forward_speed, turning_input, obstacles, field=None):
     # Effective heading: if moving forward, use current angle; if reverse, use angle+pi.
     if forward_speed >= 0:
         effective_heading = angle
     else:
         effective_heading = (angle + math.pi) % (2*math.pi)
     
-    min_dist = None
-    best_angle_diff = 0
-    for obs in obstacles:
-        cx, cy, cz = obs['center']
-        w, h, d = obs['size']
-        left = cx - w/2
-        right = cx + w/2
-        top = cz - d/2
-        bottom = cz + d/2
-        closest_x = max(left, min(pos_x, right))
-        closest_z = max(top, min(pos_z, bottom))
-        dx = closest_x - pos_x
-        dz = closest_z - pos_z
-        distance = math.sqrt(dx*dx + dz*dz)
-        if distance < 1 or distance > DETECTION_RANGE:
-            continue
-        global_angle = math.atan2(dz, dx)
-        angle_diff = (global_angle - effective_heading + math.pi) % (2*math.pi) - math.pi
-        if abs(angle_diff) > FOV_RAD / 2:
-            continue
-        # Ensure obstacle is "in front" along the effective heading.
-        effective_vec = (math.cos(effective_heading), math.sin(effective_heading))
-        dot = dx * effective_vec[0] + dz * effective_vec[1]
-        if dot < 0:
-            continue
-        if min_dist is None or distance < min_dist:
-            min_dist = distance
-            best_angle_diff = angle_diff
+    # The distance field gives the nearest obstacle directly when it lies ahead;
+    # otherwise the obstacles are searched
+    ahead = None
+    if field is not None:
+        ahead = sim_core.field_nearest_ahead(field, pos_x, pos_z, effective_heading, FOV_RAD)
+    if ahead is not None:
+        min_dist, best_angle_diff = ahead
+    else:
+        min_dist = None
+        best_angle_diff = 0
+        for obs in obstacles:
+            cx, cy, cz = obs['center']
+            w, h, d = obs['size']
+            left = cx - w/2
+            right = cx + w/2
+            top = cz - d/2
+            bottom = cz + d/2
+            closest_x = max(left, min(pos_x, right))
+            closest_z = max(top, min(pos_z, bottom))
+            dx = closest_x - pos_x
+            dz = closest_z - pos_z
+            distance = math.sqrt(dx*dx + dz*dz)
+            if distance < 1 or distance > DETECTION_RANGE:
+                continue
+            global_angle = math.atan2(dz, dx)
+            angle_diff = (global_angle - effective_heading + math.pi) % (2*math.pi) - math.pi
+            if abs(angle_diff) > FOV_RAD / 2:
+                continue
+            # Ensure obstacle is "in front" along the effective heading.
+            effective_vec = (math.cos(effective_heading), math.sin(effective_heading))
+            dot = dx * effective_vec[0] + dz * effective_vec[1]
+            if dot < 0:
+                continue
+            if min_dist is None or distance < min_dist:
+                min_dist = distance
+                best_angle_diff = angle_diff
     if min_dist is not None and min_dist < SOFT_COLLISION_DIST:
         forward_scale = min_dist / SOFT_COLLISION_DIST
         forward_speed *= forward_scale
@@ -291,135 +287,254 @@ def main_menu():
     return mode
 
 # -------------------------
-# 3D Simulation
+# Simulation step and frame
 # -------------------------
-def simulation(mode):
-    pygame.init()
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), DOUBLEBUF | OPENGL)
-    pygame.display.set_caption("Wheelchair Simulation")
+def step_3d(pose, forward_speed, turning_input, fine_tuning, dt, obstacle_grid, field, profiler=None):
+    """
+    Advances the wheelchair by one physics step.
+
+    :param pose: (pos_x, pos_z, angle) before the step.
+    :param fine_tuning: True while the fine-turn keys are held (disables avoidance).
+    :param profiler: Optional frame_profiler.FrameProfiler charged with the avoidance
+                     and collision stages.
+    :return: ((pos_x, pos_z, angle), collided); the pose is reset to the start on a collision.
+    """
+    pos_x, pos_z, angle = pose
     
-    # Set up perspective projection
+    # ----- Apply Collision Avoidance (if not fine-tuning) -----
+    # The distance field rules out most steps with a single lookup and otherwise usually
+    # knows the nearest obstacle; only obstacles within SOFT_COLLISION_DIST can change the result
+    if not fine_tuning and not field.is_clear(pos_x, pos_z, SOFT_COLLISION_DIST):
+        nearby = obstacle_grid.query_radius(pos_x, pos_z, SOFT_COLLISION_DIST)
+        forward_speed, turning_input = apply_soft_collision_avoidance_3d(
+            pos_x, pos_z, angle, forward_speed, turning_input, nearby, field
+        )
+    if profiler is not None:
+        profiler.lap("avoidance")
+    
+    # Update wheelchair state
+    angle += turning_input * dt
+    pos_x += forward_speed * math.cos(angle) * dt
+    pos_z += forward_speed * math.sin(angle) * dt
+    
+    # Swept collision detection of the rotated wheelchair in the X-Z plane
+    # (the depth lies along the heading, the width across it)
+    collided = swept_collision.first_impact(pose, (pos_x, pos_z, angle),
+                                            WHEELCHAIR_DEPTH, WHEELCHAIR_WIDTH, obstacle_grid)
+    if profiler is not None:
+        profiler.lap("collision")
+    if collided:
+        return (START_POS[0], START_POS[1], START_ANGLE), True
+    return (pos_x, pos_z, angle), False
+
+def setup_projection():
     glViewport(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
-    gluPerspective(60, SCREEN_WIDTH/SCREEN_HEIGHT, 0.1, 1000.0)
+    gluPerspective(CAMERA_FOV_Y, SCREEN_WIDTH/SCREEN_HEIGHT, CAMERA_NEAR, CAMERA_FAR)
     glMatrixMode(GL_MODELVIEW)
     glLoadIdentity()
     glEnable(GL_DEPTH_TEST)
+
+def draw_scene(static_scene, obstacle_grid, pos_x, pos_z, angle):
+    """Renders the first-person view from the wheelchair at (pos_x, pos_z, angle)."""
+    # Compute wheelchair center in 3D
+    wheelchair_center = (pos_x, WHEELCHAIR_HEIGHT/2, pos_z)
+    
+    # ----- Set Up Camera -----
+    front_face = ( pos_x + math.cos(angle)*(WHEELCHAIR_DEPTH/2),
+                   WHEELCHAIR_HEIGHT/2,
+                   pos_z + math.sin(angle)*(WHEELCHAIR_DEPTH/2) )
+    extra_offset = 10  # extra distance in front of the wheelchair
+    camera_pos = ( front_face[0] + math.cos(angle)*extra_offset,
+                   front_face[1] + 5,
+                   front_face[2] + math.sin(angle)*extra_offset )
+    look_at = ( camera_pos[0] + math.cos(angle),
+                camera_pos[1],
+                camera_pos[2] + math.sin(angle) )
+    
+    glLoadIdentity()
+    gluLookAt(camera_pos[0], camera_pos[1], camera_pos[2],
+              look_at[0], look_at[1], look_at[2],
+              0, 1, 0)
+    
+    # ----- Drawing -----
+    glClearColor(COLOR_BG[0]/255.0, COLOR_BG[1]/255.0, COLOR_BG[2]/255.0, 1.0)
+    glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+    
+    # Only obstacles inside the view frustum are submitted; the spatial grid narrows
+    # the candidates down to the frustum's footprint first
+    view = frustum.Frustum(camera_pos, look_at, (0, 1, 0), CAMERA_FOV_Y, SCREEN_WIDTH/SCREEN_HEIGHT,
+                           CAMERA_NEAR, CAMERA_FAR)
+    visible = static_scene.cull(view, obstacle_grid.query_rect(*view.footprint()))
+    static_scene.draw(visible)
+    # Draw the moving wheelchair block
+    draw_box(wheelchair_center,
+             (WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, WHEELCHAIR_DEPTH),
+             COLOR_WHEELCHAIR,
+             rotation=math.degrees(angle),
+             draw_edges=False)
+    
+    # Optionally, draw obstacle vectors (yellow lines) for debugging
+    draw_obstacle_vectors_3d(obstacle_grid.query_radius(pos_x, pos_z, DETECTION_RANGE), pos_x, pos_z, angle)
+
+def draw_profiler_overlay(profiler, font):
+    """Draws the frame profiler's timings (if shown) into the top-right corner of the window."""
+    overlay = profiler.overlay_surface(font)
+    if overlay is None:
+        return
+    width, height = overlay.get_size()
+    # Rows bottom-up, as glDrawPixels expects
+    pixels = pygame.image.tobytes(overlay, "RGBA", True)
+    glDisable(GL_DEPTH_TEST)
+    glWindowPos2d(SCREEN_WIDTH - width - 10, SCREEN_HEIGHT - height - 10)
+    glDrawPixels(width, height, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+    glEnable(GL_DEPTH_TEST)
+
+
+# -------------------------
+# 3D Simulation
+# -------------------------
+def simulation(mode):
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), DOUBLEBUF | OPENGL)
+    pygame.display.set_caption("Wheelchair Simulation")
+    
+    # Set up perspective projection
+    setup_projection()
     
     obstacles = get_obstacles()
+    obstacle_grid = spatial_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)
+    # Avoidance only reacts to obstacles within SOFT_COLLISION_DIST
+    field = distance_field.DistanceField(obstacles, SOFT_COLLISION_DIST)
+    # Ground and obstacles are uploaded to the GPU once and drawn with two calls per frame
+    static_scene = gl_scene.StaticScene(obstacles, COLOR_BG, GROUND_EXTENT)
+    culled_shown = None
     
     # Initial wheelchair state (position on X-Z plane and rotation about Y)
     pos_x, pos_z = START_POS
     angle = START_ANGLE
     
     clock = pygame.time.Clock()
+    # Per-stage frame timings: F3 shows them, --profile <file> records them from the start
+    profiler = frame_profiler.from_args(sys.argv)
+    profiler_font = pygame.font.SysFont("monospace", 14)
+    # Physics runs at PHYSICS_HZ independent of how long drawing takes
+    timestep = FixedTimestep(PHYSICS_HZ, RENDER_HZ)
+    dt = timestep.dt
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0  # seconds
+        frame_time = clock.tick(PHYSICS_HZ) / 1000.0  # seconds
+        profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == QUIT:
                 running = False
+            elif event.type == KEYDOWN and event.key == K_F3:
+                profiler.toggle_overlay()
         
         # ----- Input Handling -----
         keys = pygame.key.get_pressed()
-        forward_speed = 0
-        turning_input = 0
+        user_forward_speed = 0
+        user_turning_input = 0
         
         if mode == "head":
             if keys[pygame.K_UP]:
-                forward_speed = SPEED_SCALE
+                user_forward_speed = SPEED_SCALE
             elif keys[pygame.K_DOWN]:
-                forward_speed = -SPEED_SCALE
+                user_forward_speed = -SPEED_SCALE
             if keys[pygame.K_LEFT]:
-                turning_input = -TURNING_SCALE
+                user_turning_input = -TURNING_SCALE
             elif keys[pygame.K_RIGHT]:
-                turning_input = TURNING_SCALE
+                user_turning_input = TURNING_SCALE
         elif mode == "head_sip":
             if keys[pygame.K_i]:
-                forward_speed = SPEED_SCALE
+                user_forward_speed = SPEED_SCALE
             elif keys[pygame.K_l]:
-                forward_speed = -SPEED_SCALE
+                user_forward_speed = -SPEED_SCALE
             if keys[pygame.K_p]:
-                turning_input = -TURNING_SCALE
+                user_turning_input = -TURNING_SCALE
             elif keys[pygame.K_k]:
-                turning_input = TURNING_SCALE
+                user_turning_input = TURNING_SCALE
         
         # Fine-tuning keys (z, x) add to turning but disable collision avoidance:
         fine_tuning = keys[pygame.K_z] or keys[pygame.K_x]
         if keys[pygame.K_z]:
-            turning_input -= FINE_TURN_SCALE
+            user_turning_input -= FINE_TURN_SCALE
         if keys[pygame.K_x]:
-            turning_input += FINE_TURN_SCALE
+            user_turning_input += FINE_TURN_SCALE
         
-        # ----- Apply Collision Avoidance (if not fine-tuning) -----
-        if not fine_tuning:
-            forward_speed, turning_input = apply_soft_collision_avoidance_3d(
-                pos_x, pos_z, angle, forward_speed, turning_input, obstacles
-            )
+        profiler.lap("input")
         
-        # Update wheelchair state
-        angle += turning_input * dt
-        pos_x += forward_speed * math.cos(angle) * dt
-        pos_z += forward_speed * math.sin(angle) * dt
-        
-        # Simple collision detection using AABB in X-Z plane
-        for obs in obstacles:
-            bx = obs['center'][0]
-            bz = obs['center'][2]
-            bw = obs['size'][0]
-            bd = obs['size'][2]
-            if aabb_collision(pos_x, pos_z, WHEELCHAIR_WIDTH, WHEELCHAIR_DEPTH, bx, bz, bw, bd):
+        for _ in range(timestep.advance(frame_time)):
+            (pos_x, pos_z, angle), collided = step_3d(
+                (pos_x, pos_z, angle), user_forward_speed, user_turning_input, fine_tuning, dt, obstacle_grid, field,
+                profiler
+            )
+            if collided:
                 print("Collision detected! Resetting position.")
-                pos_x, pos_z = START_POS
-                angle = START_ANGLE
-                break
-        
-        # Compute wheelchair center in 3D
-        wheelchair_center = (pos_x, WHEELCHAIR_HEIGHT/2, pos_z)
-        
-        # ----- Set Up Camera -----
-        front_face = ( pos_x + math.cos(angle)*(WHEELCHAIR_DEPTH/2),
-                       WHEELCHAIR_HEIGHT/2,
-                       pos_z + math.sin(angle)*(WHEELCHAIR_DEPTH/2) )
-        extra_offset = 10  # extra distance in front of the wheelchair
-        camera_pos = ( front_face[0] + math.cos(angle)*extra_offset,
-                       front_face[1] + 5,
-                       front_face[2] + math.sin(angle)*extra_offset )
-        look_at = ( camera_pos[0] + math.cos(angle),
-                    camera_pos[1],
-                    camera_pos[2] + math.sin(angle) )
-        
-        glLoadIdentity()
-        gluLookAt(camera_pos[0], camera_pos[1], camera_pos[2],
-                  look_at[0], look_at[1], look_at[2],
-                  0, 1, 0)
-        
-        # ----- Drawing -----
-        glClearColor(COLOR_BG[0]/255.0, COLOR_BG[1]/255.0, COLOR_BG[2]/255.0, 1.0)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
-        draw_ground()
-        for obs in obstacles:
-            draw_box(obs['center'], obs['size'], obs['color'], rotation=0, draw_edges=True)
-        
-        # Draw the moving wheelchair block
-        draw_box(wheelchair_center,
-                 (WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, WHEELCHAIR_DEPTH),
-                 COLOR_WHEELCHAIR,
-                 rotation=math.degrees(angle),
-                 draw_edges=False)
+        if not timestep.should_render():
+            profiler.end_frame()
+            continue
         
-        # Optionally, draw obstacle vectors (yellow lines) for debugging
-        draw_obstacle_vectors_3d(obstacles, pos_x, pos_z, angle)
+        draw_scene(static_scene, obstacle_grid, pos_x, pos_z, angle)
+        draw_profiler_overlay(profiler, profiler_font)
+        profiler.lap("draw")
+        if static_scene.culled != culled_shown:
+            culled_shown = static_scene.culled
+            pygame.display.set_caption("Wheelchair Simulation - %d drawn, %d culled"
+                                       % (static_scene.submitted, static_scene.culled))
         
         pygame.display.flip()
+        profiler.lap("flip")
+        profiler.end_frame()
     
+    print("Frustum culling:", static_scene.stats())
+    profiler.dump()
+    static_scene.delete()
     pygame.quit()
     sys.exit()
 
+def headless_simulation(input_log, frames_dir=None, hash_path=None):
+    """
+    Replays a recorded input log (see sim_core.InputRecorder) without a window and
+    unthrottled, rendering through OSMesa a frame every 1/RENDER_HZ of simulated time.
+    """
+    context = headless.OSMesaContext(SCREEN_WIDTH, SCREEN_HEIGHT)
+    setup_projection()
+    
+    obstacles = get_obstacles()
+    obstacle_grid = spatial_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)
+    field = distance_field.DistanceField(obstacles, SOFT_COLLISION_DIST)
+    static_scene = gl_scene.StaticScene(obstacles, COLOR_BG, GROUND_EXTENT)
+    
+    sink = headless.FrameSink(frames_dir)
+    pose = (START_POS[0], START_POS[1], START_ANGLE)
+    sim_time = 0.0
+    next_render = 0.0
+    collisions = 0
+    for dt, forward_speed, turning_input in sim_core.load_input_log(input_log):
+        pose, collided = step_3d(pose, forward_speed, turning_input, False, dt, obstacle_grid, field)
+        collisions += collided
+        sim_time += dt
+        if sim_time >= next_render:
+            next_render += 1.0 / RENDER_HZ
+            draw_scene(static_scene, obstacle_grid, *pose)
+            sink.add(context.read_pixels(), (SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    if hash_path:
+        sink.write_hashes(hash_path)
+    print(f"{input_log}: {collisions} collisions, frames: {sink.summary()}, culling: {static_scene.stats()}")
+    static_scene.delete()
+    context.destroy()
+
 def main():
+    # --headless <input_log.csv> [--frames <dir>] [--hashes <file>] replays a log without a window
+    options = headless.parse_args(sys.argv[1:])
+    if options is not None:
+        headless_simulation(*options)
+        return
     mode = main_menu()  # Show the home screen and choose control mode.
     simulation(mode)    # Run the 3D simulation.
 
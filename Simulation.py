@@ -2,6 +2,14 @@
 import sys
 import math
 import pygame
+import swept_collision
+import dirty_renderer
+import sprite_cache
+import scene_file
+import frame_profiler
+import headless
+import sim_core
+from fixed_timestep import FixedTimestep, PHYSICS_HZ, RENDER_HZ
 
 
 SCREEN_WIDTH = 800
@@ -12,6 +20,7 @@ WHEELCHAIR_WIDTH = 40
 WHEELCHAIR_HEIGHT = 60
 START_POS = (100, 100)
 START_ANGLE = 0  # in radians
+GRID_CELL_SIZE = 100  # spatial index cell size (drawing culling and collision)
 
 #Movement scales
 SPEED_SCALE = 200       #pixels per second for forward/backward motion
@@ -22,52 +31,8 @@ FINE_TURN_SCALE = 0.5   #additional radians per second from fine-tune keys (z an
 COLOR_BG = (30, 30, 30)
 COLOR_WHEELCHAIR = (0, 200, 0)
 
-
-def get_obstacles():
-   
-    obstacles = []
-    #Left obstacle: Grass (green)
-    obstacles.append({
-        "rect": pygame.Rect(660, 0, 30, 150),
-        "color": (128, 128, 128)  # grey
-    })
-    # Right obstacle: Road (grey)
-    obstacles.append({
-        "rect": pygame.Rect(750, 0, 30, 150),
-        "color": (128, 128, 128)  # grey
-    })
-    # Ramp obstacle
-    obstacles.append({
-        "rect": pygame.Rect(440, 150, 250, 20),
-        "color": (0, 128, 0)  # 1sidewalk
-    })
-    obstacles.append({
-        "rect": pygame.Rect(440, 260, 400, 20),
-        "color": (0, 128, 0)  # 2sidewalk
-    })
-    obstacles.append({
-        "rect": pygame.Rect(750, 150, 100, 20),
-        "color": (0, 128, 0)  # 3sidewalk 
-    })
-    
-    #bedroom layout (obstacles spaced out)
-    obstacles.append({
-        "rect": pygame.Rect(30, 350, 150, 80),
-        "color": (200, 0, 0)  # bed (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(250, 350, 80, 50),
-        "color": (200, 0, 0)  # dresser (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(30, 500, 40, 40),
-        "color": (200, 0, 0)  # nightstand (red)
-    })
-    obstacles.append({
-        "rect": pygame.Rect(150, 500, 60, 40),
-        "color": (200, 0, 0)  # table (red)
-    })
-    return obstacles
+# Obstacle layout; --scene <file> loads another one (see scene_file.py)
+SCENE_PATH = scene_file.path_from_args(sys.argv)
 
 
 def main_menu():
@@ -114,94 +79,181 @@ def main_menu():
     
     return mode
 
-def simulation(mode):
+def read_inputs(mode):
+    """(forward_speed, turning_input) from the keys of the chosen control mode."""
+    keys = pygame.key.get_pressed()
+    forward_speed = 0
+    turning_input = 0
+    
+    if mode == "head":
+        # Main movement via arrow keys:
+        if keys[pygame.K_UP]:
+            forward_speed = SPEED_SCALE
+        elif keys[pygame.K_DOWN]:
+            forward_speed = -SPEED_SCALE
+        if keys[pygame.K_LEFT]:
+            turning_input = -TURNING_SCALE
+        elif keys[pygame.K_RIGHT]:
+            turning_input = TURNING_SCALE
+        
+    elif mode == "head_sip":
+        #Main movement via Sip and Puff keys:
+        if keys[pygame.K_i]:
+            forward_speed = SPEED_SCALE
+        elif keys[pygame.K_l]:
+            forward_speed = -SPEED_SCALE
+        if keys[pygame.K_p]:
+            turning_input = -TURNING_SCALE
+        elif keys[pygame.K_k]:
+            turning_input = TURNING_SCALE
+    
+    #In both modes, use z and x for fine turn adjustments.
+    if keys[pygame.K_z]:
+        turning_input -= FINE_TURN_SCALE
+    if keys[pygame.K_x]:
+        turning_input += FINE_TURN_SCALE
+    return forward_speed, turning_input
+
+def step(state, inputs, dt, obstacle_grid, profiler=None):
+    """
+    Advances the chair by one timestep and resets it to the start pose on a collision.
+    Shared by the window and the headless replay; returns True when the chair collided.
+    """
+    forward_speed, turning_input = inputs
+    start_pose = (state.pos_x, state.pos_y, state.angle)
+    state.angle += turning_input * dt
+    state.pos_x += forward_speed * math.cos(state.angle) * dt
+    state.pos_y += forward_speed * math.sin(state.angle) * dt
+    state.time += dt
+    state.steps += 1
+    
+    # Check for collision with any obstacle, sweeping the rotated wheelchair over the step
+    collided = swept_collision.first_impact(start_pose, (state.pos_x, state.pos_y, state.angle),
+                                            WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, obstacle_grid) is not None
+    if collided:
+        state.collisions += 1
+        state.reset()
+    if profiler is not None:
+        profiler.lap("collision")
+    return collided
+
+def draw_frame(screen, renderer, chair_sprites, state, profiler, view, font=None):
+    # Restore the pre-rendered background and obstacles under last frame's chair
+    view.follow(state.pos_x, state.pos_y)
+    renderer.begin_frame()
+    
+    # Wheelchair image rotated to its angle (from the sprite cache)
+    renderer.mark(chair_sprites.blit(screen, state.angle, view.to_screen(state.pos_x, state.pos_y)))
+    
+    renderer.mark(profiler.draw_overlay(screen, font))
+    profiler.lap("draw")
+    
+    renderer.end_frame()
+    profiler.lap("flip")
+
+def chair_sprite_cache():
+    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
+    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    # Rotations are made once per degree of heading and reused
+    return sprite_cache.RotatedSpriteCache(wheelchair_surf)
+
+def simulation(mode, record_path=None):
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Wheelchair Simulation")
     clock = pygame.time.Clock()
+    # Per-stage frame timings: F3 shows them, --profile <file> records them from the start
+    profiler = frame_profiler.from_args(sys.argv)
+    profiler_font = pygame.font.SysFont("monospace", 14)
     
-    obstacles = get_obstacles()
+    # Scrolling view of the scene; each frame only repaints what the chair touches
+    obstacle_grid, _, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, GRID_CELL_SIZE)
+    # Optionally record the inputs so the run can be replayed with --headless
+    recorder = sim_core.InputRecorder(record_path) if record_path else None
     
     # Initialize wheelchair state
-    pos_x, pos_y = START_POS
-    angle = START_ANGLE
-    wheelchair_surf = pygame.Surface((WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT), pygame.SRCALPHA)
-    wheelchair_surf.fill(COLOR_WHEELCHAIR)
+    state = sim_core.WheelchairState(START_POS[0], START_POS[1], START_ANGLE)
+    chair_sprites = chair_sprite_cache()
+    
+    # Physics runs at PHYSICS_HZ independent of how long drawing takes
+    timestep = FixedTimestep(PHYSICS_HZ, RENDER_HZ)
+    dt = timestep.dt
     
     running = True
     while running:
-        dt = clock.tick(60) / 1000.0  # seconds since last frame
+        frame_time = clock.tick(PHYSICS_HZ) / 1000.0  # seconds since last loop
+        
+        profiler.begin_frame()
         
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
         
-        keys = pygame.key.get_pressed()
-        forward_speed = 0
-        turning_input = 0
-        
-        if mode == "head":
-            # Main movement via arrow keys:
-            if keys[pygame.K_UP]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_DOWN]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_LEFT]:
-                turning_input = -TURNING_SCALE
-            elif keys[pygame.K_RIGHT]:
-                turning_input = TURNING_SCALE
-            
-        elif mode == "head_sip":
-            #Main movement via Sip and Puff keys:
-            if keys[pygame.K_i]:
-                forward_speed = SPEED_SCALE
-            elif keys[pygame.K_l]:
-                forward_speed = -SPEED_SCALE
-            if keys[pygame.K_p]:
-                turning_input = -TURNING_SCALE
-            elif keys[pygame.K_k]:
-                turning_input = TURNING_SCALE
-        
-        #In both modes, use z and x for fine turn adjustments.
-        if keys[pygame.K_z]:
-            turning_input -= FINE_TURN_SCALE
-        if keys[pygame.K_x]:
-            turning_input += FINE_TURN_SCALE
-        
-        angle += turning_input * dt
-        pos_x += forward_speed * math.cos(angle) * dt
-        pos_y += forward_speed * math.sin(angle) * dt
-        
-        # Create a collision rectangle for the wheelchair
-        wheelchair_rect = pygame.Rect(0, 0, WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT)
-        wheelchair_rect.center = (pos_x, pos_y)
-        
-        # Check for collision with any obstacle (using each obstacle's "rect")
-        if any(wheelchair_rect.colliderect(obs["rect"]) for obs in obstacles):
-            print("Collision detected! Resetting wheelchair position.")
-            pos_x, pos_y = START_POS
-            angle = START_ANGLE
-        
-        screen.fill(COLOR_BG)
+        inputs = read_inputs(mode)
+        profiler.lap("input")
         
-        # Draw obstacles with their defined colors
-        for obs in obstacles:
-            pygame.draw.rect(screen, obs["color"], obs["rect"])
+        for _ in range(timestep.advance(frame_time)):
+            if recorder is not None:
+                recorder.record(dt, *inputs)
+            if step(state, inputs, dt, obstacle_grid, profiler):
+                print("Collision detected! Resetting wheelchair position.")
         
-        # Rotate the wheelchair image according to its angle
-        rotated_surf = pygame.transform.rotate(wheelchair_surf, -math.degrees(angle))
-        rotated_rect = rotated_surf.get_rect(center=(pos_x, pos_y))
-        screen.blit(rotated_surf, rotated_rect.topleft)
+        if not timestep.should_render():
+            profiler.end_frame()
+            continue
         
-        pygame.display.flip()
+        draw_frame(screen, renderer, chair_sprites, state, profiler, view, profiler_font)
+        profiler.end_frame()
     
+    if recorder is not None:
+        recorder.close()
+    profiler.dump()
     pygame.quit()
     sys.exit()
 
+def headless_simulation(input_log, frames_dir=None, hash_path=None):
+    """
+    Replays a recorded input log without a window and unthrottled (see headless.replay),
+    writing frame hashes and optionally PNG frames for comparing renders between commits.
+    """
+    headless.use_dummy_drivers()
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    
+    obstacle_grid, _, view, renderer = dirty_renderer.scene_setup(screen, COLOR_BG, SCENE_PATH, GRID_CELL_SIZE)
+    state = sim_core.WheelchairState(START_POS[0], START_POS[1], START_ANGLE)
+    chair_sprites = chair_sprite_cache()
+    profiler = frame_profiler.FrameProfiler()
+    sink = headless.FrameSink(frames_dir)
+    
+    def advance(dt, inputs):
+        step(state, inputs, dt, obstacle_grid)
+    def draw():
+        draw_frame(screen, renderer, chair_sprites, state, profiler, view)
+    
+    headless.replay(sim_core.load_input_log(input_log), advance, draw, screen, sink, RENDER_HZ)
+    if hash_path:
+        sink.write_hashes(hash_path)
+    print(f"{input_log}: {state.steps} steps, {state.collisions} collisions, frames: {sink.summary()}")
+    pygame.quit()
+
 
 def main():
-    mode = main_menu()  
-    simulation(mode)    
+    # --headless <input_log.csv> [--frames <dir>] [--hashes <file>] replays a log without a window
+    options = headless.parse_args(sys.argv[1:])
+    if options is not None:
+        headless_simulation(*options)
+        return
+    # Optional argument: CSV file to record the driving inputs to
+    args = sys.argv[1:]
+    for flag in ("--profile", "--scene"):
+        if flag in args:
+            del args[args.index(flag):args.index(flag) + 2]
+    record_path = args[0] if args else None
+    mode = main_menu()
+    simulation(mode, record_path)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,228 @@
+import math
+import time
+import numpy as np
+import vfh_engine
+import swept_collision
+import sim_core
+from sim_core import (
+    WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, START_POS, START_ANGLE, TURNING_SCALE,
+    N_BINS, BIN_SIZE, DETECTION_RANGE, FOV_RAD, DEFAULT_PARAMS, VFH_CLEARANCE, VFH_REACH, WIDE_VALLEY_BINS,
+)
+from vfh_engine import RAYS_PER_BIN
+
+# Batched version of sim_core.step: N wheelchairs are held in NumPy arrays and the
+# VFH, soft collision avoidance and collision checks run for the whole batch at
+# once. For N = 1 it reproduces 2D_collision_wXbox.py, and each chair may use its
+# own THRESHOLD / forward_threshold / SOFT_COLLISION_DIST for Monte Carlo studies.
+
+# Upper bound on chairs x obstacles x rays handled in one vectorized block, keeps memory flat
+MAX_PAIRS_PER_CHUNK = 1 << 20
+# Reach of the sweep beyond the chair centers: the footprint's full diagonal covers its
+# half diagonal plus the rotation padding of swept_collision
+SWEEP_MARGIN = math.hypot(WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT)
+
+class BatchState:
+    def __init__(self, n):
+        """
+        Poses and run statistics of n wheelchairs, all starting at START_POS.
+        """
+        self.n = n
+        self.pos_x = np.full(n, float(START_POS[0]))
+        self.pos_y = np.full(n, float(START_POS[1]))
+        self.angle = np.full(n, float(START_ANGLE))
+        self.collisions = np.zeros(n, dtype=np.int64)
+        self.time = 0.0
+        self.steps = 0
+        # VFH+ memory: binary histogram for the hysteresis and last chosen sector (-1 for none)
+        self.blocked = np.zeros((n, N_BINS), dtype=bool)
+        self.steer_bin = np.full(n, -1, dtype=np.intp)
+
+    def reset(self, mask):
+        """Moves the selected wheelchairs back to the start pose."""
+        self.pos_x[mask] = START_POS[0]
+        self.pos_y[mask] = START_POS[1]
+        self.angle[mask] = START_ANGLE
+        self.blocked[mask] = False
+        self.steer_bin[mask] = -1
+
+def _rects_near(rects, xs, ys, margin):
+    """
+    The obstacles overlapping the bounding box of the points (xs, ys) grown by margin,
+    in their original order, so a block of chairs only tests its own surroundings.
+    """
+    if len(rects) == 0 or len(xs) == 0:
+        return rects
+    x, y, w, h = rects.T
+    keep = ((x <= xs.max() + margin) & (x + w >= xs.min() - margin)
+            & (y <= ys.max() + margin) & (y + h >= ys.min() - margin))
+    return rects[keep]
+
+def _steering(pos_x, pos_y, angle, forward_speed, turning_input, rects, threshold, threshold_low,
+              forward_threshold, soft_collision_dist, blocked, steer_bin):
+    """
+    VFH lane-keep and soft collision avoidance for a block of chairs.
+    All per-chair arguments are 1D arrays of the same length, except blocked (n, N_BINS).
+    :return: (forward_speed, turning_input, blocked, steer_bin)
+    """
+    n = len(pos_x)
+    x, y, w, h = rects.T
+    # Closest point on every obstacle for every chair: shape (n, M)
+    px = pos_x[:, None]
+    py = pos_y[:, None]
+    dx = np.maximum(x, np.minimum(px, x + w)) - px
+    dy = np.maximum(y, np.minimum(py, y + h)) - py
+    distance = np.hypot(dx, dy)
+    global_angle = np.arctan2(dy, dx)
+
+    # ---- VFH (same binning as vfh_engine.compute_vfh_closest) ----
+    in_range = (distance != 0) & (distance <= DETECTION_RANGE)
+    rows = np.broadcast_to(np.arange(n)[:, None], distance.shape)[in_range]
+    bins = ((np.degrees(global_angle[in_range]) + 360) % 360 // BIN_SIZE).astype(np.intp) % N_BINS
+    weights = (DETECTION_RANGE - distance[in_range]) / DETECTION_RANGE
+    vfh = np.bincount(rows * N_BINS + bins, weights=weights, minlength=n * N_BINS).reshape(n, N_BINS)
+
+    current_bin = ((np.degrees(angle) + 360) % 360 // BIN_SIZE).astype(np.intp) % N_BINS
+    density_ahead = vfh[np.arange(n), current_bin]
+
+    # ---- VFH+ steering (same as vfh_engine.VFHPlus.steer per chair) ----
+    steering_vfh = vfh_engine.steering_histogram(pos_x, pos_y, rects, N_BINS, DETECTION_RANGE, VFH_CLEARANCE)
+    blocked = vfh_engine.binary_histogram(steering_vfh, threshold_low[:, None], threshold[:, None], blocked)
+    heading_blocked = blocked[np.arange(n), current_bin]
+    # Only chairs whose heading is blocked steer, the others keep their sector
+    best_bin = current_bin.copy()
+    best_bin[heading_blocked] = vfh_engine.select_direction(
+        blocked[heading_blocked], steering_vfh[heading_blocked], current_bin[heading_blocked],
+        current_bin[heading_blocked], steer_bin[heading_blocked], WIDE_VALLEY_BINS)
+    steer_bin = best_bin
+    desired_heading = np.radians(best_bin * BIN_SIZE + BIN_SIZE / 2)
+    angle_diff = (desired_heading - angle + np.pi) % (2 * np.pi) - np.pi
+    turning_input = turning_input + np.where(heading_blocked, TURNING_SCALE * angle_diff, 0.0)
+
+    slow = density_ahead > forward_threshold
+    forward_scaling = np.maximum(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
+    forward_speed = forward_speed * np.where(slow, forward_scaling, 1.0)
+
+    # ---- Soft collision avoidance (same rules as sim_core.apply_soft_collision_avoidance) ----
+    if len(rects) == 0:
+        # Nothing to avoid (argmin has no column to pick)
+        return forward_speed, turning_input, blocked, steer_bin
+    effective_heading = np.where(forward_speed >= 0, angle, (angle + np.pi) % (2 * np.pi))[:, None]
+    heading_diff = (global_angle - effective_heading + np.pi) % (2 * np.pi) - np.pi
+    dot = dx * np.cos(effective_heading) + dy * np.sin(effective_heading)
+    ahead = ((distance >= 1) & (distance <= DETECTION_RANGE)
+             & (np.abs(heading_diff) <= FOV_RAD / 2.0) & (dot >= 0))
+    masked = np.where(ahead, distance, np.inf)
+    nearest = np.argmin(masked, axis=1)
+    min_dist = masked[np.arange(n), nearest]
+    too_close = min_dist < soft_collision_dist
+    forward_speed = forward_speed * np.where(too_close, min_dist / soft_collision_dist, 1.0)
+    turning_input = turning_input - np.where(too_close, TURNING_SCALE * heading_diff[np.arange(n), nearest], 0.0)
+    return forward_speed, turning_input, blocked, steer_bin
+
+def batch_step(state, forward_speed, turning_input, dt, rects, params=None):
+    """
+    Advances every wheelchair in the batch by one timestep.
+
+    :param state: BatchState, updated in place.
+    :param forward_speed: Scalar or (N,) array of forward speed inputs.
+    :param turning_input: Scalar or (N,) array of turning inputs.
+    :param dt: Timestep in seconds.
+    :param rects: (M, 4) obstacle array from vfh_engine.rects_to_array.
+    :param params: Optional dict overriding DEFAULT_PARAMS; values may be scalars or (N,) arrays.
+    :return: (N,) boolean array of the chairs that collided and were reset.
+    """
+    n = state.n
+    merged = dict(DEFAULT_PARAMS, **(params or {}))
+    threshold = np.broadcast_to(np.asarray(merged["threshold"], dtype=np.float64), (n,))
+    threshold_low = np.broadcast_to(np.asarray(merged["threshold_low"], dtype=np.float64), (n,))
+    forward_threshold = np.broadcast_to(np.asarray(merged["forward_threshold"], dtype=np.float64), (n,))
+    soft_collision_dist = np.broadcast_to(np.asarray(merged["soft_collision_dist"], dtype=np.float64), (n,))
+    forward_speed = np.broadcast_to(np.asarray(forward_speed, dtype=np.float64), (n,))
+    turning_input = np.broadcast_to(np.asarray(turning_input, dtype=np.float64), (n,))
+
+    # Obstacles beyond VFH_REACH of every chair cannot influence the steering
+    nearby = _rects_near(rects, state.pos_x, state.pos_y, VFH_REACH)
+    chunk = max(1, MAX_PAIRS_PER_CHUNK // max(1, len(nearby) * N_BINS * RAYS_PER_BIN))
+    new_forward = np.empty(n)
+    new_turning = np.empty(n)
+    for start in range(0, n, chunk):
+        s = slice(start, start + chunk)
+        chunk_rects = _rects_near(nearby, state.pos_x[s], state.pos_y[s], VFH_REACH)
+        new_forward[s], new_turning[s], state.blocked[s], state.steer_bin[s] = _steering(
+            state.pos_x[s], state.pos_y[s], state.angle[s], forward_speed[s], turning_input[s], chunk_rects,
+            threshold[s], threshold_low[s], forward_threshold[s], soft_collision_dist[s],
+            state.blocked[s], state.steer_bin[s]
+        )
+
+    start_x, start_y, start_angle = state.pos_x.copy(), state.pos_y.copy(), state.angle.copy()
+    state.angle += new_turning * dt
+    state.pos_x += new_forward * np.cos(state.angle) * dt
+    state.pos_y += new_forward * np.sin(state.angle) * dt
+    state.time += dt
+    state.steps += 1
+
+    # Swept collision of the rotated footprints over the whole step
+    collided = np.zeros(n, dtype=bool)
+    for start in range(0, n, chunk):
+        s = slice(start, start + chunk)
+        chunk_rects = _rects_near(rects, np.concatenate((start_x[s], state.pos_x[s])),
+                                  np.concatenate((start_y[s], state.pos_y[s])), SWEEP_MARGIN)
+        if len(chunk_rects):
+            toi = swept_collision.sweep_time_of_impact(
+                (start_x[s, None], start_y[s, None], start_angle[s, None]),
+                (state.pos_x[s, None], state.pos_y[s, None], state.angle[s, None]),
+                WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, chunk_rects)
+            collided[s] = np.isfinite(toi).any(axis=1)
+    state.collisions += collided
+    state.reset(collided)
+    return collided
+
+def run_batch(input_stream, obstacles, n, params=None, state=None):
+    """
+    Steps a batch of n wheelchairs over an input stream, like sim_core.run.
+
+    :param input_stream: Iterable of (dt, forward_speed, turning_input); the inputs may be
+                         scalars shared by all chairs or (N,) arrays.
+    :param obstacles: List of obstacle dicts or an (M, 4) array.
+    :return: The final BatchState.
+    """
+    rects = vfh_engine.rects_to_array(obstacles)
+    if state is None:
+        state = BatchState(n)
+    for dt, forward_speed, turning_input in input_stream:
+        batch_step(state, forward_speed, turning_input, dt, rects, params)
+    return state
+
+def sample_params(n, ranges, seed=0):
+    """
+    Draws n uniformly distributed parameter sets for a Monte Carlo study.
+
+    :param ranges: Dict of parameter name -> (low, high), e.g. {"threshold": (0.2, 1.0)}.
+    :return: Dict of parameter name -> (n,) array, usable as batch_step params.
+    """
+    rng = np.random.default_rng(seed)
+    return {name: rng.uniform(low, high, n) for name, (low, high) in ranges.items()}
+
+def main():
+    n = 10000
+    params = sample_params(n, {
+        "threshold": (0.2, 1.0),
+        "threshold_low_fraction": (0.4, 0.9),
+        "forward_threshold": (0.2, 0.9),
+        "soft_collision_dist": (20, 120),
+    })
+    # The hysteresis band has to stay below each chair's threshold (the defaults put it at 60%)
+    params["threshold_low"] = params["threshold"] * params.pop("threshold_low_fraction")
+    inputs = list(sim_core.scripted_inputs([(2, 200, 0), (1, 0, 2.0), (3, 200, 0.3), (5, 200, -0.5)]))
+    start = time.perf_counter()
+    state = run_batch(inputs, sim_core.default_obstacles(), n, params)
+    elapsed = time.perf_counter() - start
+    safe = state.collisions == 0
+    print(f"{n} chairs x {state.steps} steps in {elapsed:.2f}s, {safe.sum()} runs without collisions")
+    if safe.any() and not safe.all():
+        for name, values in params.items():
+            print(f"  {name}: mean {values[safe].mean():.3f} without collisions, "
+                  f"{values[~safe].mean():.3f} with collisions")
+
+if __name__ == "__main__":
+    main()
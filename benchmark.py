@@ -0,0 +1,362 @@
+import os
+import sys
+import ast
+import copy
+import json
+import math
+import time
+import random
+import itertools
+import platform
+import subprocess
+import tracemalloc
+import pygame
+import numpy as np
+import vfh_engine
+import sim_core
+import batch_sim
+import obstacle_store
+import scene_gen
+import occupancy_grid
+import certainty_grid
+import spatial_grid
+import dirty_renderer
+import camera
+import headless
+from sim_core import N_BINS, DETECTION_RANGE, VFH_CLEARANCE, WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT
+
+# Benchmarks of the navigation kernels over growing scenes.
+# Every kernel runs on seeded random scenes of 10 to 100k rectangles (kept at the same
+# density, so a bigger scene is a bigger world) with the chair in the middle, and A* on
+# seeded random occupancy grids from 5x5 up to 4096x4096. For each case the suite
+# reports calls per second and what one call allocates (tracemalloc peak and the blocks
+# still held afterwards), and writes everything to a JSON file. Passing an older file
+# with --compare prints the speed ratio per case and exits with 1 on a regression.
+# --scene-kind runs the scene kernels on scene_gen's floor plans, clutter or corridors
+# of the same sizes instead of the scattered rectangles. The drawing cases repaint the
+# simulators' static layer off-screen, once from the whole list and once culled
+# through the spatial index around a window-sized view. batch_step advances a batch of
+# chairs scattered around the center by one batch_sim step, so --compare also guards
+# the batched simulator's cost.
+#
+# The Sim3D functions and the notebook's astar are taken from their source files
+# without running them (see script_namespace), so neither OpenGL nor matplotlib is needed.
+
+SCENE_SIZES = (10, 100, 1000, 10000, 100000)
+GRID_SIZES = (5, 16, 64, 256, 1024)
+FULL_GRID_SIZES = GRID_SIZES + (4096,)
+OBSTACLE_SPACING = 100      # one obstacle per OBSTACLE_SPACING^2 of floor on average
+GRID_FILL = 0.25            # fraction of blocked cells in the A* grids
+MIN_TIME = 0.2              # seconds each case is timed for (at least one call)
+REPEATS = 3                 # timing rounds per case, the fastest is reported
+REGRESSION_TOLERANCE = 0.10 # --compare flags cases more than 10% slower
+VIEW_SIZE = (800, 600)      # window of the drawing cases
+BATCH_CHAIRS = 256          # chairs stepped together by the batch_step cases
+SEED = 1
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# -------------------------
+# Scenes
+# -------------------------
+def random_scene(n, seed=SEED):
+    """
+    n obstacle dicts ({"rect", "color"}) scattered over a square world of
+    sqrt(n) * OBSTACLE_SPACING pixels, and the world center.
+    """
+    rng = random.Random(seed)
+    side = int(math.sqrt(n) * OBSTACLE_SPACING)
+    obstacles = []
+    for _ in range(n):
+        w = rng.randint(10, 60)
+        h = rng.randint(10, 60)
+        obstacles.append({"rect": pygame.Rect(rng.randrange(side - w), rng.randrange(side - h), w, h),
+                          "color": (128, 128, 128)})
+    return obstacles, (side / 2.0, side / 2.0)
+
+def scene_3d(obstacles):
+    """The same scene as Sim3D obstacle dicts ({"center", "size", "color"}), 20 units tall."""
+    return [{"center": (obs["rect"].centerx, 10, obs["rect"].centery),
+             "size": (obs["rect"].width, 20, obs["rect"].height),
+             "color": obs["color"]} for obs in obstacles]
+
+def random_grid(size, seed=SEED):
+    """
+    size x size list-of-lists map for the notebook's astar (0 = free, 1 = blocked).
+    A random staircase from (0, 0) to (size - 1, size - 1) is kept free so a path always exists.
+    """
+    rng = np.random.default_rng(seed)
+    grid = (rng.random((size, size)) < GRID_FILL).astype(int)
+    steps = rng.permutation(np.repeat([0, 1], size - 1))
+    rows = np.concatenate(([0], np.cumsum(steps == 0)))
+    cols = np.concatenate(([0], np.cumsum(steps == 1)))
+    grid[rows, cols] = 0
+    return grid.tolist()
+
+def script_namespace(source):
+    """
+    Definitions of a script without running it: its imports (those that are installed),
+    top-level assignments, functions and classes. Everything else (the main loop,
+    demo calls, plotting) is skipped.
+    """
+    namespace = {"__name__": "benchmark_script"}
+    for node in ast.parse(source).body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom, ast.Assign, ast.FunctionDef, ast.ClassDef)):
+            continue
+        try:
+            exec(compile(ast.Module(body=[node], type_ignores=[]), "<script>", "exec"), namespace)
+        except (ImportError, NameError):
+            pass
+    return namespace
+
+def notebook_source(path):
+    """Code cells of a Jupyter notebook joined into one script."""
+    with open(path) as f:
+        cells = json.load(f)["cells"]
+    return "\n".join("".join(cell["source"]) for cell in cells if cell["cell_type"] == "code")
+
+# -------------------------
+# Measuring
+# -------------------------
+def measure(call, min_time=MIN_TIME):
+    """
+    Times call() and records its allocations.
+
+    :return: dict with ops_per_sec, mean_ms, peak_alloc_bytes (tracemalloc high-water
+             mark during one call) and net_alloc_blocks (blocks still allocated after it).
+    """
+    call()  # warm up caches and lazily built tables
+    def timed(number):
+        start = time.perf_counter()
+        for _ in range(number):
+            call()
+        return time.perf_counter() - start
+
+    # Double the number of calls until one round takes min_time, then repeat that round
+    number = 1
+    elapsed = timed(number)
+    while elapsed < min_time:
+        number *= 2
+        elapsed = timed(number)
+    best = elapsed / number
+    for _ in range(REPEATS - 1):
+        if elapsed > 10 * min_time:
+            break  # slow case, more rounds would not change the picture
+        elapsed = timed(number)
+        best = min(best, elapsed / number)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base, _ = tracemalloc.get_traced_memory()
+    result = call()
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del result
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {
+        "ops_per_sec": 1.0 / best,
+        "mean_ms": 1000.0 * best,
+        "peak_alloc_bytes": peak - base,
+        "net_alloc_blocks": blocks,
+    }
+
+# -------------------------
+# Cases
+# -------------------------
+def generated_scene(kind, n, seed=SEED):
+    """scene_gen scene of about n obstacles as obstacle dicts, and the world center."""
+    scene = scene_gen.generate(kind, n, seed)
+    return scene.obstacles_2d(), (scene.width / 2.0, scene.height / 2.0)
+
+def static_layer(obstacles, view=None):
+    """dirty_renderer layer of the obstacles on an off-screen window (dummy video driver)."""
+    headless.use_dummy_drivers()
+    pygame.display.init()
+    screen = pygame.display.get_surface() or pygame.display.set_mode(VIEW_SIZE)
+    return dirty_renderer.StaticLayerRenderer(screen, (0, 0, 0), obstacles, camera=view)
+
+def redraw(renderer):
+    renderer.invalidate()
+    renderer.begin_frame()
+
+def chair_batch(x, y, n=BATCH_CHAIRS, seed=SEED):
+    """batch_sim.BatchState of n chairs scattered within DETECTION_RANGE of (x, y), random headings."""
+    rng = np.random.default_rng(seed)
+    state = batch_sim.BatchState(n)
+    state.pos_x[:] = x + rng.uniform(-DETECTION_RANGE, DETECTION_RANGE, n)
+    state.pos_y[:] = y + rng.uniform(-DETECTION_RANGE, DETECTION_RANGE, n)
+    state.angle[:] = rng.uniform(0, 2 * np.pi, n)
+    return state
+
+def selected(only, *kernels):
+    """Whether any of the kernels runs under --only (all of them run without it)."""
+    return not only or any(kernel in only for kernel in kernels)
+
+def scene_cases(sizes, kind=None, only=None):
+    """
+    (kernel, size, call) for every kernel that works on an obstacle scene.
+
+    :param kind: Optional scene_gen kind used instead of random_scene.
+    :param only: Optional set of kernel names; the fixtures of the other kernels are not built.
+    """
+    geometry = ("vfh_closest", "vfh_centers", "vfh_corners", "vfh_enlarged", "batch_step")
+    store_kernels = ("soft_avoidance_soa", "store_query_radius")
+    grid_kernels = ("vfh_grid", "vfh_grid_steering")
+    draw_kernels = ("draw_layer", "draw_layer_culled")
+    sim3d_kernels = ("soft_avoidance_3d", "aabb_collision")
+    scene_kernels = (geometry + store_kernels + grid_kernels + draw_kernels + sim3d_kernels
+                     + ("soft_avoidance", "occupancy_build"))
+    if not selected(only, *scene_kernels):
+        return
+    if selected(only, *sim3d_kernels):
+        with open(os.path.join(HERE, "Sim3D.py")) as f:
+            sim3d = script_namespace(f.read())
+    chair_w, chair_d = WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT
+    for n in sizes:
+        obstacles, (x, y) = generated_scene(kind, n) if kind else random_scene(n)
+        cases = []
+        if selected(only, *geometry):
+            rects = vfh_engine.rects_to_array(obstacles)
+            cases += [
+                ("vfh_closest", lambda: vfh_engine.compute_vfh_closest(x, y, rects, N_BINS, DETECTION_RANGE)),
+                ("vfh_centers", lambda: vfh_engine.compute_vfh_centers(x, y, rects, N_BINS, DETECTION_RANGE)),
+                ("vfh_corners", lambda: vfh_engine.compute_vfh_corners(x, y, rects, N_BINS, DETECTION_RANGE)),
+                ("vfh_enlarged", lambda: vfh_engine.enlarged_histogram(x, y, rects, N_BINS, DETECTION_RANGE,
+                                                                       VFH_CLEARANCE)),
+            ]
+        cases.append(("soft_avoidance",
+                      lambda: sim_core.apply_soft_collision_avoidance(x, y, 0.0, 200, 0.0, obstacles)))
+        if selected(only, *store_kernels):
+            store = obstacle_store.from_obstacles(obstacles)
+            cases.append(("soft_avoidance_soa",
+                          lambda: sim_core.apply_soft_collision_avoidance(x, y, 0.0, 200, 0.0, store.rects())))
+        if selected(only, "batch_step"):
+            batch = chair_batch(x, y)
+            # Every call steps the same poses (a collision would move a chair back to START_POS)
+            cases.append(("batch_step", lambda: batch_sim.batch_step(copy.deepcopy(batch), 200, 0.0, 1 / 60, rects)))
+        if selected(only, *store_kernels):
+            cases.append(("store_query_radius", lambda: store.query_radius(x, y, DETECTION_RANGE)))
+        cases.append(("occupancy_build", lambda: occupancy_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)))
+        if selected(only, *grid_kernels):
+            window = certainty_grid.ActiveWindow(occupancy_grid.grid_from_obstacles(obstacles, DETECTION_RANGE),
+                                                 N_BINS, DETECTION_RANGE, VFH_CLEARANCE)
+            cases += [
+                ("vfh_grid", lambda: window.histogram(x, y)),
+                ("vfh_grid_steering", lambda: window.steering_histogram(x, y)),
+            ]
+        if selected(only, *draw_kernels):
+            view = camera.Camera(*VIEW_SIZE)
+            view.follow(x, y)
+            full = static_layer(obstacles, view)
+            culled = static_layer(spatial_grid.grid_from_obstacles(obstacles, DETECTION_RANGE), view)
+            cases += [
+                ("draw_layer", lambda: redraw(full)),
+                ("draw_layer_culled", lambda: redraw(culled)),
+            ]
+        if selected(only, *sim3d_kernels):
+            boxes = scene_3d(obstacles)
+            cases += [
+                ("soft_avoidance_3d", lambda: sim3d["apply_soft_collision_avoidance_3d"](
+                    x, y, 0.0, 200, 0.0, boxes)),
+                # The chair tested against every box, as Sim3D's loop did before the spatial index
+                ("aabb_collision", lambda: sum(
+                    sim3d["aabb_collision"](x, y, chair_w, chair_d, obs["center"][0], obs["center"][2],
+                                            obs["size"][0], obs["size"][2]) for obs in boxes)),
+            ]
+        for kernel, call in cases:
+            if selected(only, kernel):
+                yield kernel, n, call
+
+def grid_cases(sizes, only=None):
+    """(kernel, size, call) for the notebook's A* from corner to corner."""
+    if not selected(only, "astar"):
+        return
+    notebook = script_namespace(notebook_source(os.path.join(HERE, "a_star_implementation.ipynb")))
+    astar = notebook["astar"]
+    for size in sizes:
+        grid = random_grid(size)
+        yield "astar", size, lambda: astar((0, 0), (size - 1, size - 1), grid)
+
+# -------------------------
+# Results
+# -------------------------
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(scene_sizes=SCENE_SIZES, grid_sizes=GRID_SIZES, only=None, min_time=MIN_TIME, kind=None):
+    """
+    Runs every case and returns {"meta": ..., "results": [...]}.
+
+    :param only: Optional set of kernel names to run.
+    :param kind: Optional scene_gen kind for the scene cases.
+    """
+    results = []
+    # The cases are generated lazily: each call closes over the scene of its own iteration
+    for kernel, size, call in itertools.chain(scene_cases(scene_sizes, kind, only), grid_cases(grid_sizes, only)):
+        record = dict(kernel=kernel, size=size, **measure(call, min_time))
+        print(f"{kernel:18s} {size:>7d}  {record['ops_per_sec']:12.3f} ops/s  {record['mean_ms']:10.3f} ms"
+              f"  peak {record['peak_alloc_bytes'] / 1024:10.1f} KiB  {record['net_alloc_blocks']:6d} blocks")
+        results.append(record)
+    meta = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "min_time": min_time,
+        "scene_kind": kind or "random",
+    }
+    return {"meta": meta, "results": results}
+
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Prints new/old speed per case found in both runs.
+    Returns the (kernel, size) cases that got more than tolerance slower.
+    """
+    old = {(r["kernel"], r["size"]): r for r in baseline["results"]}
+    regressions = []
+    for record in results["results"]:
+        key = (record["kernel"], record["size"])
+        if key not in old:
+            continue
+        ratio = record["ops_per_sec"] / old[key]["ops_per_sec"]
+        flag = ""
+        if ratio < 1 - tolerance:
+            flag = "  SLOWER"
+            regressions.append(key)
+        print(f"{key[0]:18s} {key[1]:>7d}  x{ratio:6.2f}{flag}")
+    return regressions
+
+def main():
+    # [--full] [--only kernel,kernel] [--quick] [--scene-kind kind] [--output results.json]
+    # [--compare baseline.json]
+    args = sys.argv[1:]
+    def value(flag, default=None):
+        if flag in args and args.index(flag) + 1 < len(args):
+            return args[args.index(flag) + 1]
+        return default
+    output = value("--output", "benchmark_results.json")
+    only = set(value("--only").split(",")) if value("--only") else None
+    grid_sizes = FULL_GRID_SIZES if "--full" in args else GRID_SIZES
+    min_time = MIN_TIME / 4 if "--quick" in args else MIN_TIME
+    kind = value("--scene-kind")
+
+    results = run_suite(SCENE_SIZES, grid_sizes, only, min_time, kind)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print("Results written to", output)
+
+    if value("--compare"):
+        with open(value("--compare")) as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline['meta'].get('commit')}:")
+        if compare(results, baseline):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
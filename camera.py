@@ -0,0 +1,54 @@
+# Scrolling camera of the 2D simulators.
+# The simulators keep everything in world (scene) coordinates; the camera is the
+# window's top-left corner in the world, and drawing subtracts it. The camera only
+# moves when the chair comes within EDGE_MARGIN of the window edge and then just far
+# enough to keep it there, so while the chair drives around the middle of the window
+# the view stands still and dirty_renderer keeps repainting only what moved. The view
+# is clamped to the world extent; a world no larger than the window never scrolls.
+
+EDGE_MARGIN = 200      # the view scrolls once the chair is closer than this to a window edge
+
+class Camera:
+    def __init__(self, width, height, world_width=0, world_height=0, margin=EDGE_MARGIN):
+        """
+        :param width: Window width in pixels.
+        :param height: Window height in pixels.
+        :param world_width: World extent in X the view stays within (0 for unbounded).
+        :param world_height: World extent in Y (0 for unbounded).
+        :param margin: Distance from the window edges the followed point is kept at.
+        """
+        self.width = width
+        self.height = height
+        self.world_width = world_width
+        self.world_height = world_height
+        self.margin_x = min(margin, width // 2)
+        self.margin_y = min(margin, height // 2)
+        self.x = 0    # world position of the window's top-left corner, whole pixels
+        self.y = 0
+
+    def follow(self, x, y):
+        """Scrolls so (x, y) stays margin away from the window edges; True if the view moved."""
+        old = (self.x, self.y)
+        self.x = _follow(self.x, x, self.width, self.margin_x, self.world_width)
+        self.y = _follow(self.y, y, self.height, self.margin_y, self.world_height)
+        return (self.x, self.y) != old
+
+    def to_screen(self, x, y):
+        return x - self.x, y - self.y
+
+    def to_world(self, x, y):
+        """World position of a window position, e.g. a mouse click."""
+        return x + self.x, y + self.y
+
+    def view(self, pad=0):
+        """(x, y, width, height) of the visible part of the world, grown by pad on every side."""
+        return (self.x - pad, self.y - pad, self.width + 2 * pad, self.height + 2 * pad)
+
+def _follow(start, target, size, margin, extent):
+    if extent and extent <= size:
+        return 0
+    start = min(start, int(target) - margin)
+    start = max(start, int(target) + margin - size)
+    if extent:
+        start = min(max(start, 0), extent - size)
+    return start
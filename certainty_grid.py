@@ -0,0 +1,240 @@
+import sys
+import math
+import numpy as np
+import spatial_grid
+import vfh_engine
+
+# Classic Vector Field Histogram (Borenstein & Koren) on a certainty grid.
+# Obstacles, or range readings from a sensor such as the ultrasonic scanner in
+# line_track.py, are accumulated in a 2D grid of certainty values. A square active
+# window centered on the chair is turned into the polar histogram with lookup
+# tables of each window cell's sector and magnitude factor that are computed once,
+# so every update is one multiply and one bincount no matter how many obstacles
+# the scene contains. The VFH+ steering histogram ray-tests the occupied cells within
+# reach the way vfh_engine.enlarged_histogram tests obstacles, so on a grid that
+# rasterizes the scene exactly both steer alike (python certainty_grid.py checks it).
+
+CELL_SIZE = 10          # scene units (pixels, or cm for the robot) per grid cell
+MAX_CERTAINTY = 15      # certainty values are kept in 0..MAX_CERTAINTY
+HIT_INCREMENT = 3       # added to the cell a range reading ends in
+MISS_DECREMENT = 1      # removed from the cells a range reading passes through
+
+class CertaintyGrid:
+    value_scale = 1     # certainty represented by a value of 1 (see ActiveWindow)
+
+    def __init__(self, x, y, width, height, cell_size=CELL_SIZE):
+        """
+        Certainty grid covering the rectangle (x, y, width, height), all cells empty.
+        """
+        self.origin = (x, y)
+        self.cell_size = cell_size
+        cols = max(1, int(math.ceil(width / cell_size)))
+        rows = max(1, int(math.ceil(height / cell_size)))
+        self.values = np.zeros((rows, cols), dtype=np.float64)
+
+    def cell_of(self, x, y):
+        """(row, col) of the cell containing (x, y); may lie outside the grid."""
+        return (int((y - self.origin[1]) // self.cell_size),
+                int((x - self.origin[0]) // self.cell_size))
+
+    def add_rect(self, x, y, width, height, certainty=MAX_CERTAINTY):
+        """Marks every cell whose center lies inside the rectangle as occupied."""
+        cell = self.cell_size
+        x0, y0 = self.origin
+        rows, cols = self.values.shape
+        c0 = min(max(int(math.ceil((x - x0) / cell - 0.5)), 0), cols)
+        c1 = min(max(int(math.ceil((x + width - x0) / cell - 0.5)), 0), cols)
+        r0 = min(max(int(math.ceil((y - y0) / cell - 0.5)), 0), rows)
+        r1 = min(max(int(math.ceil((y + height - y0) / cell - 0.5)), 0), rows)
+        block = self.values[r0:r1, c0:c1]
+        np.maximum(block, certainty, out=block)
+
+    def add_obstacles(self, obstacles):
+        """Rasterizes 2D ({"rect"}) or Sim3D ({"center", "size"}) obstacle dicts."""
+        for obs in obstacles:
+            self.add_rect(*spatial_grid.obstacle_bounds(obs))
+
+    def add_range_reading(self, pos_x, pos_y, bearing, distance, max_range):
+        """
+        Histogramic in-motion mapping update for one range sensor reading: the cells
+        the beam passed through become less certain, the cell it ended in more certain.
+
+        :param bearing: Beam direction in radians (same convention as the chair angle).
+        :param distance: Measured range; readings of 0 or >= max_range count as "no echo".
+        :param max_range: Maximum range of the sensor.
+        """
+        hit = 0 < distance < max_range
+        length = distance if hit else max_range
+        # Sample the beam every half cell so no cell along it is skipped
+        samples = np.arange(0.0, length, self.cell_size / 2)
+        rows, cols = self.values.shape
+        ray_rows = ((pos_y + samples * math.sin(bearing) - self.origin[1]) // self.cell_size).astype(np.intp)
+        ray_cols = ((pos_x + samples * math.cos(bearing) - self.origin[0]) // self.cell_size).astype(np.intp)
+        hit_cell = self.cell_of(pos_x + length * math.cos(bearing), pos_y + length * math.sin(bearing))
+
+        inside = (ray_rows >= 0) & (ray_rows < rows) & (ray_cols >= 0) & (ray_cols < cols)
+        flat = np.unique(ray_rows[inside] * cols + ray_cols[inside])
+        if hit and 0 <= hit_cell[0] < rows and 0 <= hit_cell[1] < cols:
+            flat = flat[flat != hit_cell[0] * cols + hit_cell[1]]
+            self.values[hit_cell] = min(self.values[hit_cell] + HIT_INCREMENT, MAX_CERTAINTY)
+        cells = self.values.reshape(-1)
+        cells[flat] = np.maximum(cells[flat] - MISS_DECREMENT, 0)
+
+    def window(self, row, col, half):
+        """
+        (2 * half + 1)^2 block of certainty values centered on (row, col); cells
+        outside the grid read as empty.
+        """
+        return window(self.values, row, col, half)
+
+def window(values, row, col, half):
+    """(2 * half + 1)^2 block of a 2D array centered on (row, col), zero outside it."""
+    rows, cols = values.shape
+    size = 2 * half + 1
+    r0, c0 = row - half, col - half
+    if r0 >= 0 and c0 >= 0 and r0 + size <= rows and c0 + size <= cols:
+        return values[r0:r0 + size, c0:c0 + size]
+    block = np.zeros((size, size))
+    src_r0, src_c0 = max(r0, 0), max(c0, 0)
+    src_r1, src_c1 = min(r0 + size, rows), min(c0 + size, cols)
+    if src_r0 < src_r1 and src_c0 < src_c1:
+        block[src_r0 - r0:src_r1 - r0, src_c0 - c0:src_c1 - c0] = values[src_r0:src_r1, src_c0:src_c1]
+    return block
+
+def grid_from_obstacles(obstacles, detection_range, cell_size=CELL_SIZE):
+    """Builds a certainty grid covering the obstacles plus detection_range around them."""
+    bounds = [spatial_grid.obstacle_bounds(obs) for obs in obstacles]
+    if bounds:
+        x0 = min(b[0] for b in bounds) - detection_range
+        y0 = min(b[1] for b in bounds) - detection_range
+        x1 = max(b[0] + b[2] for b in bounds) + detection_range
+        y1 = max(b[1] + b[3] for b in bounds) + detection_range
+    else:
+        x0, y0, x1, y1 = 0, 0, cell_size, cell_size
+    grid = CertaintyGrid(x0, y0, x1 - x0, y1 - y0, cell_size)
+    grid.add_obstacles(obstacles)
+    return grid
+
+class ActiveWindow:
+    def __init__(self, grid, n_bins, detection_range, clearance=None, rays_per_bin=vfh_engine.RAYS_PER_BIN):
+        """
+        Precomputes, for every cell of the active window, its histogram sector and
+        magnitude factor relative to the window center. With a clearance, also the
+        cells of the larger steering window, which reaches vfh_engine.enlarged_reach from
+        anywhere in the center cell, for the VFH+ steering histogram.
+
+        The magnitude of a cell is c^2 * (a - b * d) with a - b * detection_range = 0,
+        as in the original VFH, normalized so that c = MAX_CERTAINTY gives 1. Each cell
+        is also weighted by the fraction of its sector it covers, so an occupied wall
+        spanning a whole sector at distance d scores about (detection_range - d) /
+        detection_range per layer of cells, the same scale as vfh_engine's histograms.
+
+        :param grid: CertaintyGrid, or an occupancy_grid.OccupancyGrid whose occupied
+                     cells then count as fully certain.
+        """
+        self.grid = grid
+        self.n_bins = n_bins
+        self.half = int(math.ceil(detection_range / grid.cell_size))
+
+        offsets = np.arange(-self.half, self.half + 1) * grid.cell_size
+        dx, dy = np.meshgrid(offsets, offsets)
+        distance = np.hypot(dx, dy).ravel()
+        keep = (distance != 0) & (distance <= detection_range)
+        self.index = np.flatnonzero(keep)
+        distance = distance[keep]
+
+        angle = (np.degrees(np.arctan2(dy.ravel()[keep], dx.ravel()[keep])) + 360) % 360
+        self.bins = (angle // (360 / n_bins)).astype(np.intp) % n_bins
+        sector = 2 * math.pi / n_bins
+        coverage = np.minimum(1.0, grid.cell_size / (distance * sector))
+        normalize = (MAX_CERTAINTY / grid.value_scale) ** 2
+        self.magnitude = (detection_range - distance) / detection_range * coverage / normalize
+
+        self.steer_half = None
+        if clearance is not None:
+            self.detection_range = detection_range
+            self.clearance = clearance
+            self.rays_per_bin = rays_per_bin
+            self.ray_angle = vfh_engine.ray_angles(n_bins, rays_per_bin)
+            self.normalize = normalize
+            # Cells that can score from anywhere in the center cell
+            reach = vfh_engine.enlarged_reach(detection_range, clearance) + grid.cell_size * math.sqrt(2)
+            self.steer_half = int(math.ceil(reach / grid.cell_size))
+
+    def histogram(self, pos_x, pos_y):
+        """Polar obstacle density around (pos_x, pos_y), comparable to vfh_engine.compute_vfh_closest."""
+        row, col = self.grid.cell_of(pos_x, pos_y)
+        certainty = self.grid.window(row, col, self.half).ravel()[self.index]
+        return np.bincount(self.bins, weights=certainty * certainty * self.magnitude, minlength=self.n_bins)
+
+    def steering_histogram(self, pos_x, pos_y):
+        """
+        Enlarged and smoothed histogram for vfh_engine.VFHPlus (needs a clearance), as
+        vfh_engine.steering_histogram computes it with the occupied cells of the window as
+        obstacles: each ray scores the nearest cell it meets once the cells are grown by
+        the clearance, weighted by c^2 so that fully certain cells score exactly as
+        obstacles covering them would. Runs of equally certain cells along a row are
+        tested as one rectangle, and the rays start at (pos_x, pos_y) itself.
+        """
+        row, col = self.grid.cell_of(pos_x, pos_y)
+        half = self.steer_half
+        certainty = np.zeros((2 * half + 1, 2 * half + 3))
+        certainty[:, 1:-1] = self.grid.window(row, col, half)
+        # Run boundaries in each row; a run ends where the next one (or the row) begins
+        run_row, run_edge = np.nonzero(certainty[:, 1:] != certainty[:, :-1])
+        same_row = run_row[:-1] == run_row[1:]
+        start, end, run_row = run_edge[:-1][same_row], run_edge[1:][same_row], run_row[:-1][same_row]
+        value = certainty[run_row, start + 1]
+        occupied = value != 0
+        ray_density = np.zeros(len(self.ray_angle))
+        if occupied.any():
+            cell = self.grid.cell_size
+            start, end, run_row, value = start[occupied], end[occupied], run_row[occupied], value[occupied]
+            # The runs relative to the chair, and their closest points
+            x = self.grid.origin[0] + (col - half + start) * cell - pos_x
+            y = self.grid.origin[1] + (row - half + run_row) * cell - pos_y
+            runs = np.column_stack((x, y, (end - start) * cell, np.full(len(x), float(cell))))
+            dx = np.maximum(x, np.minimum(0.0, x + runs[:, 2]))[:, None]
+            dy = np.maximum(y, np.minimum(0.0, y + cell))[:, None]
+            origin = np.zeros((len(runs), 1))
+            free = vfh_engine.free_distance(origin, origin, runs, dx, dy, self.ray_angle, self.clearance)
+            density = np.maximum(0.0, (self.detection_range - free) / self.detection_range)
+            weight = value * value / self.normalize
+            ray_density = (weight[:, None] * density).max(axis=0)
+        return vfh_engine.smooth_histogram(vfh_engine.sector_maxima(ray_density, self.rays_per_bin))
+
+# Driving script of the default check; VFH+ blocks sectors in about half of its steps
+CHECK_TOUR = ((0.5, 200, 0.0), (0.6, 200, 2.0), (2.0, 200, 0.0), (0.8, 200, -2.0), (2.5, 200, 0.0),
+              (1.5, 200, -2.0), (2.0, 200, 0.0), (1.5, -200, 0.0), (1.0, 200, 1.0))
+
+def main():
+    # python certainty_grid.py [input_log.csv ...]
+    # Drives the logs (or CHECK_TOUR) through the default scene and checks that the grid and
+    # the obstacle geometry give the same binary VFH+ histogram at every step.
+    import sim_core
+    from sim_core import N_BINS, DETECTION_RANGE, VFH_CLEARANCE, DEFAULT_PARAMS
+    obstacles = sim_core.default_obstacles()
+    rects = vfh_engine.rects_to_array(obstacles)
+    window = ActiveWindow(grid_from_obstacles(obstacles, DETECTION_RANGE), N_BINS, DETECTION_RANGE, VFH_CLEARANCE)
+    low, high = DEFAULT_PARAMS["threshold_low"], DEFAULT_PARAMS["threshold"]
+    runs = [(path, sim_core.load_input_log(path)) for path in sys.argv[1:]]
+    runs = runs or [("check tour", sim_core.scripted_inputs(CHECK_TOUR))]
+    failed = False
+    for name, input_stream in runs:
+        previous = [None, None]
+        differing = []
+        def compare(state, inputs, vfh, collided):
+            geometry = vfh_engine.steering_histogram(state.pos_x, state.pos_y, rects, N_BINS, DETECTION_RANGE,
+                                                     VFH_CLEARANCE)
+            grid = window.steering_histogram(state.pos_x, state.pos_y)
+            previous[:] = [vfh_engine.binary_histogram(geometry, low, high, previous[0]),
+                           vfh_engine.binary_histogram(grid, low, high, previous[1])]
+            if not np.array_equal(*previous):
+                differing.append(state.steps)
+        state = sim_core.run(input_stream, obstacles, observer=compare)
+        print(f"{name}: {state.steps} steps, {len(differing)} with differing binary histograms")
+        failed = failed or bool(differing)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
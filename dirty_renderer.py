@@ -0,0 +1,186 @@
+import pygame
+import camera
+import scene_file
+import spatial_grid
+import distance_field
+
+# Renderer for the 2D simulators that only repaints what moves.
+# The background and obstacles are drawn once onto an off-screen surface. Every frame
+# the regions drawn in the previous frame are restored from that surface, the chair,
+# arrows and histogram are drawn on top, and only the union of old and new regions is
+# sent to the display with pygame.display.update instead of flipping the whole window.
+#
+# With a camera.Camera the layer covers the view plus LAYER_PAD on every side, in
+# world coordinates. While the camera stands still nothing changes; a scroll blits
+# the layer at the new offset, and only once the view leaves the layer is it drawn
+# again around the view. Given a spatial index instead of a list, the layer is drawn
+# from the obstacles the index returns for its area, so the cost of drawing does not
+# grow with the size of the map. scene_setup builds this view, together with the
+# obstacle index and distance field, the way every 2D simulator uses it.
+
+LAYER_PAD = 200     # pixels of world drawn past each window edge, scrolled into without a redraw
+
+class StaticLayerRenderer:
+    def __init__(self, screen, background_color, obstacles, scene=None, camera=None):
+        """
+        :param screen: Display surface returned by pygame.display.set_mode.
+        :param background_color: Fill color behind the obstacles.
+        :param obstacles: List of obstacle dicts ({"rect", "color"}) forming the static layer,
+                          or a spatial index of them (spatial_grid.SpatialGrid,
+                          world_tiles.World) that is queried for the area being drawn.
+        :param scene: Optional vfh_cache.SceneVersion; the layer is redrawn when it changes,
+                      unless the edit was passed to add_obstacle / remove_obstacle.
+        :param camera: Optional camera.Camera; obstacles are then in world coordinates and
+                       drawn where the camera looks.
+        """
+        self.screen = screen
+        self.background_color = background_color
+        if isinstance(obstacles, list):
+            # Keyed by id() so single obstacles can be dropped; dicts keep the drawing order
+            self.obstacles = {id(obs): obs for obs in obstacles}
+            self.index = None
+        else:
+            self.obstacles = None
+            self.index = obstacles
+        self.scene = scene
+        self.camera = camera
+        self.bounds = screen.get_rect()
+        self.pad = LAYER_PAD if camera is not None else 0
+        self.layer = pygame.Surface(self.bounds.inflate(2 * self.pad, 2 * self.pad).size).convert()
+        self.layer_rect = self.layer.get_rect()     # world area the layer holds
+        self.view = (0, 0)                          # camera position of the frame on screen
+        self.version = None
+        self.valid = False
+        self.full_update = True
+        self.previous = []
+        self.current = []
+
+    def invalidate(self):
+        """Forces the static layer to be redrawn, e.g. after obstacles were added."""
+        self.valid = False
+
+    def begin_frame(self):
+        """
+        Erases last frame's dynamic drawing (or redraws everything if the layer is stale
+        or the camera moved).
+        """
+        if self.scene is not None and self.scene.version != self.version:
+            self.valid = False
+        repaint = False
+        if self.camera is not None and (self.camera.x, self.camera.y) != self.view:
+            self.view = (self.camera.x, self.camera.y)
+            repaint = True
+            if not self.layer_rect.contains(self.bounds.move(self.view)):
+                self.valid = False
+        if not self.valid:
+            self.layer_rect.topleft = (self.view[0] - self.pad, self.view[1] - self.pad)
+            self.layer.fill(self.background_color)
+            for obs in self._visible():
+                self._draw(obs)
+            self.version = self.scene.version if self.scene is not None else None
+            self.valid = True
+            repaint = True
+        if repaint:
+            self.screen.blit(self.layer, (0, 0), self._layer_area(self.bounds))
+            self.full_update = True
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.layer, rect, self._layer_area(rect))
+        self.current = []
+
+    def _visible(self):
+        """Obstacles to draw onto the layer, in drawing order."""
+        if self.index is None:
+            return self.obstacles.values()
+        return self.index.query_rect(*self.layer_rect)
+
+    def _layer_area(self, rect):
+        """Layer area behind a screen rect."""
+        return rect.move(self.view[0] - self.layer_rect.x, self.view[1] - self.layer_rect.y)
+
+    def _draw(self, obs):
+        pygame.draw.rect(self.layer, obs["color"], obs["rect"].move(-self.layer_rect.x, -self.layer_rect.y))
+
+    def add_obstacle(self, obs):
+        """Draws a new obstacle onto the static layer; call after bumping the scene version."""
+        if self.obstacles is not None:
+            self.obstacles[id(obs)] = obs
+        if self.valid:
+            self._draw(obs)
+            self._refresh(obs["rect"])
+
+    def remove_obstacle(self, obs, overlapping):
+        """
+        Erases an obstacle from the static layer; call after bumping the scene version.
+
+        :param overlapping: The remaining obstacles overlapping it, in drawing order, which
+                            are redrawn over the erased area.
+        """
+        if self.obstacles is not None:
+            self.obstacles.pop(id(obs), None)
+        if self.valid:
+            rect = obs["rect"]
+            self.layer.set_clip(rect.move(-self.layer_rect.x, -self.layer_rect.y))
+            self.layer.fill(self.background_color)
+            for other in overlapping:
+                self._draw(other)
+            self.layer.set_clip(None)
+            self._refresh(rect)
+
+    def _refresh(self, rect):
+        # The region is restored from the layer and sent to the display with the next frame
+        self.previous.append(rect.move(-self.view[0], -self.view[1]).clip(self.bounds))
+        if self.scene is not None:
+            self.version = self.scene.version
+
+    def mark(self, rects):
+        """
+        Records what was drawn this frame. Accepts a Rect (as returned by pygame.draw
+        and Surface.blit) or a list of them, which is merged into one bounding rect.
+        """
+        if isinstance(rects, pygame.Rect):
+            rect = rects
+        elif rects:
+            rect = rects[0].unionall(rects[1:])
+        else:
+            return
+        rect = rect.clip(self.bounds)
+        if rect.width and rect.height:
+            self.current.append(rect)
+
+    def end_frame(self):
+        """Pushes the changed regions to the display."""
+        if self.full_update:
+            pygame.display.flip()
+            self.full_update = False
+        else:
+            pygame.display.update(self.previous + self.current)
+        self.previous = self.current
+
+def scene_view(screen, background_color, obstacles, world_size, scene=None):
+    """
+    Camera over a world of world_size (width, height) that follows the chair, and the
+    StaticLayerRenderer drawing obstacles (a list or spatial index) through it.
+
+    :return: (view, renderer)
+    """
+    view = camera.Camera(screen.get_width(), screen.get_height(), *world_size)
+    return view, StaticLayerRenderer(screen, background_color, obstacles, scene, view)
+
+def scene_setup(screen, background_color, scene_path, cell_size, reach=None, extra_obstacles=(), scene=None):
+    """
+    Loads a scene file once and builds what a 2D simulator queries and draws it with.
+
+    :param cell_size: Cell size of the spatial_grid.SpatialGrid of the obstacles.
+    :param reach: Optional max_distance of a distance_field.DistanceField of the obstacles,
+                  at least the reach of the queries it is to answer.
+    :param extra_obstacles: Obstacle dicts added to the scene's, e.g. user-placed ones.
+    :param scene: Optional vfh_cache.SceneVersion passed to the renderer.
+    :return: (obstacle_grid, field, view, renderer); field is None without reach.
+    """
+    layout = scene_file.load(scene_path)
+    obstacles = layout.obstacles_2d() + list(extra_obstacles)
+    obstacle_grid = spatial_grid.grid_from_obstacles(obstacles, cell_size)
+    field = distance_field.DistanceField(obstacles, reach) if reach is not None else None
+    view, renderer = scene_view(screen, background_color, obstacle_grid, (layout.width, layout.height), scene)
+    return obstacle_grid, field, view, renderer
@@ -0,0 +1,207 @@
+import math
+import numpy as np
+import spatial_grid
+
+# Signed distance field of the static scene on a regular raster.
+# Each cell stores the distance from its center to the nearest obstacle (negative
+# inside obstacles) together with the gradient, so "how far is the nearest
+# obstacle and in which direction" is a constant-time lookup regardless of how
+# many obstacles the scene has. The field is truncated at max_distance since
+# nothing beyond the detection range influences the wheelchair.
+# Rebuild it (rebuild()) when the obstacle set is replaced. A single obstacle added or
+# removed only changes cells within reach of it, which update() recomputes locally,
+# growing the raster first when the edit lies beyond its edge.
+
+class DistanceField:
+    def __init__(self, obstacles, max_distance, cell_size=4):
+        """
+        :param obstacles: 2D ({"rect"}) or Sim3D ({"center", "size"}) obstacle dicts.
+        :param max_distance: Largest distance that queries need to resolve, usually DETECTION_RANGE.
+        :param cell_size: Raster resolution in scene units.
+        """
+        self.max_distance = max_distance
+        self.cell_size = cell_size
+        # Worst-case lookup error: rasterizing at cell centers plus sampling the cell a
+        # point falls in each contribute up to about a cell diagonal
+        self.error = 2 * cell_size
+        self.reach = max_distance + 2 * self.error
+        # Cells whose value can depend on one occupied cell, either way
+        self.max_cells = int(math.ceil(self.reach / cell_size))
+        # update() needs the obstacles within this distance of the edited rectangle
+        self.update_margin = 2 * (self.max_cells + 2) * cell_size
+        self.version = 0
+        self.rebuild(obstacles)
+
+    def rebuild(self, obstacles):
+        """Recomputes the field for a new obstacle set and bumps self.version."""
+        cell = self.cell_size
+        reach = self.reach
+        bounds = [spatial_grid.obstacle_bounds(obs) for obs in obstacles]
+        if bounds:
+            x0 = min(b[0] for b in bounds) - reach
+            y0 = min(b[1] for b in bounds) - reach
+            x1 = max(b[0] + b[2] for b in bounds) + reach
+            y1 = max(b[1] + b[3] for b in bounds) + reach
+        else:
+            # np.gradient needs at least two cells per axis
+            x0 = y0 = 0.0
+            x1 = y1 = 2 * cell
+        self.origin = (x0, y0)
+        cols = int(math.ceil((x1 - x0) / cell))
+        rows = int(math.ceil((y1 - y0) / cell))
+
+        self.sdf = self._signed_distance(_occupancy(bounds, x0, y0, rows, cols, cell))
+        self.grad_y, self.grad_x = (g.astype(np.float32) for g in np.gradient(self.sdf, cell))
+        self.version += 1
+
+    def _signed_distance(self, occupied):
+        outside = _distance_transform(occupied, self.max_cells)
+        inside = _distance_transform(~occupied, self.max_cells)
+        # Cell centers sit half a cell away from the obstacle edge they border
+        sdf = np.where(occupied, -(inside - 0.5), outside - 0.5) * self.cell_size
+        return np.minimum(sdf, self.reach).astype(np.float32)
+
+    def update(self, obstacles, x, y, width, height):
+        """
+        Recomputes the cells around the rectangle (x, y, width, height) after obstacles
+        were added or removed inside it, and bumps self.version. The result equals a
+        full rebuild over the same raster.
+
+        A rectangle too close to the raster edge first grows the raster (see _grow()).
+
+        :param obstacles: Every obstacle within update_margin of the rectangle (others are ignored).
+        """
+        # The raster has to keep covering the obstacles plus reach
+        keep = self.max_cells + 1
+        r0, r1, c0, c1 = self._cells(x, y, width, height)
+        rows, cols = self.sdf.shape
+        if c0 - keep < 0 or r0 - keep < 0 or c1 + keep > cols or r1 + keep > rows:
+            self._grow(r0 - keep, r1 + keep, c0 - keep, c1 + keep)
+            r0, r1, c0, c1 = self._cells(x, y, width, height)
+            rows, cols = self.sdf.shape
+        cell = self.cell_size
+        x0, y0 = self.origin
+        # Cells within reach of the edit change; they depend on the cells within reach of them
+        ar0, ar1 = max(r0 - keep, 0), min(r1 + keep, rows)
+        ac0, ac1 = max(c0 - keep, 0), min(c1 + keep, cols)
+        br0, br1 = max(ar0 - keep, 0), min(ar1 + keep, rows)
+        bc0, bc1 = max(ac0 - keep, 0), min(ac1 + keep, cols)
+        bounds = [spatial_grid.obstacle_bounds(obs) for obs in obstacles]
+        occupied = _occupancy(bounds, x0 + bc0 * cell, y0 + br0 * cell, br1 - br0, bc1 - bc0, cell)
+        sdf = self._signed_distance(occupied)
+        grad_y, grad_x = np.gradient(sdf, cell)
+        inner = (slice(ar0 - br0, ar1 - br0), slice(ac0 - bc0, ac1 - bc0))
+        self.sdf[ar0:ar1, ac0:ac1] = sdf[inner]
+        self.grad_x[ar0:ar1, ac0:ac1] = grad_x[inner]
+        self.grad_y[ar0:ar1, ac0:ac1] = grad_y[inner]
+        self.version += 1
+
+    def _cells(self, x, y, width, height):
+        """Row and column range (r0, r1, c0, c1) of the cells the rectangle touches."""
+        cell = self.cell_size
+        x0, y0 = self.origin
+        c0 = int(math.floor((x - x0) / cell))
+        c1 = int(math.floor((x + width - x0) / cell)) + 1
+        r0 = int(math.floor((y - y0) / cell))
+        r1 = int(math.floor((y + height - y0) / cell)) + 1
+        return r0, r1, c0, c1
+
+    def _grow(self, r0, r1, c0, c1):
+        """
+        Extends the raster by whole cells until it covers rows r0..r1 and columns c0..c1
+        (which may lie outside it), with update_margin to spare so that further edits
+        nearby fit. The new cells lie beyond reach of every obstacle, so they hold the
+        capped distance and a zero gradient; only the gradient along the old edges, which
+        now has neighbours, is recomputed. Costs O(raster) copying but no distance transform.
+        """
+        cell = self.cell_size
+        rows, cols = self.sdf.shape
+        spare = int(math.ceil(self.update_margin / cell))
+        top = spare - r0 if r0 < 0 else 0
+        left = spare - c0 if c0 < 0 else 0
+        bottom = r1 - rows + spare if r1 > rows else 0
+        right = c1 - cols + spare if c1 > cols else 0
+        shape = (top + rows + bottom, left + cols + right)
+        old = (slice(top, top + rows), slice(left, left + cols))
+        sdf = np.full(shape, self.reach, dtype=np.float32)
+        sdf[old] = self.sdf
+        self.sdf = sdf
+        for name in ("grad_x", "grad_y"):
+            grad = np.zeros(shape, dtype=np.float32)
+            grad[old] = getattr(self, name)
+            setattr(self, name, grad)
+        self.origin = (self.origin[0] - left * cell, self.origin[1] - top * cell)
+        # Across each edge that grew, the gradient of the old edge cells and the new ones
+        # next to them changes; it is taken over two more cells of context
+        for edge in [edge for edge, grew in ((top, top), (top + rows, bottom)) if grew]:
+            self.grad_y[edge - 1:edge + 1] = np.gradient(self.sdf[edge - 2:edge + 2], cell, axis=0)[1:3]
+        for edge in [edge for edge, grew in ((left, left), (left + cols, right)) if grew]:
+            self.grad_x[:, edge - 1:edge + 1] = np.gradient(self.sdf[:, edge - 2:edge + 2], cell, axis=1)[:, 1:3]
+
+    def _cell(self, x, y):
+        col = int((x - self.origin[0]) // self.cell_size)
+        row = int((y - self.origin[1]) // self.cell_size)
+        if 0 <= row < self.sdf.shape[0] and 0 <= col < self.sdf.shape[1]:
+            return row, col
+        return None
+
+    def distance(self, x, y):
+        """Approximate signed distance from (x, y) to the nearest obstacle (capped)."""
+        cell = self._cell(x, y)
+        if cell is None:
+            # The raster covers every obstacle plus max_distance around it
+            return float(self.sdf.max()) if self.sdf.size else self.max_distance
+        return float(self.sdf[cell])
+
+    def nearest(self, x, y):
+        """
+        Returns (distance, angle) to the nearest obstacle, angle in radians pointing
+        from (x, y) towards the obstacle, or None when nothing is within max_distance.
+        """
+        cell = self._cell(x, y)
+        if cell is None or self.sdf[cell] >= self.max_distance:
+            return None
+        angle = math.atan2(-float(self.grad_y[cell]), -float(self.grad_x[cell]))
+        return float(self.sdf[cell]), angle
+
+    def is_clear(self, x, y, radius):
+        """True when the field guarantees that no obstacle lies within radius of (x, y)."""
+        return self.distance(x, y) - self.error >= radius
+
+def _occupancy(bounds, x0, y0, rows, cols, cell):
+    """rows x cols raster starting at (x0, y0), True where a cell center lies inside an obstacle."""
+    occupied = np.zeros((rows, cols), dtype=bool)
+    for bx, by, bw, bh in bounds:
+        c0 = int(math.ceil((bx - x0) / cell - 0.5))
+        c1 = int(math.ceil((bx + bw - x0) / cell - 0.5))
+        r0 = int(math.ceil((by - y0) / cell - 0.5))
+        r1 = int(math.ceil((by + bh - y0) / cell - 0.5))
+        occupied[max(r0, 0):max(r1, 0), max(c0, 0):max(c1, 0)] = True
+    return occupied
+
+def _distance_transform(mask, max_cells):
+    """
+    Euclidean distance (in cells) from every cell to the nearest True cell of mask,
+    truncated to max_cells + 1. Exact within the truncation radius.
+    """
+    rows, cols = mask.shape
+    far = max_cells + 1
+    if not mask.any():
+        return np.full(mask.shape, float(far))
+
+    # Pass 1: distance to the nearest True cell in the same column
+    index = np.arange(rows)[:, None]
+    above = np.where(mask, index, -far - rows)
+    above = np.maximum.accumulate(above, axis=0)
+    below = np.where(mask, index, far + 2 * rows)
+    below = np.minimum.accumulate(below[::-1], axis=0)[::-1]
+    column = np.minimum(np.minimum(index - above, below - index), far).astype(np.float64)
+
+    # Pass 2: combine columns within the truncation window along each row
+    column_sq = column * column
+    best = column_sq.copy()
+    for offset in range(1, min(far, cols)):
+        shift = offset * offset
+        np.minimum(best[:, offset:], column_sq[:, :-offset] + shift, out=best[:, offset:])
+        np.minimum(best[:, :-offset], column_sq[:, offset:] + shift, out=best[:, :-offset])
+    return np.minimum(np.sqrt(best), far)
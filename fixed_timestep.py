@@ -0,0 +1,62 @@
+# Fixed-timestep loop helper shared by the simulators.
+# Physics and avoidance run at a constant rate (e.g. 240 Hz) no matter how long a
+# frame took to draw, and rendering happens at the display rate or less. When the
+# loop falls behind, renders are skipped so physics can catch up, which keeps
+# control latency bounded and makes runs reproducible.
+
+PHYSICS_HZ = 240
+RENDER_HZ = 60
+
+class FixedTimestep:
+    def __init__(self, physics_hz=PHYSICS_HZ, render_hz=RENDER_HZ, max_steps_per_frame=None,
+                 max_backlog=0.25, max_skipped_renders=5):
+        """
+        :param physics_hz: Rate of the physics/avoidance updates.
+        :param render_hz: Maximum rate of rendered frames.
+        :param max_steps_per_frame: Physics steps allowed per loop iteration before the rest
+                                    is carried over (defaults to 4 render intervals worth).
+        :param max_backlog: Seconds of unsimulated time kept at most; anything older is
+                            dropped so a long stall does not snowball.
+        :param max_skipped_renders: Renders skipped in a row at most while behind.
+        """
+        self.dt = 1.0 / physics_hz
+        self.render_interval = 1.0 / render_hz
+        if max_steps_per_frame is None:
+            max_steps_per_frame = max(1, int(round(4 * physics_hz / render_hz)))
+        self.max_steps_per_frame = max_steps_per_frame
+        self.max_backlog = max_backlog
+        self.max_skipped_renders = max_skipped_renders
+
+        self.accumulator = 0.0
+        self.since_render = 0.0
+        self.steps_since_render = 0
+        self.skipped_renders = 0
+        self.behind = False
+
+    def advance(self, frame_time):
+        """
+        Adds the wall-clock time of the last loop iteration and returns how many
+        physics steps of self.dt seconds should run now.
+        """
+        self.accumulator = min(self.accumulator + frame_time, self.max_backlog)
+        self.since_render += frame_time
+        steps = min(int(self.accumulator / self.dt), self.max_steps_per_frame)
+        self.accumulator -= steps * self.dt
+        self.behind = self.accumulator >= self.dt
+        self.steps_since_render += steps
+        return steps
+
+    def should_render(self):
+        """
+        True when the state changed since the last render, the render interval has
+        passed and the loop is not busy catching up on physics.
+        """
+        if self.steps_since_render == 0 or self.since_render < self.render_interval:
+            return False
+        if self.behind and self.skipped_renders < self.max_skipped_renders:
+            self.skipped_renders += 1
+            return False
+        self.since_render = 0.0
+        self.steps_since_render = 0
+        self.skipped_renders = 0
+        return True
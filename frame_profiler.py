@@ -0,0 +1,143 @@
+import csv
+import json
+import time
+from collections import deque
+import numpy as np
+
+# Per-stage frame profiler for the simulators.
+# The loop calls begin_frame(), then lap("stage") after each stage (input, vfh,
+# avoidance, collision, draw, flip, ...) and end_frame(). A lap charges the time since
+# the previous lap to its stage, so stages repeated within a frame (physics substeps)
+# add up. Disabled, every call returns after one attribute check, so the calls can
+# stay in field builds.
+
+PERCENTILES = (50, 95, 99)
+WINDOW_FRAMES = 300         # frames the rolling percentiles are taken over
+REFRESH_FRAMES = 15         # overlay text is re-rendered this often
+
+class FrameProfiler:
+    def __init__(self, enabled=False, output_path=None, window=WINDOW_FRAMES):
+        """
+        :param enabled: Start recording right away.
+        :param output_path: File the per-frame records are written to by dump()
+                            (.json, anything else is written as CSV). Without one only
+                            the rolling window is kept, so an overlay-only session
+                            does not grow without bound.
+        :param window: Frames kept for the rolling percentiles.
+        """
+        self.enabled = enabled
+        self.output_path = output_path
+        self.show_overlay = False
+        self.stages = []          # stage names in first-seen order
+        self.records = []         # one {stage: ns} dict per recorded frame (with an output_path)
+        self.recent = deque(maxlen=window)
+        self.current = None
+        self.last = 0
+        self.overlay = None
+        self.frames_since_overlay = REFRESH_FRAMES
+
+    def toggle_overlay(self):
+        """Shows or hides the on-screen timings; showing them also starts recording."""
+        self.show_overlay = not self.show_overlay
+        if self.show_overlay:
+            self.enabled = True
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.current = {}
+        self.last = time.perf_counter_ns()
+
+    def lap(self, stage):
+        """Charges the time since the previous lap (or begin_frame) to stage."""
+        if not self.enabled or self.current is None:
+            return
+        now = time.perf_counter_ns()
+        if stage not in self.current:
+            self.current[stage] = 0
+            if stage not in self.stages:
+                self.stages.append(stage)
+        self.current[stage] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        if not self.enabled or self.current is None:
+            return
+        if self.output_path:
+            self.records.append(self.current)
+        self.recent.append(self.current)
+        self.current = None
+        self.frames_since_overlay += 1
+
+    def percentiles(self):
+        """{stage: (p50, p95, p99)} in milliseconds over the last window frames, plus "frame"."""
+        if not self.recent:
+            return {}
+        names = self.stages + ["frame"]
+        table = np.array([[record.get(stage, 0) for stage in self.stages] for record in self.recent],
+                         dtype=np.float64).reshape(len(self.recent), len(self.stages))
+        table = np.column_stack((table, table.sum(axis=1))) / 1e6
+        values = np.percentile(table, PERCENTILES, axis=0)
+        return {name: tuple(float(v) for v in values[:, i]) for i, name in enumerate(names)}
+
+    def overlay_surface(self, font):
+        """
+        Surface with one line of p50/p95/p99 per stage, re-rendered every REFRESH_FRAMES
+        frames; None while the overlay is hidden or nothing was recorded yet.
+        """
+        if not self.show_overlay:
+            return None
+        if self.overlay is None or self.frames_since_overlay >= REFRESH_FRAMES:
+            import pygame
+            stats = self.percentiles()
+            if not stats:
+                return None
+            lines = ["%-10s %6s %6s %6s" % ("ms", "p50", "p95", "p99")]
+            for name, (p50, p95, p99) in stats.items():
+                lines.append("%-10s %6.2f %6.2f %6.2f" % (name, p50, p95, p99))
+            rendered = [font.render(line, True, (255, 255, 255)) for line in lines]
+            width = max(surface.get_width() for surface in rendered) + 8
+            height = sum(surface.get_height() for surface in rendered) + 8
+            self.overlay = pygame.Surface((width, height))
+            self.overlay.fill((0, 0, 0))
+            y = 4
+            for surface in rendered:
+                self.overlay.blit(surface, (4, y))
+                y += surface.get_height()
+            self.frames_since_overlay = 0
+        return self.overlay
+
+    def draw_overlay(self, surface, font, margin=10):
+        """Blits the overlay to the top-right corner of surface; returns the rect or None."""
+        overlay = self.overlay_surface(font)
+        if overlay is None:
+            return None
+        return surface.blit(overlay, (surface.get_width() - overlay.get_width() - margin, margin))
+
+    def dump(self, path=None):
+        """
+        Writes the per-frame records (nanoseconds per stage) to path or output_path.
+        Frames are only kept when the profiler was given an output_path.
+        """
+        path = path or self.output_path
+        if not path or not self.records:
+            return
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"stages": self.stages, "frames": self.records}, f)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame"] + self.stages)
+                for i, record in enumerate(self.records):
+                    writer.writerow([i] + [record.get(stage, 0) for stage in self.stages])
+
+def from_args(argv):
+    """
+    Profiler configured from the command line: --profile <file.json|file.csv> records
+    from the start and writes the file on exit. Without it the profiler stays idle
+    until the overlay is toggled on (F3).
+    """
+    if "--profile" in argv and argv.index("--profile") + 1 < len(argv):
+        return FrameProfiler(enabled=True, output_path=argv[argv.index("--profile") + 1])
+    return FrameProfiler()
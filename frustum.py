@@ -0,0 +1,65 @@
+import math
+import numpy as np
+
+# View-frustum culling for Sim3D.
+# The frustum of a gluLookAt + gluPerspective camera is described by six planes with
+# inward facing normals. Its footprint on the ground is used to ask the scene's
+# spatial grid for candidate obstacles, and the candidates' bounding boxes are then
+# tested against all six planes at once with NumPy.
+
+class Frustum:
+    def __init__(self, eye, target, up, fovy_deg, aspect, near, far):
+        """
+        Same arguments as gluLookAt(eye, target, up) followed by
+        gluPerspective(fovy_deg, aspect, near, far).
+        """
+        eye = np.asarray(eye, dtype=np.float64)
+        forward = np.asarray(target, dtype=np.float64) - eye
+        forward /= np.linalg.norm(forward)
+        right = np.cross(forward, up)
+        right /= np.linalg.norm(right)
+        true_up = np.cross(right, forward)
+
+        tan_v = math.tan(math.radians(fovy_deg) / 2.0)
+        tan_h = tan_v * aspect
+        # A point eye + a * forward + b * right + c * up is inside when near <= a <= far,
+        # |b| <= a * tan_h and |c| <= a * tan_v; each bound is one plane n . p + d >= 0
+        normals = np.array([
+            forward,
+            -forward,
+            right + tan_h * forward,
+            -right + tan_h * forward,
+            true_up + tan_v * forward,
+            -true_up + tan_v * forward,
+        ])
+        offsets = -normals @ eye
+        offsets[0] -= near
+        offsets[1] += far
+        self.normals = normals
+        self.offsets = offsets
+
+        corners = []
+        for depth in (near, far):
+            for sx in (-1, 1):
+                for sy in (-1, 1):
+                    corners.append(eye + depth * (forward + sx * tan_h * right + sy * tan_v * true_up))
+        self.corners = np.array(corners)
+
+    def footprint(self):
+        """(x, z, width, depth) bounding rectangle of the frustum on the ground plane."""
+        x0, z0 = self.corners[:, [0, 2]].min(axis=0)
+        x1, z1 = self.corners[:, [0, 2]].max(axis=0)
+        return (x0, z0, x1 - x0, z1 - z0)
+
+    def boxes_visible(self, mins, maxs):
+        """
+        Boolean mask of the axis-aligned boxes (M, 3 arrays of min and max corners)
+        that are at least partly inside the frustum. Conservative: a box that is
+        outside but near a frustum corner can be reported visible.
+        """
+        mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+        maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+        # Corner of each box furthest along each plane normal
+        furthest = np.where(self.normals[None, :, :] >= 0, maxs[:, None, :], mins[:, None, :])
+        distance = (furthest * self.normals[None, :, :]).sum(axis=-1) + self.offsets
+        return (distance >= 0).all(axis=1)
@@ -0,0 +1,166 @@
+import numpy as np
+from OpenGL.GL import *
+
+# Retained-mode geometry for Sim3D.
+# The ground and every static obstacle box are uploaded once into vertex buffers
+# (positions and colors) with one index buffer for the faces and one for the edges,
+# so a frame draws all static geometry with two glDrawElements calls instead of a
+# glBegin/glVertex3fv sequence per face of every box. With frustum culling the index
+# buffers only hold the visible boxes; they are re-uploaded when that set changes.
+
+# Unit box corners and faces, in the same order as Sim3D.draw_box
+BOX_CORNERS = np.array([
+    (-0.5, -0.5,  0.5), ( 0.5, -0.5,  0.5), ( 0.5,  0.5,  0.5), (-0.5,  0.5,  0.5),
+    (-0.5, -0.5, -0.5), ( 0.5, -0.5, -0.5), ( 0.5,  0.5, -0.5), (-0.5,  0.5, -0.5),
+])
+BOX_FACES = np.array([
+    (0, 1, 2, 3),  # front
+    (4, 5, 6, 7),  # back
+    (0, 4, 7, 3),  # left
+    (1, 5, 6, 2),  # right
+    (3, 2, 6, 7),  # top
+    (0, 1, 5, 4),  # bottom
+])
+# Each of the 12 edges once (draw_box outlined every face, drawing each edge twice)
+BOX_EDGES = np.array([
+    (0, 1), (1, 2), (2, 3), (3, 0),
+    (4, 5), (5, 6), (6, 7), (7, 4),
+    (0, 4), (1, 5), (2, 6), (3, 7),
+])
+
+def box_geometry(obstacles):
+    """
+    Vertex positions (8 per box), per-vertex colors (0..1), quad indices and line
+    indices for a list of Sim3D obstacle dicts ({"center", "size", "color"}).
+    """
+    if not obstacles:
+        return (np.zeros((0, 3), np.float32), np.zeros((0, 3), np.float32),
+                np.zeros(0, np.uint32), np.zeros(0, np.uint32))
+    centers = np.array([obs['center'] for obs in obstacles], dtype=np.float64)
+    sizes = np.array([obs['size'] for obs in obstacles], dtype=np.float64)
+    colors = np.array([obs['color'] for obs in obstacles], dtype=np.float64) / 255.0
+
+    vertices = centers[:, None, :] + BOX_CORNERS[None, :, :] * sizes[:, None, :]
+    base = (np.arange(len(obstacles)) * len(BOX_CORNERS))[:, None, None]
+    quads = BOX_FACES[None, :, :] + base
+    lines = BOX_EDGES[None, :, :] + base
+    return (vertices.reshape(-1, 3).astype(np.float32),
+            np.repeat(colors, len(BOX_CORNERS), axis=0).astype(np.float32),
+            quads.ravel().astype(np.uint32),
+            lines.ravel().astype(np.uint32))
+
+class StaticScene:
+    def __init__(self, obstacles, ground_color, ground_extent):
+        """
+        :param obstacles: Sim3D obstacle dicts; they must not move while the scene is in use.
+        :param ground_color: RGB (0..255) of the ground quad.
+        :param ground_extent: The ground spans -ground_extent..ground_extent in X and Z.
+        """
+        self.ground_color = ground_color
+        self.ground_extent = ground_extent
+        self.vertex_buffer, self.color_buffer, self.face_buffer, self.edge_buffer = glGenBuffers(4)
+        self.submitted = 0      # boxes drawn in the last frame
+        self.culled = 0         # boxes skipped in the last frame
+        self.frames = 0
+        self.total_culled = 0
+        self.rebuild(obstacles)
+
+    def rebuild(self, obstacles):
+        """Uploads the ground and obstacles again, e.g. after obstacles were added."""
+        vertices, colors, quads, lines = box_geometry(obstacles)
+        self.box_index = {id(obs): i for i, obs in enumerate(obstacles)}
+        box_vertices = vertices.reshape(-1, len(BOX_CORNERS), 3)
+        self.mins = box_vertices.min(axis=1)
+        self.maxs = box_vertices.max(axis=1)
+
+        # The ground quad goes first so it is drawn before the boxes, as before
+        e = self.ground_extent
+        ground = np.array([(-e, 0, -e), (e, 0, -e), (e, 0, e), (-e, 0, e)], dtype=np.float32)
+        ground_colors = np.tile(np.array(self.ground_color, dtype=np.float32) / 255.0, (4, 1))
+        vertices = np.concatenate((ground, vertices))
+        colors = np.concatenate((ground_colors, colors))
+        self.ground_quad = np.arange(4, dtype=np.uint32)
+        self.box_quads = (quads + 4).reshape(len(obstacles), BOX_FACES.size)
+        self.box_lines = (lines + 4).reshape(len(obstacles), BOX_EDGES.size)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glBufferData(GL_ARRAY_BUFFER, colors.nbytes, colors, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.uploaded = None
+        self._upload(np.arange(len(obstacles)))
+
+    def _upload(self, boxes):
+        """Fills the index buffers with the ground and the given boxes."""
+        quads = np.concatenate((self.ground_quad, self.box_quads[boxes].ravel()))
+        lines = self.box_lines[boxes].ravel()
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.face_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, quads.nbytes, quads, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, lines.nbytes, lines, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.face_count = len(quads)
+        self.edge_count = len(lines)
+        self.uploaded = boxes
+
+    def cull(self, frustum, candidates=None):
+        """
+        Indices of the boxes inside a frustum.Frustum.
+
+        :param candidates: Optional obstacle dicts to test instead of all of them,
+                           e.g. spatial_grid query_rect(*frustum.footprint()).
+        """
+        if candidates is None:
+            boxes = np.arange(len(self.mins))
+        else:
+            boxes = np.array(sorted(self.box_index[id(obs)] for obs in candidates), dtype=np.intp)
+        return boxes[frustum.boxes_visible(self.mins[boxes], self.maxs[boxes])]
+
+    def stats(self):
+        """Boxes drawn and culled in the last frame, and the average culled per frame."""
+        return {
+            "submitted": self.submitted,
+            "culled": self.culled,
+            "mean_culled": self.total_culled / self.frames if self.frames else 0.0,
+        }
+
+    def draw(self, boxes=None):
+        """
+        Draws the ground and obstacles (one call) and the black obstacle edges (one call).
+
+        :param boxes: Indices of the boxes to draw (from cull()); all boxes when None.
+        """
+        if boxes is None:
+            boxes = np.arange(len(self.mins))
+        if len(boxes) != len(self.uploaded) or (boxes != self.uploaded).any():
+            self._upload(boxes)
+        self.submitted = len(boxes)
+        self.culled = len(self.mins) - len(boxes)
+        self.frames += 1
+        self.total_culled += self.culled
+
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+
+        glEnableClientState(GL_COLOR_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
+        glColorPointer(3, GL_FLOAT, 0, None)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.face_buffer)
+        glDrawElements(GL_QUADS, self.face_count, GL_UNSIGNED_INT, None)
+        glDisableClientState(GL_COLOR_ARRAY)
+
+        if self.edge_count:
+            glColor3f(0, 0, 0)
+            glLineWidth(2.0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.edge_buffer)
+            glDrawElements(GL_LINES, self.edge_count, GL_UNSIGNED_INT, None)
+
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+
+    def delete(self):
+        """Frees the GL buffers."""
+        glDeleteBuffers(4, [self.vertex_buffer, self.color_buffer, self.face_buffer, self.edge_buffer])
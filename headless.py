@@ -0,0 +1,145 @@
+import os
+import time
+import ctypes.util
+import hashlib
+
+# Headless rendering support for CI and batch runs.
+# The 2D simulators render with SDL's dummy video driver: pygame.display.set_mode then
+# returns an ordinary off-screen surface and display updates are no-ops. Sim3D needs a
+# GL context without a window; use_osmesa() selects PyOpenGL's OSMesa platform (software
+# rendering into a memory buffer). Frames are read back, hashed and optionally exported
+# as PNG files, and the headless runners step the simulation as fast as possible instead
+# of throttling to the display rate. replay() is that loop for the 2D simulators that
+# step themselves rather than through sim_core.run.
+
+def use_dummy_drivers():
+    """Makes SDL render without a window or audio device. Call before pygame.init()."""
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+def use_osmesa():
+    """
+    Makes PyOpenGL use OSMesa. Must be called before anything imports OpenGL.
+    Needs the OSMesa library (e.g. libosmesa6 on Debian/Ubuntu); raises RuntimeError
+    when it is missing, where PyOpenGL would fail with an obscure import error.
+    """
+    if ctypes.util.find_library("OSMesa") is None:
+        raise RuntimeError("Headless 3D rendering needs the OSMesa library (e.g. libosmesa6 on "
+                           "Debian/Ubuntu) and PyOpenGL; run without --headless to use a window")
+    os.environ["PYOPENGL_PLATFORM"] = "osmesa"
+
+class OSMesaContext:
+    def __init__(self, width, height):
+        """Off-screen GL context rendering into a memory buffer of width x height pixels."""
+        from OpenGL import GL, arrays, osmesa
+        self.width = width
+        self.height = height
+        self.context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        if not self.context:
+            raise RuntimeError("Could not create an OSMesa context")
+        self.buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL.GL_UNSIGNED_BYTE, width, height):
+            raise RuntimeError("Could not make the OSMesa context current")
+
+    def read_pixels(self):
+        """RGB bytes of the current frame, top row first (as pygame surfaces store them)."""
+        from OpenGL import GL
+        GL.glFinish()
+        data = GL.glReadPixels(0, 0, self.width, self.height, GL.GL_RGB, GL.GL_UNSIGNED_BYTE)
+        row = self.width * 3
+        return b"".join(data[y * row:(y + 1) * row] for y in range(self.height - 1, -1, -1))
+
+    def destroy(self):
+        from OpenGL import osmesa
+        osmesa.OSMesaDestroyContext(self.context)
+
+class FrameSink:
+    def __init__(self, export_dir=None):
+        """
+        Collects a hash (and the render time) of every frame.
+
+        :param export_dir: Optional directory to save each frame to as frame_00000.png, ...
+        """
+        self.export_dir = export_dir
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+        self.hashes = []
+        self.frame_times = []
+        self.last = time.perf_counter()
+
+    def add(self, pixels, size):
+        """
+        Records one frame.
+
+        :param pixels: Raw RGB bytes, top row first.
+        :param size: (width, height) of the frame.
+        """
+        now = time.perf_counter()
+        self.frame_times.append(now - self.last)
+        self.hashes.append(hashlib.md5(pixels).hexdigest())
+        if self.export_dir:
+            import pygame
+            image = pygame.image.frombuffer(pixels, size, "RGB")
+            pygame.image.save(image, os.path.join(self.export_dir, "frame_%05d.png" % (len(self.hashes) - 1)))
+        self.last = time.perf_counter()
+
+    def add_surface(self, surface):
+        """Records a pygame surface, e.g. the display surface under the dummy driver."""
+        import pygame
+        self.add(pygame.image.tobytes(surface, "RGB"), surface.get_size())
+
+    def write_hashes(self, path):
+        """Writes one hash per line, for comparing renders between commits."""
+        with open(path, "w") as f:
+            f.write("\n".join(self.hashes) + "\n")
+
+    def summary(self):
+        """Frame count and frame times in milliseconds (time between consecutive frames)."""
+        times = sorted(self.frame_times)
+        if not times:
+            return {"frames": 0}
+        return {
+            "frames": len(times),
+            "mean_ms": 1000.0 * sum(times) / len(times),
+            "p95_ms": 1000.0 * times[min(len(times) - 1, int(0.95 * len(times)))],
+            "max_ms": 1000.0 * times[-1],
+        }
+
+def replay(input_stream, step, draw, surface, sink, render_hz):
+    """
+    Feeds a recorded input stream to a 2D simulator as fast as possible and records a
+    frame every 1/render_hz of simulated time, the way the interactive loop renders.
+
+    :param input_stream: Iterable of (dt, forward_speed, turning_input), e.g. sim_core.load_input_log.
+    :param step: callable(dt, inputs) advancing the simulation by one timestep.
+    :param draw: callable() drawing the current state onto surface.
+    :param surface: Display surface recorded into sink after each draw.
+    :param sink: FrameSink receiving the frames.
+    :return: Number of steps taken.
+    """
+    sim_time = 0.0
+    next_render = 0.0
+    steps = 0
+    for dt, forward_speed, turning_input in input_stream:
+        step(dt, (forward_speed, turning_input))
+        sim_time += dt
+        steps += 1
+        if sim_time >= next_render:
+            next_render += 1.0 / render_hz
+            draw()
+            sink.add_surface(surface)
+    return steps
+
+def parse_args(argv):
+    """
+    Headless options shared by the simulators:
+    --headless <input_log.csv> [--frames <dir>] [--hashes <file>]
+    Returns (input_log, frames_dir, hash_path), or None when --headless is absent.
+    """
+    if "--headless" not in argv:
+        return None
+    def value(flag):
+        if flag in argv and argv.index(flag) + 1 < len(argv):
+            return argv[argv.index(flag) + 1]
+        return None
+    return value("--headless"), value("--frames"), value("--hashes")
@@ -1,3 +1,4 @@
+import math
 import random
 import time
 from Motor import *
@@ -50,6 +51,17 @@ class Ultrasonic:
     def turnServo(self,angle):
         self.pwm_S.setServoPwm('0', angle)
 
+    def scanToGrid(self, grid, angles=(30, 90, 150), pos_x=0, pos_y=0, heading=0):
+        '''Sweeps the servo and adds each reading to grid, anything with add_range_reading such as
+        a certainty_grid.CertaintyGrid (units: cm), so certainty_grid.ActiveWindow can build a VFH
+        histogram from real sensor data.
+        Servo angle 90 points along heading, smaller angles to the left.'''
+        for servo_angle in angles:
+            self.turnServo(servo_angle)
+            time.sleep(0.5)
+            bearing = heading + math.radians(servo_angle - 90)
+            grid.add_range_reading(pos_x, pos_y, bearing, self.get_distance(), self.MAX_DISTANCE)
+
     def setMotorSpeed(self, TL, TR, BL, BR):
         self.PWM.setMotorModel(TL, TR, BL, BR)
 
@@ -0,0 +1,80 @@
+import numpy as np
+import spatial_grid
+import distance_field
+import vfh_cache
+
+# Obstacle edits applied in place to everything built from the scene.
+# A LiveScene owns the obstacle store and the structures the simulators derive from
+# it: the spatial index, the distance field, the shared occupancy grid, the scene
+# version the VFH cache and renderer watch, and (once attached) the renderer's
+# static layer. They are built once; add() and remove() then patch each of them
+# around the edited obstacle (O(1) in the store, the cells it covers in the index,
+# occupancy grid and layer, the cells within reach in the distance field) instead
+# of anything being rebuilt for the whole scene.
+
+class LiveScene:
+    def __init__(self, store, detection_range, occupancy=None, scene=None):
+        """
+        :param store: obstacle_store.ObstacleStore holding the scene.
+        :param detection_range: Cell size of the spatial index and range of the distance field.
+        :param occupancy: Optional occupancy_grid.OccupancyGrid of the same obstacles.
+        :param scene: Optional vfh_cache.SceneVersion to bump (a new one by default).
+        """
+        self.store = store
+        obstacles = store.obstacles()
+        self.index = spatial_grid.grid_from_obstacles(obstacles, detection_range)
+        self.field = distance_field.DistanceField(obstacles, detection_range)
+        self.occupancy = occupancy
+        self.scene = scene if scene is not None else vfh_cache.SceneVersion()
+        self.renderer = None
+
+    def obstacles(self):
+        """
+        Obstacle dicts of the whole scene (the same dicts on every call) in the order they
+        were added, which is the drawing order and the order index queries return them in.
+        """
+        return self.store.obstacles(np.sort(self.store.ids()))
+
+    def attach_renderer(self, renderer):
+        """dirty_renderer.StaticLayerRenderer whose static layer follows the edits."""
+        self.renderer = renderer
+
+    def obstacle_at(self, x, y):
+        """Id of the topmost obstacle containing (x, y), or None."""
+        hits = self.index.query_radius(x, y, 0)
+        return hits[-1]["id"] if hits else None
+
+    def add(self, x, y, w, h, color, height=0, flags=0):
+        """Adds an obstacle everywhere and returns its id (arguments as ObstacleStore.append)."""
+        obstacle_id = self.store.append(x, y, w, h, color, height, flags)
+        obs = self.store.obstacle(obstacle_id)
+        self.index.insert(obs)
+        if self.occupancy is not None:
+            self.occupancy.add_rect(x, y, w, h)
+        self.scene.added([obs])
+        self._update_field(obs)
+        if self.renderer is not None:
+            self.renderer.add_obstacle(obs)
+        return obstacle_id
+
+    def remove(self, obstacle_id):
+        """Removes an obstacle everywhere."""
+        obs = self.store.obstacle(obstacle_id)
+        self.store.remove(obstacle_id)
+        self.index.remove(obs)
+        x, y, width, height = spatial_grid.obstacle_bounds(obs)
+        if self.occupancy is not None:
+            # The cells it touched, padded by one so neighbours sharing them are found
+            pad = self.occupancy.cell_size
+            self.occupancy.clear_rect(x, y, width, height,
+                                      self.index.query_rect(x - pad, y - pad, width + 2 * pad, height + 2 * pad))
+        self.scene.changed()
+        self._update_field(obs)
+        if self.renderer is not None:
+            self.renderer.remove_obstacle(obs, self.index.query_rect(x, y, width, height))
+
+    def _update_field(self, obs):
+        x, y, width, height = spatial_grid.obstacle_bounds(obs)
+        margin = self.field.update_margin
+        nearby = self.index.query_rect(x - margin, y - margin, width + 2 * margin, height + 2 * margin)
+        self.field.update(nearby, x, y, width, height)
@@ -0,0 +1,240 @@
+import numpy as np
+
+# Structure-of-arrays storage for obstacles.
+# Instead of one dict with a pygame.Rect and a color tuple per obstacle, the store
+# keeps parallel NumPy columns (x, y, width, height as one (capacity, 4) float array,
+# box height, color index into a shared palette, flags) that grow by doubling, so
+# appending is amortized O(1). Removal moves the last row into the hole, also O(1);
+# obstacles are therefore addressed by a stable id, mapped to their row by an array.
+# rects() is a zero-copy (M, 4) view in the layout the VFH engine takes, and the
+# geometry queries run over all rows at once. Code that still wants the old dicts gets
+# them from obstacle()/obstacles(): they are built on first use, cached per id and kept
+# in step with update(), so the spatial grid and renderer can keep holding on to them.
+
+FLAG_USER_ADDED = 1    # placed in add_obstacle_mode rather than loaded with the scene
+FLAG_WALL = 2          # boundary wall (Sim3D)
+
+INITIAL_CAPACITY = 16
+
+class ObstacleStore:
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.count = 0
+        self._rects = np.zeros((capacity, 4), dtype=np.float64)
+        self._height = np.zeros(capacity, dtype=np.float32)
+        self._color_index = np.zeros(capacity, dtype=np.uint16)
+        self._flags = np.zeros(capacity, dtype=np.uint8)
+        self._ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = np.full(capacity, -1, dtype=np.int64)   # obstacle id -> row, -1 once removed
+        self.next_id = 0
+        self.palette = []         # (r, g, b) tuples, referenced by color index
+        self._palette_index = {}
+        self._palette_array = None
+        self._dicts = {}          # obstacle id -> dict handed out by obstacle()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, obstacle_id):
+        return 0 <= obstacle_id < self.next_id and self._rows[obstacle_id] >= 0
+
+    def row(self, obstacle_id):
+        """Current row of an obstacle (rows change when other obstacles are removed)."""
+        if obstacle_id not in self:
+            raise KeyError(obstacle_id)
+        return int(self._rows[obstacle_id])
+
+    def _reserve(self, count):
+        capacity = len(self._ids)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        self._rects = np.resize(self._rects, (capacity, 4))
+        self._height = np.resize(self._height, capacity)
+        self._color_index = np.resize(self._color_index, capacity)
+        self._flags = np.resize(self._flags, capacity)
+        self._ids = np.resize(self._ids, capacity)
+
+    def _reserve_ids(self, count):
+        capacity = len(self._rows)
+        if count <= capacity:
+            return
+        while capacity < count:
+            capacity *= 2
+        rows = np.full(capacity, -1, dtype=np.int64)
+        rows[:len(self._rows)] = self._rows
+        self._rows = rows
+
+    def color_index(self, color):
+        """Palette index of an RGB color, adding it to the palette if needed."""
+        color = tuple(int(c) for c in color)
+        index = self._palette_index.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self._palette_index[color] = index
+            self._palette_array = None
+        return index
+
+    # -------------------------
+    # Editing
+    # -------------------------
+    def append(self, x, y, w, h, color, height=0, flags=0):
+        """Adds an obstacle and returns its id."""
+        self._reserve(self.count + 1)
+        self._reserve_ids(self.next_id + 1)
+        row = self.count
+        obstacle_id = self.next_id
+        self.next_id += 1
+        self._rects[row] = (x, y, w, h)
+        self._height[row] = height
+        self._color_index[row] = self.color_index(color)
+        self._flags[row] = flags
+        self._ids[row] = obstacle_id
+        self._rows[obstacle_id] = row
+        self.count += 1
+        return obstacle_id
+
+    def extend(self, rects, colors, heights=None, flags=None):
+        """
+        Adds many obstacles at once.
+
+        :param rects: (M, 4) x, y, width, height.
+        :param colors: (M, 3) RGB values.
+        :param heights: Optional (M,) box heights (0 for the simulator's default).
+        :param flags: Optional (M,) flags.
+        :return: Array of the new ids.
+        """
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        m = len(rects)
+        self._reserve(self.count + m)
+        self._reserve_ids(self.next_id + m)
+        rows = slice(self.count, self.count + m)
+        ids = np.arange(self.next_id, self.next_id + m, dtype=np.int64)
+        unique, inverse = np.unique(np.asarray(colors, dtype=np.int64).reshape(-1, 3), axis=0, return_inverse=True)
+        lookup = np.array([self.color_index(color) for color in unique.tolist()], dtype=np.uint16)
+        self._rects[rows] = rects
+        self._height[rows] = 0 if heights is None else heights
+        self._color_index[rows] = lookup[inverse.reshape(-1)] if m else 0
+        self._flags[rows] = 0 if flags is None else flags
+        self._ids[rows] = ids
+        self._rows[ids] = np.arange(self.count, self.count + m)
+        self.count += m
+        self.next_id += m
+        return ids
+
+    def remove(self, obstacle_id):
+        """Removes an obstacle; the last row moves into its place."""
+        row = self.row(obstacle_id)
+        self._rows[obstacle_id] = -1
+        last = self.count - 1
+        if row != last:
+            self._rects[row] = self._rects[last]
+            self._height[row] = self._height[last]
+            self._color_index[row] = self._color_index[last]
+            self._flags[row] = self._flags[last]
+            moved = int(self._ids[last])
+            self._ids[row] = moved
+            self._rows[moved] = row
+        self.count = last
+        self._dicts.pop(obstacle_id, None)
+
+    def update(self, obstacle_id, x=None, y=None, w=None, h=None, color=None):
+        """Moves, resizes or recolors an obstacle; its cached dict is updated in place."""
+        row = self.row(obstacle_id)
+        for column, value in enumerate((x, y, w, h)):
+            if value is not None:
+                self._rects[row, column] = value
+        if color is not None:
+            self._color_index[row] = self.color_index(color)
+        obs = self._dicts.get(obstacle_id)
+        if obs is not None:
+            obs["rect"].update(*self._rects[row].tolist())
+            obs["color"] = self.palette[self._color_index[row]]
+
+    # -------------------------
+    # Column views (valid until the next edit)
+    # -------------------------
+    def rects(self):
+        """(M, 4) float64 view of x, y, width, height, the layout vfh_engine takes."""
+        return self._rects[:self.count]
+
+    def heights(self):
+        return self._height[:self.count]
+
+    def flags(self):
+        return self._flags[:self.count]
+
+    def ids(self):
+        return self._ids[:self.count]
+
+    def colors(self):
+        """(M, 3) uint8 RGB of every row."""
+        if self._palette_array is None:
+            self._palette_array = np.array(self.palette, dtype=np.uint8).reshape(-1, 3)
+        return self._palette_array[self._color_index[:self.count]]
+
+    def nbytes(self):
+        """Memory held by the columns (including spare capacity)."""
+        return (self._rects.nbytes + self._height.nbytes + self._color_index.nbytes + self._flags.nbytes
+                + self._ids.nbytes + self._rows.nbytes)
+
+    # -------------------------
+    # Vectorized geometry
+    # -------------------------
+    def closest_points(self, pos_x, pos_y):
+        """(dx, dy, distance) from (pos_x, pos_y) to the closest point of every obstacle."""
+        x, y, w, h = self.rects().T
+        dx = np.maximum(x, np.minimum(pos_x, x + w)) - pos_x
+        dy = np.maximum(y, np.minimum(pos_y, y + h)) - pos_y
+        return dx, dy, np.sqrt(dx * dx + dy * dy)
+
+    def query_radius(self, pos_x, pos_y, radius):
+        """Ids of the obstacles whose closest point lies within radius of (pos_x, pos_y)."""
+        _, _, distance = self.closest_points(pos_x, pos_y)
+        return self.ids()[distance <= radius]
+
+    def query_rect(self, x, y, width, height):
+        """Ids of the obstacles overlapping the rectangle (strict, like pygame.Rect.colliderect)."""
+        bx, by, bw, bh = self.rects().T
+        hit = (x < bx + bw) & (bx < x + width) & (y < by + bh) & (by < y + height)
+        return self.ids()[hit]
+
+    # -------------------------
+    # Dict adapter for the existing code
+    # -------------------------
+    def obstacle(self, obstacle_id):
+        """
+        The obstacle as a 2D simulator dict, {"rect": pygame.Rect, "color": (r, g, b), "id": id}.
+        The same dict is returned on every call until the obstacle is removed.
+        """
+        obs = self._dicts.get(obstacle_id)
+        if obs is None:
+            import pygame
+            row = self.row(obstacle_id)
+            obs = {"rect": pygame.Rect(*self._rects[row].tolist()),
+                   "color": self.palette[self._color_index[row]],
+                   "id": obstacle_id}
+            self._dicts[obstacle_id] = obs
+        return obs
+
+    def obstacles(self, ids=None):
+        """Dicts of the given ids (all obstacles in row order by default)."""
+        if ids is None:
+            ids = self.ids()
+        return [self.obstacle(obstacle_id) for obstacle_id in np.asarray(ids).tolist()]
+
+def from_scene(scene, flags=0):
+    """Store holding the obstacles of a scene_file.Scene; flags are added to the scene's own."""
+    records = scene.records
+    store = ObstacleStore(max(INITIAL_CAPACITY, len(records)))
+    store.extend(scene.rects(), records["color"], records["height"], records["flags"] | flags)
+    return store
+
+def from_obstacles(obstacles, flags=0):
+    """Store holding a list of 2D obstacle dicts ({"rect", "color"})."""
+    store = ObstacleStore(max(INITIAL_CAPACITY, len(obstacles)))
+    for obs in obstacles:
+        rect = obs["rect"]
+        store.append(rect.x, rect.y, rect.width, rect.height, obs["color"], obs.get("height", 0), flags)
+    return store
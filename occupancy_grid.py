@@ -0,0 +1,137 @@
+import math
+import numpy as np
+import spatial_grid
+import certainty_grid
+
+# One occupancy raster of the scene shared by the planner, the grid VFH and collision.
+# values is a uint8 array (rows along y, columns along x) with 1 in every cell an
+# obstacle touches, including cells it only touches along an edge, and 0 elsewhere:
+# - it is the map format of the A* notebook (0 = open, 1 = obstacle)
+# - certainty_grid.ActiveWindow takes it in place of a CertaintyGrid, an occupied
+#   cell counting as fully certain
+# - rect_is_free() answers "can anything be in this box" with one slice, so exact
+#   collision tests only run where a cell is occupied
+# Adding or removing an obstacle only rewrites the cells under it and bumps version,
+# so the grid is built once per scene and kept up to date instead of being
+# rasterized again.
+
+CELL_SIZE = certainty_grid.CELL_SIZE
+
+class OccupancyGrid:
+    value_scale = certainty_grid.MAX_CERTAINTY    # an occupied cell is fully certain
+
+    def __init__(self, x, y, width, height, cell_size=CELL_SIZE):
+        """
+        Occupancy grid covering the rectangle (x, y, width, height), all cells free.
+        """
+        self.origin = (x, y)
+        self.cell_size = cell_size
+        cols = max(1, int(math.ceil(width / cell_size)))
+        rows = max(1, int(math.ceil(height / cell_size)))
+        self.values = np.zeros((rows, cols), dtype=np.uint8)
+        self.version = 0
+
+    def cell_of(self, x, y):
+        """(row, col) of the cell containing (x, y); may lie outside the grid."""
+        return (int((y - self.origin[1]) // self.cell_size),
+                int((x - self.origin[0]) // self.cell_size))
+
+    def cell_center(self, row, col):
+        """Scene position of the center of a cell, e.g. to follow a planned path."""
+        return (self.origin[0] + (col + 0.5) * self.cell_size,
+                self.origin[1] + (row + 0.5) * self.cell_size)
+
+    def _cell_ranges(self, rects):
+        """Unclipped first and one-past-last rows and columns of the cells each (x, y, w, h) touches."""
+        cell = self.cell_size
+        x = (rects[:, 0] - self.origin[0]) / cell
+        y = (rects[:, 1] - self.origin[1]) / cell
+        c0 = np.floor(x).astype(np.int64)
+        r0 = np.floor(y).astype(np.int64)
+        c1 = np.floor(x + rects[:, 2] / cell).astype(np.int64) + 1
+        r1 = np.floor(y + rects[:, 3] / cell).astype(np.int64) + 1
+        return r0, r1, c0, c1
+
+    def add_rect(self, x, y, width, height):
+        """Marks every cell the rectangle touches as occupied."""
+        self.add_rects(np.array([[x, y, width, height]], dtype=np.float64))
+
+    def add_rects(self, rects):
+        """Marks the cells of every (x, y, width, height) row of an (M, 4) array."""
+        rects = np.asarray(rects, dtype=np.float64).reshape(-1, 4)
+        rows, cols = self.values.shape
+        r0, r1, c0, c1 = (np.clip(edge, 0, limit) for edge, limit in
+                          zip(self._cell_ranges(rects), (rows, rows, cols, cols)))
+        for a, b, c, d in zip(r0.tolist(), r1.tolist(), c0.tolist(), c1.tolist()):
+            self.values[a:b, c:d] = 1
+        self.version += 1
+
+    def clear_rect(self, x, y, width, height, obstacles):
+        """
+        Rewrites the cells a removed obstacle (x, y, width, height) touched.
+
+        :param obstacles: The remaining obstacles overlapping those cells (e.g. from a
+                          spatial index query); the others cannot touch them.
+        """
+        rows, cols = self.values.shape
+        r0, r1, c0, c1 = (int(np.clip(edge[0], 0, limit)) for edge, limit in
+                          zip(self._cell_ranges(np.array([[x, y, width, height]], dtype=np.float64)),
+                              (rows, rows, cols, cols)))
+        block = self.values[r0:r1, c0:c1]
+        block[:] = 0
+        rects = np.array([spatial_grid.obstacle_bounds(obs) for obs in obstacles], dtype=np.float64).reshape(-1, 4)
+        for a, b, c, d in zip(*(edge.tolist() for edge in self._cell_ranges(rects))):
+            block[max(a - r0, 0):max(b - r0, 0), max(c - c0, 0):max(d - c0, 0)] = 1
+        self.version += 1
+
+    def add_obstacles(self, obstacles):
+        """Rasterizes 2D ({"rect"}) or Sim3D ({"center", "size"}) obstacle dicts."""
+        self.add_rects([spatial_grid.obstacle_bounds(obs) for obs in obstacles])
+
+    def rect_is_free(self, x, y, width, height):
+        """
+        True when no obstacle touches the rectangle. Parts outside the grid are
+        unknown, so the answer is then False and the caller falls back to exact tests.
+        """
+        cell = self.cell_size
+        x = (x - self.origin[0]) / cell
+        y = (y - self.origin[1]) / cell
+        c0, c1 = math.floor(x), math.floor(x + width / cell) + 1
+        r0, r1 = math.floor(y), math.floor(y + height / cell) + 1
+        rows, cols = self.values.shape
+        if r0 < 0 or c0 < 0 or r1 > rows or c1 > cols:
+            return False
+        return not self.values[r0:r1, c0:c1].any()
+
+    def window(self, row, col, half):
+        """(2 * half + 1)^2 block centered on (row, col), cells outside the grid read as free."""
+        return certainty_grid.window(self.values, row, col, half)
+
+def grid_from_obstacles(obstacles, margin, cell_size=CELL_SIZE):
+    """Occupancy grid covering the obstacles plus margin around them."""
+    bounds = [spatial_grid.obstacle_bounds(obs) for obs in obstacles]
+    if bounds:
+        x0 = min(b[0] for b in bounds) - margin
+        y0 = min(b[1] for b in bounds) - margin
+        x1 = max(b[0] + b[2] for b in bounds) + margin
+        y1 = max(b[1] + b[3] for b in bounds) + margin
+    else:
+        x0, y0, x1, y1 = 0, 0, cell_size, cell_size
+    grid = OccupancyGrid(x0, y0, x1 - x0, y1 - y0, cell_size)
+    grid.add_rects(bounds)
+    return grid
+
+def from_scene(scene, cell_size=CELL_SIZE, margin=0):
+    """
+    Occupancy grid of a scene_file.Scene covering the scene extent and every obstacle,
+    plus margin on all sides. Without a margin the grid starts at (0, 0), so cell
+    (row, col) is scene position (col * cell_size, row * cell_size).
+    """
+    rects = scene.rects()
+    x1 = max(scene.width, float((rects[:, 0] + rects[:, 2]).max(initial=0)))
+    y1 = max(scene.height, float((rects[:, 1] + rects[:, 3]).max(initial=0)))
+    x0 = min(0.0, float(rects[:, 0].min(initial=0))) - margin
+    y0 = min(0.0, float(rects[:, 1].min(initial=0))) - margin
+    grid = OccupancyGrid(x0, y0, x1 + margin - x0, y1 + margin - y0, cell_size)
+    grid.add_rects(rects)
+    return grid
@@ -0,0 +1,64 @@
+import numpy as np
+import pygame
+
+# Batched drawing of the debug overlays (VFH arrows, obstacle vectors).
+# Arrow endpoints are computed with NumPy for all bins at once. All rays leaving the
+# same point are drawn with one pygame.draw.lines call tracing origin -> end -> origin
+# -> end ..., and the dots at their tips are stamped from a pre-drawn sprite with one
+# Surface.blits call, so the number of draw calls does not grow with the bin count.
+
+_tip_sprites = {}
+
+def tip_sprite(color, radius=3):
+    """Color-keyed sprite of a filled circle, the same pixels pygame.draw.circle produces."""
+    key = (tuple(color), radius)
+    sprite = _tip_sprites.get(key)
+    if sprite is None:
+        size = 2 * radius + 1
+        transparent = (0, 0, 0) if tuple(color) != (0, 0, 0) else (255, 255, 255)
+        sprite = pygame.Surface((size, size))
+        sprite.fill(transparent)
+        sprite.set_colorkey(transparent)
+        pygame.draw.circle(sprite, color, (radius, radius), radius)
+        _tip_sprites[key] = sprite
+    return sprite
+
+def ray_ends(origin, angles, lengths):
+    """(N, 2) endpoints of rays leaving origin at angles (radians) with the given lengths."""
+    angles = np.asarray(angles, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.float64)
+    return np.stack((origin[0] + lengths * np.cos(angles), origin[1] + lengths * np.sin(angles)), axis=-1)
+
+def draw_rays(surface, color, origin, ends, width=2, tip_radius=3):
+    """
+    Draws a line from origin to each of the (N, 2) ends with a dot on every end.
+    Returns the rects that were drawn to.
+    """
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+    if len(ends) == 0:
+        return []
+    points = np.empty((2 * len(ends), 2))
+    points[0::2] = origin
+    points[1::2] = ends
+    drawn = [pygame.draw.lines(surface, color, False, points.tolist(), width)]
+
+    # Tip positions are truncated like int() in the per-arrow drawing code
+    tip = tip_sprite(color, tip_radius)
+    corners = ends.astype(np.intp) - tip_radius
+    drawn.extend(surface.blits([(tip, corner) for corner in corners.tolist()]))
+    return drawn
+
+def line_of_sight_ends(robot_center, robot_angle, rects, detection_range, fov_rad):
+    """
+    (N, 2) closest points of the (M, 4) rects that lie within detection_range and
+    within fov_rad / 2 of the heading, the ends of the obstacle vectors.
+    """
+    rx, ry = robot_center
+    x, y, w, h = np.asarray(rects, dtype=np.float64).reshape(-1, 4).T
+    dx = np.maximum(x, np.minimum(rx, x + w)) - rx
+    dy = np.maximum(y, np.minimum(ry, y + h)) - ry
+    distance = np.hypot(dx, dy)
+    global_angle = np.arctan2(dy, dx)
+    angle_diff = (global_angle - robot_angle + np.pi) % (2 * np.pi) - np.pi
+    keep = (distance >= 1) & (distance <= detection_range) & (np.abs(angle_diff) <= fov_rad / 2.0)
+    return ray_ends(robot_center, global_angle[keep], distance[keep])
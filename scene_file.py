@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import struct
+import numpy as np
+
+# Scene files shared by the 2D simulators, Sim3D and the A* notebook.
+# A scene is a table of axis-aligned obstacles on the floor plan (x, y, width, height
+# in pixels / scene units, an optional box height for Sim3D and an RGB color). It is
+# stored either as readable JSON or as a compact binary file: a fixed header followed
+# by the rows of OBSTACLE_DTYPE, which load() memory-maps straight into a NumPy record
+# array, so opening a 50k-obstacle map costs no per-obstacle Python objects. The
+# obstacle dicts the simulators use are only built when asked for (obstacles_2d,
+# obstacles_3d).
+#
+#   python scene_file.py scenes/default.json scenes/default.scene   converts between the two
+
+SCENE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scenes")
+DEFAULT_SCENE = os.path.join(SCENE_DIR, "default.json")
+
+FORMAT_VERSION = 1
+MAGIC = b"WCSCENE\0"
+# magic, format version, obstacle count, scene width, scene height
+HEADER = struct.Struct("<8sIIii")
+OBSTACLE_DTYPE = np.dtype([
+    ("x", "<i4"), ("y", "<i4"), ("w", "<i4"), ("h", "<i4"),
+    ("height", "<f4"),         # box height in Sim3D, 0 for the simulator's default
+    ("color", "u1", (3,)),
+    ("flags", "u1"),           # obstacle_store FLAG_* bits (walls of generated scenes)
+])
+
+class Scene:
+    def __init__(self, records, width=0, height=0, names=None):
+        """
+        :param records: Record array of OBSTACLE_DTYPE (may be a read-only memory map).
+        :param width: Scene extent in X (0 if unknown).
+        :param height: Scene extent in Y / Z (0 if unknown).
+        :param names: Optional per-obstacle labels, kept by the JSON format only.
+        """
+        self.records = records
+        self.width = width
+        self.height = height
+        self.names = names
+
+    def __len__(self):
+        return len(self.records)
+
+    def rects(self):
+        """(M, 4) float64 array of x, y, width, height, as vfh_engine.rects_to_array returns."""
+        rects = np.empty((len(self.records), 4), dtype=np.float64)
+        for i, field in enumerate(("x", "y", "w", "h")):
+            rects[:, i] = self.records[field]
+        return rects
+
+    def obstacles_2d(self):
+        """Obstacle dicts of the 2D simulators: {"rect": pygame.Rect, "color": (r, g, b)}."""
+        import pygame
+        r = self.records
+        return [{"rect": pygame.Rect(x, y, w, h), "color": tuple(color)}
+                for x, y, w, h, color in zip(r["x"].tolist(), r["y"].tolist(), r["w"].tolist(),
+                                             r["h"].tolist(), r["color"].tolist())]
+
+    def obstacles_3d(self, default_height):
+        """
+        Obstacle dicts of Sim3D: boxes standing on the ground with the floor plan
+        x, y mapped to X, Z, {"center": (x, y, z), "size": (w, h, d), "color": (r, g, b)}.
+        """
+        r = self.records
+        heights = np.where(r["height"] > 0, r["height"].astype(np.float64), default_height).tolist()
+        return [{"center": (x + w / 2.0, height / 2.0, y + h / 2.0), "size": (w, height, h), "color": tuple(color)}
+                for x, y, w, h, height, color in zip(r["x"].tolist(), r["y"].tolist(), r["w"].tolist(),
+                                                     r["h"].tolist(), heights, r["color"].tolist())]
+
+    def occupancy_grid(self, cell_size, width=None, height=None):
+        """
+        uint8 grid (rows along y, columns along x) with 1 in every cell an obstacle
+        touches, the map format of the A* notebook. The grid covers the scene extent
+        unless width / height are given. See occupancy_grid.from_scene for the grid
+        object the simulators share.
+        """
+        import occupancy_grid
+        width = width or self.width or int((self.records["x"] + self.records["w"]).max(initial=0))
+        height = height or self.height or int((self.records["y"] + self.records["h"]).max(initial=0))
+        grid = occupancy_grid.OccupancyGrid(0, 0, width, height, cell_size)
+        grid.add_rects(self.rects())
+        return grid.values
+
+def from_obstacles(obstacles, width=0, height=0):
+    """Scene of a list of 2D obstacle dicts ({"rect", "color"}, optionally "height" and "flags")."""
+    records = np.zeros(len(obstacles), dtype=OBSTACLE_DTYPE)
+    for i, obs in enumerate(obstacles):
+        rect = obs["rect"]
+        records[i] = (rect.x, rect.y, rect.width, rect.height, obs.get("height", 0), obs["color"],
+                      obs.get("flags", 0))
+    return Scene(records, width, height)
+
+# -------------------------
+# Reading and writing
+# -------------------------
+def load(path):
+    """Loads a .json scene, or a binary scene (any other extension) memory-mapped."""
+    if path.endswith(".json"):
+        return load_json(path)
+    return load_binary(path)
+
+def save(scene, path):
+    """Writes a scene as JSON (.json) or in the binary format (any other extension)."""
+    if path.endswith(".json"):
+        save_json(scene, path)
+    else:
+        save_binary(scene, path)
+
+def load_binary(path):
+    with open(path, "rb") as f:
+        magic, version, count, width, height = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a scene file")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"{path} has scene format version {version}, expected {FORMAT_VERSION}")
+    if count == 0:
+        records = np.zeros(0, dtype=OBSTACLE_DTYPE)
+    else:
+        records = np.memmap(path, dtype=OBSTACLE_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+    return Scene(records, width, height)
+
+def save_binary(scene, path):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(scene.records), scene.width, scene.height))
+        f.write(np.ascontiguousarray(scene.records, dtype=OBSTACLE_DTYPE).tobytes())
+
+def load_json(path):
+    """
+    JSON scene: {"width": .., "height": .., "obstacles": [{"rect": [x, y, w, h],
+    "color": [r, g, b], "height": h (optional), "flags": f (optional), "name": ".." (optional)}, ...]}
+    """
+    with open(path) as f:
+        data = json.load(f)
+    obstacles = data["obstacles"]
+    records = np.zeros(len(obstacles), dtype=OBSTACLE_DTYPE)
+    for i, obs in enumerate(obstacles):
+        records[i] = (*obs["rect"], obs.get("height", 0), obs["color"], obs.get("flags", 0))
+    names = [obs.get("name") for obs in obstacles]
+    return Scene(records, data.get("width", 0), data.get("height", 0), names)
+
+def save_json(scene, path):
+    obstacles = []
+    for i, row in enumerate(scene.records):
+        obs = {}
+        if scene.names and scene.names[i]:
+            obs["name"] = scene.names[i]
+        obs["rect"] = [int(row["x"]), int(row["y"]), int(row["w"]), int(row["h"])]
+        obs["color"] = row["color"].tolist()
+        if row["height"] > 0:
+            obs["height"] = float(row["height"])
+        if row["flags"]:
+            obs["flags"] = int(row["flags"])
+        obstacles.append(json.dumps(obs))
+    # One obstacle per line keeps big scenes readable and diffable
+    with open(path, "w") as f:
+        f.write('{\n "version": %d,\n "width": %d,\n "height": %d,\n "obstacles": [\n'
+                % (FORMAT_VERSION, scene.width, scene.height))
+        f.write(",\n".join("  " + obs for obs in obstacles))
+        f.write("\n ]\n}\n")
+
+def path_from_args(argv, default=DEFAULT_SCENE):
+    """The file given with --scene <file>, otherwise the default scene."""
+    if "--scene" in argv and argv.index("--scene") + 1 < len(argv):
+        return argv[argv.index("--scene") + 1]
+    return default
+
+def main():
+    if len(sys.argv) != 3:
+        print("Usage: python scene_file.py <input scene> <output scene>")
+        sys.exit(1)
+    scene = load(sys.argv[1])
+    save(scene, sys.argv[2])
+    print(f"{sys.argv[1]} -> {sys.argv[2]}: {len(scene)} obstacles")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import sys
+import math
+import numpy as np
+import scene_file
+from obstacle_store import FLAG_WALL
+
+# Seeded procedural scenes for scale and stress testing.
+# Each generator returns a scene_file.Scene, so a generated map reaches every consumer
+# the hand-made scenes do: obstacles_2d() for the 2D simulators, obstacles_3d() for
+# Sim3D, occupancy_grid() for the A* notebook, rects() for vfh_engine and
+# obstacle_store.from_scene(). The records are built with NumPy in one go, so a
+# million obstacles take a few tenths of a second, and the same seed always gives the
+# same scene.
+#
+#   random     rectangles scattered at a constant density
+#   floorplan  a grid of rooms, every inner wall with one door
+#   clutter    the floor plan with furniture in each room
+#   corridors  a maze of corridors (every cell reachable from every other)
+#
+# Walls carry FLAG_WALL. Obstacles overlapping a disc around the simulators' start
+# position are dropped so the chair never spawns inside one.
+#
+#   python scene_gen.py clutter 100000 scenes/clutter.scene [--seed 3]
+
+KINDS = ("random", "floorplan", "clutter", "corridors")
+SEED = 1
+START_POS = (100, 100)      # start position of the simulators
+CLEAR_RADIUS = 50           # kept free around START_POS (covers the 40 x 60 chair)
+
+OBSTACLE_SPACING = 100      # random: one obstacle per OBSTACLE_SPACING^2 of floor
+ROOM_SIZE = 250             # floorplan / clutter: room pitch
+CORRIDOR_SIZE = 120         # corridors: cell pitch
+WALL = 20                   # wall thickness
+DOOR = 90                   # door width, room for the chair to turn through
+FURNITURE_PER_ROOM = 6
+FURNITURE_MARGIN = 70       # furniture keeps this far from the walls, so a walkway
+                            # along the walls connects all doors of a room
+
+COLOR_WALL = (173, 216, 230)
+COLOR_FURNITURE = (200, 0, 0)
+COLOR_RANDOM = (128, 128, 128)
+
+def _records(x, y, w, h, color, flags=0):
+    records = np.zeros(len(x), dtype=scene_file.OBSTACLE_DTYPE)
+    records["x"] = x
+    records["y"] = y
+    records["w"] = w
+    records["h"] = h
+    records["color"] = color
+    records["flags"] = flags
+    return records
+
+def _scene(parts, width, height, keep_clear=START_POS, clear_radius=CLEAR_RADIUS):
+    records = np.concatenate(parts)
+    if keep_clear is not None and len(records):
+        cx, cy = keep_clear
+        x, y = records["x"], records["y"]
+        dx = np.clip(cx, x, x + records["w"]) - cx
+        dy = np.clip(cy, y, y + records["h"]) - cy
+        records = records[dx * dx + dy * dy > clear_radius * clear_radius]
+    return scene_file.Scene(records, int(width), int(height))
+
+# -------------------------
+# Generators
+# -------------------------
+def random_rects(count, seed=SEED, spacing=OBSTACLE_SPACING, keep_clear=START_POS):
+    """
+    count rectangles of 10 to 60 pixels a side, scattered over a square world of
+    sqrt(count) * spacing pixels.
+    """
+    rng = np.random.default_rng(seed)
+    side = max(int(math.sqrt(count) * spacing), 2 * spacing)
+    w = rng.integers(10, 61, count)
+    h = rng.integers(10, 61, count)
+    x = rng.integers(0, side - w)
+    y = rng.integers(0, side - h)
+    return _scene([_records(x, y, w, h, COLOR_RANDOM)], side, side, keep_clear)
+
+def _wall_segments(lines, cells, pitch, rng, vertical, wall=WALL, door=DOOR):
+    """
+    Walls along `lines` grid lines, each made of `cells` segments of one pitch.
+    The outer lines are solid; every segment of an inner line gets one door at a
+    random offset.
+    """
+    line, cell = np.meshgrid(np.arange(lines), np.arange(cells), indexing="ij")
+    line = line.ravel()
+    cell = cell.ravel()
+    start = cell * pitch
+    end = start + pitch + wall      # overlap the crossing walls, no gaps at corners
+    inner = (line > 0) & (line < lines - 1)
+    offset = start + rng.integers(wall, pitch - door + 1, len(start))
+    piece_start = np.concatenate((start, offset[inner] + door))
+    piece_end = np.concatenate((np.where(inner, offset, end), end[inner]))
+    across = np.concatenate((line, line[inner])) * pitch
+    length = piece_end - piece_start
+    if vertical:
+        return _records(across, piece_start, wall, length, COLOR_WALL, FLAG_WALL)
+    return _records(piece_start, across, length, wall, COLOR_WALL, FLAG_WALL)
+
+def floor_plan(rooms_x, rooms_y, seed=SEED, room_size=ROOM_SIZE, keep_clear=START_POS):
+    """rooms_x x rooms_y rooms of room_size, connected by doors in every inner wall."""
+    rng = np.random.default_rng(seed)
+    return _scene(_floor_plan_walls(rooms_x, rooms_y, rng, room_size),
+                  rooms_x * room_size + WALL, rooms_y * room_size + WALL, keep_clear)
+
+def _floor_plan_walls(rooms_x, rooms_y, rng, room_size):
+    return [_wall_segments(rooms_y + 1, rooms_x, room_size, rng, vertical=False),
+            _wall_segments(rooms_x + 1, rooms_y, room_size, rng, vertical=True)]
+
+def clutter(rooms_x, rooms_y, seed=SEED, per_room=FURNITURE_PER_ROOM, room_size=ROOM_SIZE,
+            keep_clear=START_POS):
+    """
+    The floor plan with per_room pieces of furniture in every room. Furniture stays
+    FURNITURE_MARGIN away from the walls, so each room's doors remain connected.
+    """
+    rng = np.random.default_rng(seed)
+    parts = _floor_plan_walls(rooms_x, rooms_y, rng, room_size)
+    rooms = rooms_x * rooms_y
+    room = np.repeat(np.arange(rooms), per_room)
+    free = room_size - WALL - 2 * FURNITURE_MARGIN
+    w = rng.integers(15, free // 2 + 1, len(room))
+    h = rng.integers(15, free // 2 + 1, len(room))
+    x = (room % rooms_x) * room_size + WALL + FURNITURE_MARGIN + rng.integers(0, free - w + 1)
+    y = (room // rooms_x) * room_size + WALL + FURNITURE_MARGIN + rng.integers(0, free - h + 1)
+    parts.append(_records(x, y, w, h, COLOR_FURNITURE))
+    return _scene(parts, rooms_x * room_size + WALL, rooms_y * room_size + WALL, keep_clear)
+
+def corridors(cols, rows, seed=SEED, cell_size=CORRIDOR_SIZE, keep_clear=START_POS):
+    """
+    A cols x rows maze of corridors one cell wide. Every cell opens to its east or
+    south neighbour at random (a binary tree maze), which connects all cells.
+    """
+    rng = np.random.default_rng(seed)
+    r, c = np.meshgrid(np.arange(rows), np.arange(cols), indexing="ij")
+    r = r.ravel()
+    c = c.ravel()
+    open_east = rng.random(len(r)) < 0.5
+    open_east[r == rows - 1] = True     # bottom row can only go east
+    open_east[c == cols - 1] = False    # right column can only go south
+    east = (c < cols - 1) & ~open_east
+    south = (r < rows - 1) & open_east
+    width = cols * cell_size + WALL
+    height = rows * cell_size + WALL
+    parts = [
+        _records((c[east] + 1) * cell_size, r[east] * cell_size, WALL, cell_size + WALL, COLOR_WALL, FLAG_WALL),
+        _records(c[south] * cell_size, (r[south] + 1) * cell_size, cell_size + WALL, WALL, COLOR_WALL, FLAG_WALL),
+        # Outer walls
+        _records([0, 0, 0, width - WALL], [0, height - WALL, 0, 0], [width, width, WALL, WALL],
+                 [WALL, WALL, height, height], COLOR_WALL, FLAG_WALL),
+    ]
+    return _scene(parts, width, height, keep_clear)
+
+def generate(kind, count, seed=SEED):
+    """
+    Scene of about count obstacles of the given kind (see KINDS), laid out on a
+    square grid of rooms or cells.
+    """
+    if kind == "random":
+        return random_rects(count, seed)
+    if kind == "floorplan":
+        side = max(1, round(math.sqrt(count / 4.0)))    # about 4 wall pieces per room
+        return floor_plan(side, side, seed)
+    if kind == "clutter":
+        side = max(1, round(math.sqrt(count / (4.0 + FURNITURE_PER_ROOM))))
+        return clutter(side, side, seed)
+    if kind == "corridors":
+        side = max(2, round(math.sqrt(count)))          # about one wall per cell
+        return corridors(side, side, seed)
+    raise ValueError(f"unknown scene kind {kind!r}, expected one of {', '.join(KINDS)}")
+
+def main():
+    args = sys.argv[1:]
+    seed = SEED
+    if "--seed" in args and args.index("--seed") + 1 < len(args):
+        i = args.index("--seed")
+        seed = int(args[i + 1])
+        del args[i:i + 2]
+    if len(args) != 3:
+        print(f"Usage: python scene_gen.py <{'|'.join(KINDS)}> <obstacle count> <output scene> [--seed N]")
+        sys.exit(1)
+    kind, count, path = args[0], int(args[1]), args[2]
+    scene = generate(kind, count, seed)
+    scene_file.save(scene, path)
+    print(f"{path}: {kind}, {len(scene)} obstacles, {scene.width} x {scene.height}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+import sys
+import csv
+import math
+import time
+import numpy as np
+import vfh_engine
+import spatial_grid
+import swept_collision
+import distance_field
+import certainty_grid
+import occupancy_grid
+import vfh_cache
+import scene_file
+import world_tiles
+
+# Display-free core of the 2D wheelchair simulation (2D_collision_wXbox.py).
+# step() advances the motion model, VFH steering, soft collision avoidance and
+# collision reset by one timestep. run() drives step() from scripted or recorded
+# input streams as fast as the CPU allows, so scenarios can be evaluated in CI.
+
+# Wheelchair parameters
+WHEELCHAIR_WIDTH = 40
+WHEELCHAIR_HEIGHT = 60
+START_POS = (100, 100)
+START_ANGLE = 0  # in radians
+
+# Movement scales
+SPEED_SCALE = 200       # pixels per second for forward/backward motion
+TURNING_SCALE = 2.0     # radians per second for main turning input
+FINE_TURN_SCALE = 0.5   # additional radians per second from fine-tune keys (z and x)
+
+# Vector Field Histogram
+N_BINS = 36
+BIN_SIZE = 360 / N_BINS
+DETECTION_RANGE = 200
+
+# Additional parameters for line of sight & collision avoidance
+FOV_DEG = 270  # total field-of-view in degrees for "line of sight"
+FOV_RAD = math.radians(FOV_DEG)
+SOFT_COLLISION_DIST = 80  # distance threshold below which we apply a "push away"
+
+# VFH+ steering
+VFH_CLEARANCE = WHEELCHAIR_HEIGHT / 2 + 5  # half the chair's extent across its heading plus a safety margin
+# Farthest obstacle the enlarged VFH+ histogram can see; the range of the queries and
+# distance fields feeding step()
+VFH_REACH = vfh_engine.enlarged_reach(DETECTION_RANGE, VFH_CLEARANCE)
+WIDE_VALLEY_BINS = int(80 // BIN_SIZE)     # free valleys wider than 80 degrees count as wide
+
+# Tuning parameters used by step(); override any of them by passing a params dict
+DEFAULT_PARAMS = {
+    "threshold": 0.5,            # steering density above which a sector is blocked
+    "threshold_low": 0.3,        # steering density below which a blocked sector is free again
+    "forward_threshold": 0.5,    # VFH density ahead above which we slow down
+    "soft_collision_dist": SOFT_COLLISION_DIST,
+}
+
+class WheelchairState:
+    def __init__(self, pos_x=START_POS[0], pos_y=START_POS[1], angle=START_ANGLE, steering=None):
+        """
+        Pose of a single wheelchair plus simple run statistics.
+
+        :param steering: Optional vfh_engine.VFHPlus, for simulators with their own histogram
+                         layout; defaults to one for N_BINS and DEFAULT_PARAMS.
+        """
+        self.pos_x = pos_x
+        self.pos_y = pos_y
+        self.angle = angle
+        self.time = 0.0
+        self.steps = 0
+        self.collisions = 0
+        if steering is None:
+            steering = vfh_engine.VFHPlus(N_BINS, DEFAULT_PARAMS["threshold_low"], DEFAULT_PARAMS["threshold"],
+                                          WIDE_VALLEY_BINS)
+        self.steering = steering
+
+    def reset(self):
+        """Moves the wheelchair back to the start pose (used after a collision)."""
+        self.pos_x, self.pos_y = START_POS
+        self.angle = START_ANGLE
+        self.steering.reset()
+
+def compute_vfh(pos_x, pos_y, obstacles, n_bins=N_BINS, detection_range=DETECTION_RANGE):
+    """
+    Vector Field Histogram using closest point on each obstacle.
+    For obstacles within detection_range, weight = (detection_range - distance) / detection_range.
+    obstacles may be the list of obstacle dicts or an array from vfh_engine.rects_to_array.
+    """
+    return vfh_engine.compute_vfh_closest(pos_x, pos_y, obstacles, n_bins, detection_range)
+
+def _nearest_ahead(pos_x, pos_y, effective_heading, rects):
+    """
+    Vectorized obstacle selection of apply_soft_collision_avoidance over an (M, 4) rects
+    array: (distance, angle difference) of the closest obstacle ahead, or (None, 0).
+    """
+    x, y, w, h = rects.T
+    dx = np.maximum(x, np.minimum(pos_x, x + w)) - pos_x
+    dy = np.maximum(y, np.minimum(pos_y, y + h)) - pos_y
+    distance = np.sqrt(dx * dx + dy * dy)
+    angle_diff = (np.arctan2(dy, dx) - effective_heading + math.pi) % (2 * math.pi) - math.pi
+    dot = dx * math.cos(effective_heading) + dy * math.sin(effective_heading)
+    ahead = (distance >= 1) & (distance <= DETECTION_RANGE) & (np.abs(angle_diff) <= FOV_RAD / 2.0) & (dot >= 0)
+    if not ahead.any():
+        return None, 0
+    nearest = np.flatnonzero(ahead)[np.argmin(distance[ahead])]
+    return float(distance[nearest]), float(angle_diff[nearest])
+
+def field_nearest_ahead(field, pos_x, pos_y, effective_heading, fov=FOV_RAD):
+    """
+    (distance, angle difference) of the nearest obstacle as looked up in a
+    distance_field.DistanceField, when that obstacle lies ahead within fov (it is then
+    also the nearest one ahead). None when the obstacles have to be searched instead:
+    the nearest one is behind or to the side, touching, or beyond the field's range.
+    The distance is approximate to within field.error.
+    """
+    nearest = field.nearest(pos_x, pos_y)
+    if nearest is None:
+        return None
+    distance, direction = nearest
+    angle_diff = (direction - effective_heading + math.pi) % (2 * math.pi) - math.pi
+    if distance < 1 or abs(angle_diff) > fov / 2.0 or math.cos(angle_diff) < 0:
+        return None
+    return distance, angle_diff
+
+def apply_soft_collision_avoidance(pos_x, pos_y, angle, forward_speed, turning_input, obstacles,
+                                   soft_collision_dist=SOFT_COLLISION_DIST, field=None):
+    """
+    Apply soft collision avoidance only if an obstacle directly in the path
+    (based on the effective heading) is too close.
+    With a distance_field.DistanceField the common case of nothing within
+    soft_collision_dist is answered by a single lookup, and the nearest obstacle by a
+    second one whenever it lies ahead (see field_nearest_ahead); only otherwise are the
+    obstacles searched.
+    obstacles may also be an (M, 4) rects array (e.g. ObstacleStore.rects()), which is
+    evaluated for all obstacles at once.
+    """
+    if field is not None and field.is_clear(pos_x, pos_y, soft_collision_dist):
+        return forward_speed, turning_input
+
+    if forward_speed >= 0:
+        effective_heading = angle
+    else:
+        effective_heading = (angle + math.pi) % (2 * math.pi)
+
+    ahead = field_nearest_ahead(field, pos_x, pos_y, effective_heading) if field is not None else None
+    if ahead is not None:
+        min_dist, best_angle_diff = ahead
+    elif isinstance(obstacles, np.ndarray):
+        min_dist, best_angle_diff = _nearest_ahead(pos_x, pos_y, effective_heading, obstacles)
+    else:
+        min_dist = None
+        best_angle_diff = 0
+        for obs in obstacles:
+            rect = obs["rect"]
+            # Find the closest point on the rectangle
+            closest_x = max(rect.x, min(pos_x, rect.x + rect.width))
+            closest_y = max(rect.y, min(pos_y, rect.y + rect.height))
+
+            dx = closest_x - pos_x
+            dy = closest_y - pos_y
+            distance = math.sqrt(dx*dx + dy*dy)
+            if distance < 1 or distance > DETECTION_RANGE:
+                continue
+
+            global_angle = math.atan2(dy, dx)
+            angle_diff = (global_angle - effective_heading + math.pi) % (2*math.pi) - math.pi
+
+            # Only consider obstacles in the forward direction within the FOV
+            if abs(angle_diff) > FOV_RAD / 2.0:
+                continue
+
+            # Ensure it's "in front" relative to effective heading
+            eff_vec = (math.cos(effective_heading), math.sin(effective_heading))
+            dot = dx * eff_vec[0] + dy * eff_vec[1]
+            if dot < 0:
+                continue
+
+            if min_dist is None or distance < min_dist:
+                min_dist = distance
+                best_angle_diff = angle_diff
+
+    if min_dist is not None and min_dist < soft_collision_dist:
+        scale = min_dist / soft_collision_dist
+        forward_speed *= scale
+        turning_input -= TURNING_SCALE * best_angle_diff
+    return forward_speed, turning_input
+
+def make_vfh_cache(obstacle_grid, scene, field=None, quantum=vfh_cache.POSE_QUANTUM):
+    """
+    VFHCache of the histograms step() needs, for the obstacles in obstacle_grid.
+
+    :param scene: vfh_cache.SceneVersion bumped whenever the obstacles change.
+    """
+    return vfh_cache.perception_cache(scene, obstacle_grid, compute_vfh, N_BINS, DETECTION_RANGE, VFH_CLEARANCE,
+                                      field, quantum)
+
+def step(state, inputs, dt, obstacle_grid, params=None, field=None, vfh_window=None, cache=None, profiler=None,
+         occupancy=None):
+    """
+    Advances the wheelchair by one timestep without touching the display.
+
+    :param state: WheelchairState, updated in place.
+    :param inputs: (forward_speed, turning_input) as produced by the input devices.
+    :param dt: Timestep in seconds.
+    :param obstacle_grid: spatial_grid.SpatialGrid holding the scene obstacles.
+    :param params: Optional dict overriding DEFAULT_PARAMS.
+    :param field: Optional distance_field.DistanceField of the same obstacles, built with a
+                  max_distance of at least VFH_REACH.
+    :param vfh_window: Optional certainty_grid.ActiveWindow built with a clearance; when given the
+                       histograms come from the certainty grid instead of the obstacle geometry.
+    :param cache: Optional VFHCache from make_vfh_cache; histograms are then computed at the
+                  quantized position and reused while the chair stays within one quantum.
+    :param profiler: Optional frame_profiler.FrameProfiler; the vfh, avoidance and collision
+                     stages are charged to it.
+    :param occupancy: Optional occupancy_grid.OccupancyGrid of the same obstacles; steps whose
+                      swept area covers only free cells skip the exact collision test.
+    :return: (vfh, collided) so observers can draw the histogram and react to resets.
+    """
+    if params is None:
+        params = DEFAULT_PARAMS
+    else:
+        params = dict(DEFAULT_PARAMS, **params)
+    forward_speed, turning_input = inputs
+    pos_x, pos_y, angle = state.pos_x, state.pos_y, state.angle
+
+    # 1) VFH lane-keep (only obstacles within VFH_REACH can contribute; the closest-point
+    # histogram and soft avoidance skip those beyond DETECTION_RANGE themselves)
+    if field is not None and field.is_clear(pos_x, pos_y, VFH_REACH):
+        nearby = []
+    else:
+        nearby = obstacle_grid.query_radius(pos_x, pos_y, VFH_REACH)
+    if vfh_window is not None:
+        vfh = vfh_window.histogram(pos_x, pos_y)
+        steering_vfh = vfh_window.steering_histogram(pos_x, pos_y)
+    else:
+        if cache is not None:
+            vfh, enlarged = cache.get(pos_x, pos_y)
+        else:
+            nearby_rects = vfh_engine.rects_to_array(nearby)
+            vfh = compute_vfh(pos_x, pos_y, nearby_rects)
+            enlarged = vfh_engine.enlarged_histogram(pos_x, pos_y, nearby_rects, N_BINS, DETECTION_RANGE,
+                                                     VFH_CLEARANCE)
+        steering_vfh = vfh_engine.smooth_histogram(enlarged)
+    current_heading_deg = (math.degrees(angle) + 360) % 360
+    current_bin = int(current_heading_deg // BIN_SIZE)
+    density_ahead = vfh[current_bin]
+
+    # VFH+ picks a free valley once the sector ahead is blocked
+    vfh_turn_adjustment = 0
+    best_bin = state.steering.steer(steering_vfh, current_bin, params["threshold_low"], params["threshold"])
+    if best_bin is not None:
+        desired_heading = math.radians(best_bin * BIN_SIZE + BIN_SIZE/2)
+        angle_diff = (desired_heading - angle + math.pi) % (2*math.pi) - math.pi
+        vfh_turn_adjustment = TURNING_SCALE * angle_diff
+
+    forward_threshold = params["forward_threshold"]
+    forward_scaling = 1.0
+    if density_ahead > forward_threshold:
+        forward_scaling = max(0, 1 - (density_ahead - forward_threshold) / (1 - forward_threshold))
+    forward_speed *= forward_scaling
+
+    turning_input += vfh_turn_adjustment
+    if profiler is not None:
+        profiler.lap("vfh")
+
+    # 2) Soft collision avoidance
+    forward_speed, turning_input = apply_soft_collision_avoidance(
+        pos_x, pos_y, angle, forward_speed, turning_input, nearby, params["soft_collision_dist"], field
+    )
+    if profiler is not None:
+        profiler.lap("avoidance")
+
+    # 3) Update the angle and position
+    start_pose = (pos_x, pos_y, angle)
+    angle += turning_input * dt
+    pos_x += forward_speed * math.cos(angle) * dt
+    pos_y += forward_speed * math.sin(angle) * dt
+    state.pos_x, state.pos_y, state.angle = pos_x, pos_y, angle
+    state.time += dt
+    state.steps += 1
+
+    # 4) Swept collision detection of the rotated footprint over the whole step
+    # (the box first_impact searches, so a free box means it would find nothing)
+    reach = math.hypot(WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT) / 2
+    if occupancy is not None and occupancy.rect_is_free(
+            min(start_pose[0], pos_x) - reach, min(start_pose[1], pos_y) - reach,
+            abs(pos_x - start_pose[0]) + 2 * reach, abs(pos_y - start_pose[1]) + 2 * reach):
+        impact = None
+    else:
+        impact = swept_collision.first_impact(start_pose, (pos_x, pos_y, angle),
+                                              WHEELCHAIR_WIDTH, WHEELCHAIR_HEIGHT, obstacle_grid)
+    collided = impact is not None
+    if collided:
+        state.collisions += 1
+        state.reset()
+    if profiler is not None:
+        profiler.lap("collision")
+    return vfh, collided
+
+# -------------------------
+# Input streams
+# -------------------------
+def scripted_inputs(segments, dt=1/60):
+    """
+    Expands a driving script into per-step inputs.
+
+    :param segments: Iterable of (duration_seconds, forward_speed, turning_input).
+    :param dt: Timestep of the generated frames.
+    :return: Generator of (dt, forward_speed, turning_input).
+    """
+    for duration, forward_speed, turning_input in segments:
+        for _ in range(max(1, round(duration / dt))):
+            yield dt, forward_speed, turning_input
+
+def load_input_log(path):
+    """Reads a recorded input stream (CSV with dt, forward_speed, turning_input columns)."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield float(row["dt"]), float(row["forward_speed"]), float(row["turning_input"])
+
+class InputRecorder:
+    def __init__(self, path):
+        """
+        Writes the inputs of an interactive session to a CSV file readable by load_input_log.
+        """
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["dt", "forward_speed", "turning_input"])
+
+    def record(self, dt, forward_speed, turning_input):
+        self.writer.writerow([dt, forward_speed, turning_input])
+
+    def close(self):
+        self.file.close()
+
+# -------------------------
+# Headless runner
+# -------------------------
+def run(input_stream, obstacles, state=None, params=None, observer=None, field=None, vfh_window=None,
+        cache=None, occupancy=None):
+    """
+    Steps the simulation over an input stream as fast as possible.
+
+    :param input_stream: Iterable of (dt, forward_speed, turning_input).
+    :param obstacles: List of obstacle dicts, or a prebuilt SpatialGrid or world_tiles.World.
+    :param state: Optional starting WheelchairState.
+    :param params: Optional dict overriding DEFAULT_PARAMS.
+    :param observer: Optional callable(state, inputs, vfh, collided) run after every step,
+                     e.g. to render frames.
+    :param field: Optional DistanceField; built automatically when obstacles is a list.
+    :param vfh_window: Optional certainty_grid.ActiveWindow to use the certainty-grid VFH.
+    :param cache: Optional VFHCache from make_vfh_cache.
+    :param occupancy: Optional occupancy_grid.OccupancyGrid of the obstacles.
+    :return: The final WheelchairState.
+    """
+    if isinstance(obstacles, list):
+        obstacle_grid = spatial_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)
+        if field is None:
+            field = distance_field.DistanceField(obstacles, VFH_REACH)
+    else:
+        obstacle_grid = obstacles
+    if state is None:
+        state = WheelchairState()
+    for dt, forward_speed, turning_input in input_stream:
+        inputs = (forward_speed, turning_input)
+        vfh, collided = step(state, inputs, dt, obstacle_grid, params, field, vfh_window, cache,
+                             occupancy=occupancy)
+        if observer is not None:
+            observer(state, inputs, vfh, collided)
+    return state
+
+def default_obstacles(path=None):
+    """
+    The obstacle layout of the 2D simulators (without user-added obstacles), read from
+    scene_file.DEFAULT_SCENE or the given scene file.
+    """
+    return scene_file.load(path or scene_file.DEFAULT_SCENE).obstacles_2d()
+
+def run_world(input_stream, world, params=None):
+    """
+    run() on a world_tiles.World, streaming its tiles around the chair. Each step
+    waits for the tiles it needs, so replays do not depend on disk speed.
+    """
+    state = WheelchairState()
+    def follow(state, inputs, vfh, collided):
+        world.update(state.pos_x, state.pos_y, state.angle, block=True)
+    follow(state, None, None, False)
+    return run(input_stream, world, state, params, observer=follow, field=world, occupancy=world)
+
+def main():
+    # --certainty-grid switches the replay to the classic certainty-grid VFH,
+    # --world <folder> drives through a tiled world (see world_tiles.py) instead of the scene
+    args = sys.argv[1:]
+    world_dir = None
+    if "--world" in args and args.index("--world") + 1 < len(args):
+        i = args.index("--world")
+        world_dir = args[i + 1]
+        del args[i:i + 2]
+    paths = [arg for arg in args if arg != "--certainty-grid"]
+    if not paths:
+        print("Usage: python sim_core.py [--certainty-grid | --world <folder>] <input_log.csv> [more logs...]")
+        sys.exit(1)
+    if world_dir:
+        world = world_tiles.World(world_dir, VFH_REACH)
+        for path in paths:
+            start = time.perf_counter()
+            state = run_world(load_input_log(path), world)
+            elapsed = time.perf_counter() - start
+            print(f"{path}: {state.steps} steps in {elapsed:.3f}s, {state.collisions} collisions, "
+                  f"final pose ({state.pos_x:.1f}, {state.pos_y:.1f}, {state.angle:.3f}), tiles {world.stats()}")
+        world.close()
+        return
+    obstacles = default_obstacles()
+    obstacle_grid = spatial_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)
+    field = distance_field.DistanceField(obstacles, VFH_REACH)
+    # One occupancy grid serves the collision early-out and the certainty-grid VFH
+    occupancy = occupancy_grid.grid_from_obstacles(obstacles, DETECTION_RANGE)
+    vfh_window = None
+    if "--certainty-grid" in sys.argv:
+        vfh_window = certainty_grid.ActiveWindow(occupancy, N_BINS, DETECTION_RANGE, VFH_CLEARANCE)
+    for path in paths:
+        start = time.perf_counter()
+        state = run(load_input_log(path), obstacle_grid, field=field, vfh_window=vfh_window, occupancy=occupancy)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {state.steps} steps, {state.time:.2f}s simulated in {elapsed:.3f}s, "
+              f"{state.collisions} collisions, final pose ({state.pos_x:.1f}, {state.pos_y:.1f}, {state.angle:.3f})")
+
+if __name__ == "__main__":
+    main()
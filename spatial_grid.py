@@ -0,0 +1,111 @@
+import math
+
+# Uniform grid (spatial hash) over obstacle bounding boxes.
+# With a cell size close to DETECTION_RANGE a radius query only visits the 3x3
+# block of cells around the wheelchair, so the cost depends on the local
+# neighbourhood instead of the total number of obstacles in the scene.
+
+def obstacle_bounds(obs):
+    """
+    Returns the (x, y, width, height) footprint of an obstacle on the ground plane.
+    Works for the 2D obstacle dicts ({"rect": pygame.Rect}) and for the Sim3D
+    dicts ({"center": (x, y, z), "size": (w, h, d)}), where y is the Z axis.
+    """
+    if "rect" in obs:
+        r = obs["rect"]
+        return (r.x, r.y, r.width, r.height)
+    cx, cy, cz = obs["center"]
+    w, h, d = obs["size"]
+    return (cx - w / 2.0, cz - d / 2.0, w, d)
+
+class SpatialGrid:
+    def __init__(self, cell_size):
+        """
+        :param cell_size: Side length of a grid cell, usually DETECTION_RANGE.
+        """
+        self.cell_size = cell_size
+        self.cells = {}       # (cell_x, cell_y) -> list of item ids
+        self.items = {}       # item id -> (obstacle, bounds)
+        self.ids = {}         # id(obstacle) -> item id
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def _cell_range(self, x, y, width, height):
+        size = self.cell_size
+        return (int(math.floor(x / size)), int(math.floor((x + width) / size)),
+                int(math.floor(y / size)), int(math.floor((y + height) / size)))
+
+    def insert(self, obs):
+        """Adds an obstacle to every cell its bounding box touches and returns its item id."""
+        bounds = obstacle_bounds(obs)
+        item_id = self.next_id
+        self.next_id += 1
+        self.items[item_id] = (obs, bounds)
+        self.ids[id(obs)] = item_id
+        x0, x1, y0, y1 = self._cell_range(*bounds)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), []).append(item_id)
+        return item_id
+
+    def remove(self, obs):
+        """Removes a previously inserted obstacle. Unknown obstacles are ignored."""
+        item_id = self.ids.pop(id(obs), None)
+        if item_id is None:
+            return
+        _, bounds = self.items.pop(item_id)
+        x0, x1, y0, y1 = self._cell_range(*bounds)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is None:
+                    continue
+                cell.remove(item_id)
+                if not cell:
+                    del self.cells[(cx, cy)]
+
+    def _candidates(self, x, y, width, height):
+        x0, x1, y0, y1 = self._cell_range(x, y, width, height)
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    found.update(cell)
+        # Insertion order keeps results identical to a linear scan of the obstacle list
+        return sorted(found)
+
+    def query_rect(self, x, y, width, height):
+        """
+        Returns the obstacles whose bounding box overlaps the given rectangle,
+        using the same strict overlap test as pygame.Rect.colliderect.
+        """
+        result = []
+        for item_id in self._candidates(x, y, width, height):
+            obs, (bx, by, bw, bh) = self.items[item_id]
+            if x < bx + bw and bx < x + width and y < by + bh and by < y + height:
+                result.append(obs)
+        return result
+
+    def query_radius(self, x, y, radius):
+        """
+        Returns the obstacles whose closest point lies within radius of (x, y).
+        """
+        result = []
+        radius_sq = radius * radius
+        for item_id in self._candidates(x - radius, y - radius, 2 * radius, 2 * radius):
+            obs, (bx, by, bw, bh) = self.items[item_id]
+            dx = max(bx, min(x, bx + bw)) - x
+            dy = max(by, min(y, by + bh)) - y
+            if dx * dx + dy * dy <= radius_sq:
+                result.append(obs)
+        return result
+
+def grid_from_obstacles(obstacles, cell_size):
+    """Builds a SpatialGrid holding every obstacle in the list."""
+    grid = SpatialGrid(cell_size)
+    for obs in obstacles:
+        grid.insert(obs)
+    return grid
@@ -0,0 +1,55 @@
+import math
+from collections import OrderedDict
+import pygame
+
+# Cache of pre-rotated sprites for the 2D simulators.
+# pygame.transform.rotate allocates a new surface on every call. Headings are instead
+# snapped to a fixed angular resolution and each rotation is made once, lazily or all
+# up front, so drawing a chair (or many chairs) only blits an existing surface.
+
+ANGLE_RESOLUTION_DEG = 1.0
+MAX_SPRITES = 360
+
+class RotatedSpriteCache:
+    def __init__(self, surface, resolution_deg=ANGLE_RESOLUTION_DEG, max_entries=MAX_SPRITES):
+        """
+        :param surface: Unrotated sprite, facing angle 0 (along +x).
+        :param resolution_deg: Angular step the headings are snapped to.
+        :param max_entries: Rotations kept; the least recently used one is dropped first.
+        """
+        self.surface = surface
+        self.resolution = resolution_deg
+        self.steps = max(1, int(round(360.0 / resolution_deg)))
+        self.max_entries = max_entries
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def prerender(self):
+        """Rotates every step up front (as many as max_entries allows) so the first lap does not stutter."""
+        for step in range(min(self.steps, self.max_entries)):
+            self._sprite(step)
+
+    def get(self, angle):
+        """Sprite rotated to angle (radians, same convention as the chair heading)."""
+        step = int(round(math.degrees(angle) / self.resolution)) % self.steps
+        return self._sprite(step)
+
+    def blit(self, target, angle, center):
+        """Draws the rotated sprite centered on center and returns the touched rect."""
+        sprite = self.get(angle)
+        return target.blit(sprite, sprite.get_rect(center=center).topleft)
+
+    def _sprite(self, step):
+        sprite = self.sprites.get(step)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(step)
+            return sprite
+        self.misses += 1
+        # pygame rotates counterclockwise while the y axis points down, hence the minus
+        sprite = pygame.transform.rotate(self.surface, -step * self.resolution)
+        self.sprites[step] = sprite
+        if len(self.sprites) > self.max_entries:
+            self.sprites.popitem(last=False)
+        return sprite
@@ -0,0 +1,135 @@
+import numpy as np
+import vfh_engine
+
+# Cache for VFH histograms keyed on the quantized chair position and the scene version.
+# A histogram only depends on where the chair is and on the obstacles, so while the
+# chair stands still or creeps within one quantum the previous result is returned
+# as is. When obstacles were only added since an entry was computed, the entry is
+# patched with the histogram of the new obstacles instead of being rebuilt.
+
+POSE_QUANTUM = 1.0   # histograms are computed at positions snapped to this grid (scene units)
+MAX_ENTRIES = 64
+
+class SceneVersion:
+    def __init__(self):
+        """
+        Version counter of the obstacle set. Bump it through added() or changed()
+        whenever obstacles are edited so caches know their entries are stale.
+        """
+        self.version = 0
+        self.rebuilt_at = 0     # last version that could not be expressed as additions
+        self.additions = []     # (version, obstacles) since rebuilt_at
+
+    def added(self, obstacles):
+        """Records obstacles that were appended to the scene."""
+        self.version += 1
+        self.additions.append((self.version, list(obstacles)))
+
+    def changed(self):
+        """Records any other edit (removal, move, resize); cached entries are rebuilt."""
+        self.version += 1
+        self.rebuilt_at = self.version
+        self.additions = []
+
+    def added_since(self, version):
+        """Obstacles added after version, or None when an entry from version cannot be patched."""
+        if version < self.rebuilt_at:
+            return None
+        added = []
+        for added_version, obstacles in self.additions:
+            if added_version > version:
+                added.extend(obstacles)
+        return added
+
+class VFHCache:
+    def __init__(self, scene, compute, query, combine=np.add, quantum=POSE_QUANTUM, max_entries=MAX_ENTRIES):
+        """
+        :param scene: SceneVersion of the obstacles the histograms are built from.
+        :param compute: callable(pos_x, pos_y, rects) -> histogram, or a tuple of histograms.
+        :param query: callable(pos_x, pos_y) -> (M, 4) rects near the position, used on a miss.
+        :param combine: How the histogram of added obstacles is merged into a cached one:
+                        np.add for summed histograms, np.maximum for VFH+ enlarged ones, or a
+                        tuple of such functions when compute returns a tuple.
+        :param quantum: Position quantization; 0 keys on the exact position.
+        """
+        self.scene = scene
+        self.compute = compute
+        self.query = query
+        self.combine = combine
+        self.quantum = quantum
+        self.max_entries = max_entries
+        self.entries = {}
+        self.hits = 0
+        self.patches = 0
+        self.misses = 0
+
+    def get(self, pos_x, pos_y):
+        """Histogram(s) at the quantized position, reused, patched or recomputed."""
+        if self.quantum:
+            key = (round(pos_x / self.quantum), round(pos_y / self.quantum))
+            pos_x, pos_y = key[0] * self.quantum, key[1] * self.quantum
+        else:
+            key = (pos_x, pos_y)
+        version = self.scene.version
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry_version, value = entry
+            if entry_version == version:
+                self.hits += 1
+                return value
+            added = self.scene.added_since(entry_version)
+            if added is not None:
+                self.patches += 1
+                if added:
+                    value = self._merge(value, self.compute(pos_x, pos_y, vfh_engine.rects_to_array(added)))
+                self.entries[key] = (version, value)
+                return value
+
+        self.misses += 1
+        value = self.compute(pos_x, pos_y, self.query(pos_x, pos_y))
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            # Oldest entry first (dicts keep insertion order)
+            del self.entries[next(iter(self.entries))]
+        self.entries[key] = (version, value)
+        return value
+
+    def _merge(self, value, patch):
+        if isinstance(value, tuple):
+            return tuple(combine(old, new) for combine, old, new in zip(self.combine, value, patch))
+        return self.combine(value, patch)
+
+    def stats(self):
+        """Hit/patch/miss counters and the share of lookups that avoided a full rebuild."""
+        lookups = self.hits + self.patches + self.misses
+        return {
+            "hits": self.hits,
+            "patches": self.patches,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.patches) / lookups if lookups else 0.0,
+        }
+
+def perception_cache(scene, obstacle_grid, compute_vfh, n_bins, detection_range, clearance, field=None,
+                     quantum=POSE_QUANTUM):
+    """
+    VFHCache of the two histograms the simulators need every step: compute_vfh's
+    histogram and the unsmoothed VFH+ enlarged histogram (patched by sum and max).
+
+    :param obstacle_grid: spatial_grid.SpatialGrid of the scene, queried on a miss within
+                          vfh_engine.enlarged_reach, the farthest an obstacle can score.
+    :param compute_vfh: callable(pos_x, pos_y, rects) of the simulator's VFH flavour.
+    :param field: Optional distance_field.DistanceField to skip the query in open space; its
+                  max_distance should be at least that reach, or it never reports clear.
+    """
+    reach = vfh_engine.enlarged_reach(detection_range, clearance)
+
+    def query(pos_x, pos_y):
+        if field is not None and field.is_clear(pos_x, pos_y, reach):
+            return vfh_engine.rects_to_array([])
+        return vfh_engine.rects_to_array(obstacle_grid.query_radius(pos_x, pos_y, reach))
+
+    def compute(pos_x, pos_y, rects):
+        return (compute_vfh(pos_x, pos_y, rects),
+                vfh_engine.enlarged_histogram(pos_x, pos_y, rects, n_bins, detection_range, clearance))
+
+    return VFHCache(scene, compute, query, combine=(np.add, np.maximum), quantum=quantum)
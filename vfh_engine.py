@@ -0,0 +1,291 @@
+import math
+import numpy as np
+
+# Vector Field Histogram engine shared by the 2D simulators.
+# Obstacles are handled as a contiguous (M, 4) float array of x, y, width, height
+# so a whole histogram is built with a handful of NumPy calls instead of a
+# Python loop over obstacle dicts.
+
+def rects_to_array(obstacles):
+    """
+    Converts a list of obstacle dicts ({"rect": pygame.Rect, ...}) into an (M, 4)
+    float64 array of x, y, width, height.
+    Arrays are passed through unchanged so callers can build them once and reuse them.
+    """
+    if isinstance(obstacles, np.ndarray):
+        return obstacles
+    rects = np.empty((len(obstacles), 4), dtype=np.float64)
+    for i, obs in enumerate(obstacles):
+        r = obs["rect"]
+        rects[i] = (r.x, r.y, r.width, r.height)
+    return rects
+
+def _bin_histogram(dx, dy, weight_scale, n_bins, detection_range):
+    """
+    Bins the offsets (dx, dy) into a polar histogram.
+    Points at distance 0 or beyond detection_range are ignored, every other point adds
+    weight_scale * (detection_range - distance) / detection_range to its bin.
+    """
+    distance = np.hypot(dx, dy)
+    keep = (distance != 0) & (distance <= detection_range)
+    if not keep.any():
+        return np.zeros(n_bins)
+    dx, dy, distance = dx[keep], dy[keep], distance[keep]
+
+    angle = (np.degrees(np.arctan2(dy, dx)) + 360) % 360
+    bin_index = (angle // (360 / n_bins)).astype(np.intp) % n_bins
+    weight = weight_scale * (detection_range - distance) / detection_range
+    return np.bincount(bin_index, weights=weight, minlength=n_bins)
+
+def compute_vfh_closest(pos_x, pos_y, rects, n_bins, detection_range):
+    """
+    Vector Field Histogram using the closest point on each obstacle.
+    Matches compute_vfh in 2D_collision_wXbox.py and 2D_withObjectDistanceVector.py.
+    """
+    rects = rects_to_array(rects)
+    x, y, w, h = rects.T
+    closest_x = np.maximum(x, np.minimum(pos_x, x + w))
+    closest_y = np.maximum(y, np.minimum(pos_y, y + h))
+    return _bin_histogram(closest_x - pos_x, closest_y - pos_y, 1.0, n_bins, detection_range)
+
+def compute_vfh_centers(pos_x, pos_y, rects, n_bins, detection_range):
+    """
+    Vector Field Histogram using the center of each obstacle.
+    Matches compute_vfh in 2D_withVectorCollision.py.
+    """
+    rects = rects_to_array(rects)
+    x, y, w, h = rects.T
+    return _bin_histogram(x + w / 2.0 - pos_x, y + h / 2.0 - pos_y, 1.0, n_bins, detection_range)
+
+def compute_vfh_corners(pos_x, pos_y, rects, n_bins, detection_range, corner_weight=0.4):
+    """
+    Vector Field Histogram sampling the four corners of each obstacle, each corner
+    weighted by corner_weight, followed by a 3-bin moving average.
+    Matches compute_vfh in 2D_with_vfh.py.
+    """
+    rects = rects_to_array(rects)
+    x, y, w, h = rects.T
+    # Corners laid out as top-left, top-right, bottom-left, bottom-right per obstacle
+    corner_x = np.stack((x, x + w, x, x + w), axis=1).ravel()
+    corner_y = np.stack((y, y, y + h, y + h), axis=1).ravel()
+    histogram = _bin_histogram(corner_x - pos_x, corner_y - pos_y, corner_weight, n_bins, detection_range)
+    return smooth_histogram(histogram)
+
+def smooth_histogram(histogram, window=3):
+    """
+    Moving average over neighbouring bins along the last axis. The histogram is
+    circular, so the first and last bins are neighbours (0 and 360 degrees).
+    """
+    histogram = np.asarray(histogram, dtype=np.float64)
+    n_bins = histogram.shape[-1]
+    half = window // 2
+    wrapped = np.concatenate((histogram[..., n_bins - half:], histogram, histogram[..., :window - half - 1]), axis=-1)
+    total = wrapped[..., :n_bins].copy()
+    for shift in range(1, window):
+        total += wrapped[..., shift:shift + n_bins]
+    return total / window
+
+# -------------------------
+# VFH+ (Ulrich & Borenstein)
+# -------------------------
+# The steering stage works on a primary histogram in which every obstacle is grown by
+# the chair's clearance, turns it into a binary (free / blocked) histogram with
+# hysteresis and picks a direction from the free valleys with a cost function that
+# prefers the driver's heading and the previously chosen direction. Unlike the original
+# VFH+, a sector's density is that of its nearest enlarged obstacle rather than a sum,
+# so the thresholds read as "free distance along the sector". Every function works on
+# the last axis, so a batch of chairs can pass (N, n_bins) arrays.
+
+VALLEY_COSTS = (5.0, 2.0, 2.0)  # weights of target, heading and previous direction
+RAYS_PER_BIN = 3                # rays probing each sector of the enlarged histogram
+
+def enlarged_histogram(pos_x, pos_y, rects, n_bins, detection_range, clearance, rays_per_bin=RAYS_PER_BIN):
+    """
+    Primary VFH+ histogram with the obstacles enlarged by the chair's clearance.
+    Every sector is probed with rays_per_bin rays against the obstacles grown by
+    clearance, so a sector scores (detection_range - d) / detection_range where d is how
+    far a chair-wide path in that direction stays free (0 when free beyond range).
+    Obstacles the chair is already within clearance of only block the directions that
+    approach them. Only (chair, obstacle) pairs within enlarged_reach are probed, the
+    others cannot score, so a batch costs its chairs' neighbourhoods rather than N x M.
+
+    :param pos_x: Scalar or (N,) array of positions; the result is (n_bins,) or (N, n_bins).
+    :param clearance: Half the chair's extent across its heading plus a safety margin.
+    """
+    rects = rects_to_array(rects)
+    pos_x = np.asarray(pos_x, dtype=np.float64)
+    pos_y = np.asarray(pos_y, dtype=np.float64)
+    lead = pos_x.shape
+    px = pos_x.reshape(-1, 1)
+    py = pos_y.reshape(-1, 1)
+    x, y, w, h = rects.T
+    dx = np.maximum(x, np.minimum(px, x + w)) - px
+    dy = np.maximum(y, np.minimum(py, y + h)) - py
+    reach = enlarged_reach(detection_range, clearance)
+    chair, obstacle = np.nonzero(dx * dx + dy * dy <= reach * reach)  # sorted by chair
+    free = np.full((len(px), n_bins * rays_per_bin), np.inf)
+    if len(chair):
+        pair_free = free_distance(px[chair], py[chair], rects[obstacle], dx[chair, obstacle, None],
+                                  dy[chair, obstacle, None], ray_angles(n_bins, rays_per_bin), clearance)
+        first = np.flatnonzero(np.diff(chair, prepend=-1))
+        free[chair[first]] = np.minimum.reduceat(pair_free, first, axis=0)
+    density = np.maximum(0.0, (detection_range - free) / detection_range).reshape(lead + (n_bins * rays_per_bin,))
+    return sector_maxima(density, rays_per_bin)
+
+def ray_angles(n_bins, rays_per_bin=RAYS_PER_BIN):
+    """Directions (radians) of the rays enlarged_histogram probes, rays_per_bin per sector."""
+    bin_angle = 2 * np.pi / n_bins
+    return (np.arange(n_bins * rays_per_bin) + 0.5) * bin_angle / rays_per_bin
+
+def sector_maxima(ray_density, rays_per_bin=RAYS_PER_BIN):
+    """Per-sector maximum of a (..., n_bins * rays_per_bin) array of per-ray densities."""
+    density = ray_density.reshape(ray_density.shape[:-1] + (-1, rays_per_bin))
+    # Pairwise maxima, reducing the short last axis is far slower
+    sector = density[..., 0]
+    for ray in range(1, rays_per_bin):
+        sector = np.maximum(sector, density[..., ray])
+    return sector
+
+def free_distance(px, py, rects, dx, dy, ray_angle, clearance):
+    """
+    Distance along each ray until it enters an obstacle grown by clearance, for (P, 1)
+    positions against their (P, 4) obstacles whose closest point lies at (dx, dy).
+    Returns (P, rays), inf where the ray stays free.
+    """
+    x, y, w, h = (column[:, None] for column in rects.T)
+    cos_a = np.cos(ray_angle)
+    sin_a = np.sin(ray_angle)
+    cos_a[np.abs(cos_a) < 1e-12] = 1e-12
+    sin_a[np.abs(sin_a) < 1e-12] = 1e-12
+
+    # Slab test of every ray against the grown obstacle, reusing the (P, rays) buffers
+    tx1 = (x - clearance - px) / cos_a
+    tx2 = (x + w + clearance - px) / cos_a
+    t_enter = np.minimum(tx1, tx2)
+    t_exit = np.maximum(tx1, tx2, out=tx1)
+    ty1 = np.divide(y - clearance - py, sin_a, out=tx2)
+    ty2 = (y + h + clearance - py) / sin_a
+    np.maximum(t_enter, np.minimum(ty1, ty2), out=t_enter)
+    np.minimum(t_exit, np.maximum(ty1, ty2, out=ty1), out=t_exit)
+    hit = t_enter <= t_exit
+    hit &= t_exit >= 0
+
+    # Already within clearance: blocked only when moving towards the obstacle
+    approaching = np.multiply(dx, cos_a, out=t_exit)
+    approaching += dy * sin_a
+    hit &= (t_enter >= 0) | (approaching > 0)
+    free = np.maximum(t_enter, 0.0, out=t_enter)
+    free[~hit] = np.inf
+    return free
+
+def enlarged_reach(detection_range, clearance):
+    """
+    Farthest an obstacle (closest point) can be and still score in enlarged_histogram:
+    its grown box, square-cornered, starts up to clearance * sqrt(2) closer.
+    Queries feeding the histogram must use this radius rather than detection_range.
+    """
+    return detection_range + clearance * math.sqrt(2)
+
+def steering_histogram(pos_x, pos_y, rects, n_bins, detection_range, clearance, rays_per_bin=RAYS_PER_BIN):
+    """Circularly smoothed enlarged_histogram, the input of binary_histogram."""
+    return smooth_histogram(enlarged_histogram(pos_x, pos_y, rects, n_bins, detection_range, clearance,
+                                               rays_per_bin))
+
+def binary_histogram(histogram, low, high, previous=None):
+    """
+    Hysteresis thresholding: sectors above high are blocked, below low free, and in
+    between keep their previous state so valley borders do not flicker.
+    low and high may be scalars or (N, 1) arrays for a batch.
+    """
+    blocked = histogram > high
+    if previous is not None:
+        blocked |= previous & (histogram >= low)
+    return blocked
+
+def select_direction(blocked, histogram, target_bin, heading_bin, previous_bin=None, wide_bins=8,
+                     costs=VALLEY_COSTS):
+    """
+    Picks the steering sector from the free valleys of a binary histogram.
+
+    Candidates are the center of narrow valleys (at most wide_bins wide), the sectors
+    wide_bins // 2 inside each border of wide valleys, and the target sector when it is
+    free. The candidate with the lowest weighted circular distance to the target, the
+    current heading and the previously chosen sector wins. When every sector is blocked
+    the least dense sector of histogram is returned.
+
+    :param blocked: (n_bins,) or (N, n_bins) boolean array from binary_histogram.
+    :param target_bin: Sector of the desired direction (the driver's heading); int or (N,) array.
+    :param previous_bin: Previously chosen sector, defaults to heading_bin; may be (N,) with -1 for none.
+    :return: int sector, or (N,) array for a batch.
+    """
+    n_bins = blocked.shape[-1]
+    index = np.arange(n_bins)
+    target = np.asarray(target_bin)[..., None]
+    heading = np.asarray(heading_bin)[..., None]
+    previous = heading if previous_bin is None else np.asarray(previous_bin)[..., None]
+    previous = np.where(previous < 0, heading, previous)
+
+    # Nearest blocked sector on either side of every sector, looking one turn around the circle
+    twice_index = np.arange(2 * n_bins)
+    twice_blocked = np.concatenate((blocked, blocked), axis=-1)
+    far = 4 * n_bins
+    left = np.maximum.accumulate(np.where(twice_blocked, twice_index, -far), axis=-1)[..., n_bins:] - n_bins
+    right = np.minimum.accumulate(np.where(twice_blocked, twice_index, far)[..., ::-1], axis=-1)[..., :n_bins - 1:-1]
+    left_gap = index - left    # 1 for the first free sector of a valley
+    right_gap = right - index
+    width = left_gap + right_gap - 1
+    free = ~blocked
+
+    half = wide_bins // 2
+    narrow_center = (width <= wide_bins) & (left_gap - 1 == (width - 1) // 2)
+    wide_border = (width > wide_bins) & ((left_gap - 1 == half) | (right_gap - 1 == half))
+    candidate = free & (narrow_center | wide_border | (index == target))
+
+    def circular_distance(a, b):
+        d = np.abs(a - b) % n_bins
+        return np.minimum(d, n_bins - d)
+
+    cost = (costs[0] * circular_distance(index, target) + costs[1] * circular_distance(index, heading)
+            + costs[2] * circular_distance(index, previous))
+    cost = np.where(candidate, cost, np.inf)
+    best = np.argmin(cost, axis=-1)
+    fallback = np.argmin(histogram, axis=-1)
+    best = np.where(candidate.any(axis=-1), best, fallback)
+    return int(best) if best.ndim == 0 else best
+
+class VFHPlus:
+    def __init__(self, n_bins, low, high, wide_bins):
+        """
+        Stateful VFH+ steering for a single chair: remembers the binary histogram
+        (for the hysteresis) and the last chosen sector between updates.
+
+        :param low: Density below which a sector becomes free again.
+        :param high: Density above which a sector is blocked.
+        :param wide_bins: Sectors a valley must exceed to count as wide.
+        """
+        self.n_bins = n_bins
+        self.low = low
+        self.high = high
+        self.wide_bins = wide_bins
+        self.reset()
+
+    def reset(self):
+        """Forgets the steering history, e.g. after the chair was moved."""
+        self.blocked = None
+        self.previous_bin = None
+
+    def steer(self, histogram, heading_bin, low=None, high=None):
+        """
+        Updates the binary histogram from a steering_histogram and returns the sector to
+        turn towards, or None while the heading sector is free.
+        """
+        low = self.low if low is None else low
+        high = self.high if high is None else high
+        self.blocked = binary_histogram(histogram, low, high, self.blocked)
+        if not self.blocked[heading_bin]:
+            self.previous_bin = heading_bin
+            return None
+        best_bin = select_direction(self.blocked, histogram, heading_bin, heading_bin, self.previous_bin,
+                                    self.wide_bins)
+        self.previous_bin = best_bin
+        return best_bin
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import scene_file
+import spatial_grid
+import distance_field
+import occupancy_grid
+import vfh_cache
+
+# Building-scale worlds streamed from disk in square tiles.
+# build() cuts a scene into tiles of TILE_SIZE scene units and writes each non-empty
+# tile as a binary scene file (scene_file format) next to a world.json index. Every
+# obstacle is stored once, in the tile holding its top-left corner; queries widen
+# their search by the largest obstacle size so obstacles reaching into a tile from
+# its neighbours are still found.
+#
+# A World keeps at most max_tiles tiles in memory. For each loaded tile it holds the
+# tile's obstacles in a SpatialGrid, plus a DistanceField and an OccupancyGrid of
+# everything within reach of the tile. Tiles are loaded on worker threads: update()
+# is called once per frame with the chair's pose, requests the tiles within the
+# detection range and the ones ahead in the direction of travel, installs whatever
+# finished loading and evicts the least recently used tiles beyond max_tiles. It
+# only waits on the disk when asked to (block=True, for headless replays); the
+# interactive simulator never does and instead holds the chair while ready() is
+# False. A tile that is not loaded yet reads as "unknown": is_clear() and
+# rect_is_free() answer False, so callers fall back to their exact tests on the
+# obstacles that are loaded.
+# Loads and evictions bump world.scene (a vfh_cache.SceneVersion), so the VFH cache
+# and the renderer's static layer pick up what streamed in.
+#
+# A World answers the queries of SpatialGrid, DistanceField and OccupancyGrid that
+# sim_core.step uses, so it can be passed as all three:
+#
+#   python world_tiles.py scenes/hospital.scene worlds/hospital [--tile-size 1024]
+
+FORMAT_VERSION = 1
+TILE_SIZE = 1024            # scene units per tile side
+MAX_TILES = 32              # tiles kept in memory (more only while the chair needs them)
+PREFETCH_TILES = 2          # tiles ahead of the chair requested in the direction of travel
+LOADER_THREADS = 2
+INDEX_FILE = "world.json"
+
+def tile_name(col, row):
+    return f"tile_{col}_{row}.scene"
+
+def build(scene, directory, tile_size=TILE_SIZE):
+    """Writes a scene_file.Scene as a tiled world into directory."""
+    os.makedirs(directory, exist_ok=True)
+    records = np.asarray(scene.records)
+    cols = records["x"] // tile_size
+    rows = records["y"] // tile_size
+    order = np.lexsort((cols, rows))
+    records, cols, rows = records[order], cols[order], rows[order]
+    keys = np.stack((cols, rows), axis=1)
+    starts = np.flatnonzero(np.r_[True, np.any(keys[1:] != keys[:-1], axis=1)]) if len(keys) else []
+    ends = list(starts[1:]) + [len(records)]
+    tiles = []
+    for start, end in zip(starts, ends):
+        col, row = int(cols[start]), int(rows[start])
+        scene_file.save_binary(scene_file.Scene(records[start:end], tile_size, tile_size),
+                               os.path.join(directory, tile_name(col, row)))
+        tiles.append([col, row, int(end - start)])
+    index = {
+        "version": FORMAT_VERSION,
+        "tile_size": tile_size,
+        "width": int(scene.width),
+        "height": int(scene.height),
+        # Largest obstacle, i.e. how far one can reach into the neighbouring tiles
+        "max_width": int(records["w"].max(initial=0)),
+        "max_height": int(records["h"].max(initial=0)),
+        "tiles": tiles,
+    }
+    with open(os.path.join(directory, INDEX_FILE), "w") as f:
+        json.dump(index, f)
+    return index
+
+class Tile:
+    def __init__(self, col, row, obstacles, index, field, occupancy):
+        self.col = col
+        self.row = row
+        self.obstacles = obstacles    # obstacle dicts anchored in this tile
+        self.index = index            # SpatialGrid of the obstacles anchored in this tile
+        self.field = field            # DistanceField of everything within reach of the tile
+        self.occupancy = occupancy    # OccupancyGrid of the tile area
+
+    def nbytes(self):
+        return (self.field.sdf.nbytes + self.field.grad_x.nbytes + self.field.grad_y.nbytes
+                + self.occupancy.values.nbytes)
+
+class World:
+    def __init__(self, directory, detection_range, max_tiles=MAX_TILES, cell_size=occupancy_grid.CELL_SIZE,
+                 threads=LOADER_THREADS):
+        """
+        :param directory: Folder written by build().
+        :param detection_range: Radius around the chair whose tiles must be loaded; also
+                                the spatial index cell size and the distance field range.
+        :param max_tiles: Tiles kept in memory.
+        :param cell_size: Occupancy grid resolution.
+        """
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            info = json.load(f)
+        if info["version"] != FORMAT_VERSION:
+            raise ValueError(f"{directory} has world format version {info['version']}, expected {FORMAT_VERSION}")
+        self.directory = directory
+        self.tile_size = info["tile_size"]
+        self.width = info["width"]
+        self.height = info["height"]
+        self.reach_x = info["max_width"]
+        self.reach_y = info["max_height"]
+        self.stored = {(col, row) for col, row, _ in info["tiles"]}
+        self.detection_range = detection_range
+        self.max_tiles = max_tiles
+        self.cell_size = cell_size
+        # How far from a tile the obstacles its distance field needs can lie
+        self.field_range = distance_field.DistanceField([], detection_range).reach
+        self.tiles = OrderedDict()    # (col, row) -> Tile, least recently used first
+        self.pending = {}             # (col, row) -> Future
+        self.needed = set()           # tiles update() waits for and never evicts
+        self.kept = set()             # needed plus the tiles in view, never evicted
+        self.scene = vfh_cache.SceneVersion()
+        self.executor = ThreadPoolExecutor(threads)
+        self.lock = threading.Lock()  # guards the tile file cache shared by the loaders
+        self.records = OrderedDict()  # (col, row) -> records read from disk, shared by neighbouring loads
+        self.loads = 0
+        self.evictions = 0
+        self.misses = 0               # queries that touched a tile still loading
+
+    # -------------------------
+    # Streaming
+    # -------------------------
+    def tile_of(self, x, y):
+        return (int(x // self.tile_size), int(y // self.tile_size))
+
+    def _tiles_in(self, x0, y0, x1, y1):
+        c0, r0 = self.tile_of(x0, y0)
+        c1, r1 = self.tile_of(x1, y1)
+        return [(col, row) for row in range(r0, r1 + 1) for col in range(c0, c1 + 1)]
+
+    def _near(self, x, y, radius):
+        """Tiles that can hold obstacles within radius of (x, y)."""
+        return self._tiles_in(x - radius - self.reach_x, y - radius - self.reach_y, x + radius, y + radius)
+
+    def update(self, x, y, heading, block=False, view=None):
+        """
+        Once per frame: requests the tiles around (x, y) and ahead along heading,
+        installs finished loads and evicts tiles beyond max_tiles. Queued loads of
+        tiles no longer wanted are cancelled.
+
+        :param block: Wait for the tiles around (x, y).
+        :param view: Optional (x, y, width, height) on screen, whose tiles are loaded
+                     (without waiting) and kept as well.
+        """
+        self.needed = set(self._near(x, y, self.detection_range))
+        self.kept = set(self.needed)
+        if view is not None:
+            vx, vy, width, height = view
+            self.kept.update(self._tiles_in(vx - self.reach_x, vy - self.reach_y, vx + width, vy + height))
+        wanted = set(self.kept)
+        step = self.tile_size
+        for i in range(1, PREFETCH_TILES + 1):
+            ahead_x = x + math.cos(heading) * step * i
+            ahead_y = y + math.sin(heading) * step * i
+            wanted.update(self._near(ahead_x, ahead_y, self.detection_range))
+        # Drop queued loads the chair has turned or moved away from
+        for key, future in list(self.pending.items()):
+            if key not in wanted and future.cancel():
+                del self.pending[key]
+        for key in self.needed:
+            self._request(key)
+        for key in wanted - self.needed:
+            self._request(key)
+        if block:
+            for key in self.needed:
+                future = self.pending.get(key)
+                if future is not None:
+                    future.result()
+        self._install()
+        self._evict()
+
+    def ready(self, x, y):
+        """True when every tile that can hold obstacles within the detection range of (x, y) is loaded."""
+        return all(key in self.tiles for key in self._near(x, y, self.detection_range))
+
+    def _request(self, key):
+        if key in self.tiles:
+            self.tiles.move_to_end(key)
+        elif key not in self.pending:
+            self.pending[key] = self.executor.submit(self._load, key)
+
+    def _install(self):
+        for key, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[key]
+                tile = future.result()
+                self.tiles[key] = tile
+                self.loads += 1
+                self.scene.added(tile.obstacles)
+
+    def _evict(self):
+        while len(self.tiles) > self.max_tiles:
+            key = next((key for key in self.tiles if key not in self.kept), None)
+            if key is None:
+                break
+            del self.tiles[key]
+            self.evictions += 1
+            self.scene.changed()
+
+    def _read(self, key):
+        """Obstacle records of one tile file (cached, the neighbours of a tile need them too)."""
+        with self.lock:
+            records = self.records.get(key)
+            if records is not None:
+                self.records.move_to_end(key)
+                return records
+        if key in self.stored:
+            records = np.array(scene_file.load_binary(os.path.join(self.directory, tile_name(*key))).records)
+        else:
+            records = np.zeros(0, dtype=scene_file.OBSTACLE_DTYPE)
+        with self.lock:
+            self.records[key] = records
+            while len(self.records) > 4 * self.max_tiles:
+                self.records.popitem(last=False)
+        return records
+
+    def _load(self, key):
+        """Builds a Tile (runs on a loader thread)."""
+        col, row = key
+        size = self.tile_size
+        x0, y0 = col * size, row * size
+        own = scene_file.Scene(self._read(key)).obstacles_2d()
+        index = spatial_grid.grid_from_obstacles(own, self.detection_range)
+
+        # Everything that reaches within field_range of the tile, from this tile and its neighbours
+        margin = self.field_range
+        parts = [self._read(other) for other in self._tiles_in(x0 - margin - self.reach_x, y0 - margin - self.reach_y,
+                                                                x0 + size + margin, y0 + size + margin)]
+        records = np.concatenate(parts)
+        near = ((records["x"] < x0 + size + margin) & (records["x"] + records["w"] > x0 - margin)
+                & (records["y"] < y0 + size + margin) & (records["y"] + records["h"] > y0 - margin))
+        nearby = scene_file.Scene(records[near])
+        field = distance_field.DistanceField(nearby.obstacles_2d(), self.detection_range)
+        occupancy = occupancy_grid.OccupancyGrid(x0, y0, size, size, self.cell_size)
+        occupancy.add_rects(nearby.rects())
+        return Tile(col, row, own, index, field, occupancy)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def nbytes(self):
+        """Memory held by the loaded tiles' rasters."""
+        return sum(tile.nbytes() for tile in self.tiles.values())
+
+    def stats(self):
+        return {"loaded": len(self.tiles), "pending": len(self.pending), "loads": self.loads,
+                "evictions": self.evictions, "misses": self.misses, "raster_bytes": self.nbytes()}
+
+    def _tile(self, key):
+        tile = self.tiles.get(key)
+        if tile is None:
+            self.misses += 1
+        return tile
+
+    # -------------------------
+    # SpatialGrid queries
+    # -------------------------
+    def query_rect(self, x, y, width, height):
+        """Loaded obstacles overlapping the rectangle (see SpatialGrid.query_rect)."""
+        result = []
+        for key in self._tiles_in(x - self.reach_x, y - self.reach_y, x + width, y + height):
+            tile = self._tile(key)
+            if tile is not None:
+                result.extend(tile.index.query_rect(x, y, width, height))
+        return result
+
+    def query_radius(self, x, y, radius):
+        """Loaded obstacles whose closest point lies within radius of (x, y)."""
+        result = []
+        for key in self._near(x, y, radius):
+            tile = self._tile(key)
+            if tile is not None:
+                result.extend(tile.index.query_radius(x, y, radius))
+        return result
+
+    # -------------------------
+    # DistanceField / OccupancyGrid queries
+    # -------------------------
+    def is_clear(self, x, y, radius):
+        """True when no obstacle lies within radius of (x, y); False while the tile is loading."""
+        tile = self._tile(self.tile_of(x, y))
+        return tile is not None and tile.field.is_clear(x, y, radius)
+
+    def nearest(self, x, y):
+        tile = self._tile(self.tile_of(x, y))
+        return tile.field.nearest(x, y) if tile is not None else None
+
+    def rect_is_free(self, x, y, width, height):
+        """True when no obstacle touches the rectangle; False if part of it is not loaded."""
+        for col, row in self._tiles_in(x, y, x + width, y + height):
+            tile = self._tile((col, row))
+            if tile is None:
+                return False
+            # The part of the rectangle inside this tile
+            tx, ty = col * self.tile_size, row * self.tile_size
+            left, top = max(x, tx), max(y, ty)
+            right = min(x + width, tx + self.tile_size - 1e-9)
+            bottom = min(y + height, ty + self.tile_size - 1e-9)
+            if not tile.occupancy.rect_is_free(left, top, right - left, bottom - top):
+                return False
+        return True
+
+def main():
+    args = sys.argv[1:]
+    tile_size = TILE_SIZE
+    if "--tile-size" in args and args.index("--tile-size") + 1 < len(args):
+        i = args.index("--tile-size")
+        tile_size = int(args[i + 1])
+        del args[i:i + 2]
+    if len(args) != 2:
+        print("Usage: python world_tiles.py <scene> <world folder> [--tile-size N]")
+        sys.exit(1)
+    index = build(scene_file.load(args[0]), args[1], tile_size)
+    print(f"{args[1]}: {len(index['tiles'])} tiles of {tile_size}, "
+          f"{sum(count for _, _, count in index['tiles'])} obstacles")
+
+if __name__ == "__main__":
+    main()